@@ -0,0 +1,94 @@
+"""Aggregate the neighbor colors of a switch into masked matches.
+
+The colors encoded in a maskable field are covered by a small set of
+value/mask pairs matching exactly those colors, similar to the aggregation
+of prefixes in a routing table.
+"""
+import ipaddress
+
+#: Maskable fields and their width in bits
+MASKABLE_FIELDS = {'dl_src': 48, 'dl_dst': 48, 'nw_src': 32, 'nw_dst': 32}
+
+#: Fields accepting only prefix masks
+PREFIX_FIELDS = ('nw_src', 'nw_dst')
+
+
+def aggregate(values, bits, prefix_only=False):
+    """Return a small set of (value, mask) pairs matching exactly `values`.
+
+    Pairs of cubes differing in a single bit are merged until no merge is
+    possible, as in the Quine-McCluskey method. The resulting prime cubes
+    are then picked greedily until every value is covered.
+    :param values: Iterable of integers
+    :param bits: Width of the values in bits
+    :param prefix_only: Only produce masks with contiguous leading ones
+    :return: A list of (value, mask) tuples
+    """
+    full_mask = (1 << bits) - 1
+    values = set(values)
+    cubes = {(value, full_mask) for value in values}
+    primes = set()
+    while cubes:
+        merged = set()
+        used = set()
+        for value, mask in cubes:
+            if prefix_only:
+                candidates = (mask & -mask,)
+            else:
+                candidates = (1 << bit for bit in range(bits)
+                              if mask >> bit & 1)
+            for bit in candidates:
+                if value & bit or (value | bit, mask) not in cubes:
+                    continue
+                merged.add((value, mask & ~bit))
+                used.update(((value, mask), (value | bit, mask)))
+        primes |= cubes - used
+        cubes = merged
+
+    cover = []
+    uncovered = values
+    while uncovered:
+        best = max(primes, key=lambda cube: (
+            sum(1 for value in uncovered if value & cube[1] == cube[0]),
+            -cube[1]))
+        cover.append(best)
+        uncovered = {value for value in uncovered
+                     if value & best[1] != best[0]}
+    return sorted(cover)
+
+
+def field_to_int(value, field):
+    """Return the integer of a color encoded for a maskable field."""
+    if field in PREFIX_FIELDS:
+        return int(ipaddress.IPv4Address(value))
+    return int(value.replace(':', ''), 16)
+
+
+def int_to_field(value, field):
+    """Return an integer encoded for a maskable field."""
+    if field in PREFIX_FIELDS:
+        return str(ipaddress.IPv4Address(value))
+    return ':'.join('%02x' % (value >> shift & 0xff)
+                    for shift in range(40, -1, -8))
+
+
+def masked_matches(colors, field):
+    """Return the match values covering exactly the encoded colors.
+    :param colors: Colors encoded for the field, as given by color_to_field
+    :param field: A field in MASKABLE_FIELDS
+    :return: A set of match values, using 'value/mask' for masked ones
+    """
+    bits = MASKABLE_FIELDS[field]
+    full_mask = (1 << bits) - 1
+    prefix_only = field in PREFIX_FIELDS
+    matches = set()
+    for value, mask in aggregate((field_to_int(color, field)
+                                  for color in colors), bits, prefix_only):
+        match = int_to_field(value, field)
+        if mask != full_mask:
+            if prefix_only:
+                match = '%s/%s' % (match, bin(mask).count('1'))
+            else:
+                match = '%s/%s' % (match, int_to_field(mask, field))
+        matches.add(match)
+    return matches
@@ -0,0 +1,74 @@
+"""Pick the switches whose color flows are audited against flow_stats."""
+import math
+import time
+from bisect import bisect_right
+
+
+class FlowAuditor:
+    """Select, every `interval` seconds, a sample of the switches to have
+    their installed flows compared with the desired color flows.
+
+    Each cycle takes the next `sample_rate` fraction of the switches, at
+    most `switch_budget` of them, in DPID order, so that every switch is
+    audited once every 1 / `sample_rate` cycles. Switches whose flows
+    changed in the last `grace_time` seconds are skipped, since the flow
+    statistics may not list their changes yet.
+    """
+
+    def __init__(self, interval, sample_rate, switch_budget, grace_time,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.switch_budget = switch_budget
+        self.grace_time = grace_time
+        self._clock = clock
+        self._next_cycle = clock() + interval
+        self._cursor = None
+        self._changed = {}
+        self.cycles = 0
+        self.audited = 0
+
+    def due(self):
+        """Return True if an audit cycle should run now."""
+        return self.interval > 0 and self._clock() >= self._next_cycle
+
+    def touch(self, keys):
+        """Record that the flows of switches just changed."""
+        now = self._clock()
+        for key in keys:
+            self._changed[key] = now
+
+    def discard(self, key):
+        """Forget a switch."""
+        self._changed.pop(key, None)
+
+    def select(self, keys):
+        """Start an audit cycle, returning the switches to be audited.
+        :param keys: The keys of every switch, which must be sortable
+        :return: A list with the keys of the switches in the sample
+        """
+        now = self._clock()
+        self._next_cycle = now + self.interval
+        self.cycles += 1
+        keys = sorted(keys)
+        if not keys:
+            return []
+        size = min(math.ceil(len(keys) * self.sample_rate),
+                   self.switch_budget, len(keys))
+        start = 0
+        if self._cursor is not None:
+            start = bisect_right(keys, self._cursor) % len(keys)
+        sample = (keys[start:] + keys[:start])[:size]
+        if sample:
+            self._cursor = sample[-1]
+        for key, changed in list(self._changed.items()):
+            if changed + self.grace_time <= now:
+                del self._changed[key]
+        sample = [key for key in sample if key not in self._changed]
+        self.audited += len(sample)
+        return sample
+
+    @property
+    def stats(self):
+        """Return the number of cycles run and of switches audited."""
+        return {'cycles': self.cycles, 'audited': self.audited}
@@ -0,0 +1,86 @@
+"""Compare installing color flows through flow_manager and with FlowMods.
+
+The flow_manager path posts the flows to a stub flow_manager, while the
+OpenFlow path packs the FlowMods queued to the switches, as the controller
+does before writing them to the connections. Only the calls to the push
+method of the flow pusher are timed, leaving out the coloring.
+
+The two paths do not do comparable work: the stub flow_manager only
+records the flows posted, while the real one also builds and packs a
+FlowMod for each of them. The flow_manager timings are therefore a lower
+bound, and the rates of both paths are not a measure of the speedup of
+the OpenFlow backend.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.bench_backends
+"""
+import time
+
+from napps.amlight.coloring import settings
+
+from napps.amlight.coloring.openflow_pusher import packed_flow_mod
+
+from benchmarks.helpers import leaf_spine, make_napp
+from benchmarks.stub_flow_manager import StubFlowManager
+
+
+class PackingBuffer:
+    """msg_out buffer packing the messages queued, counting their bytes."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def put(self, event):
+        """Pack the message of an event."""
+        self.messages += 1
+        self.bytes += len(event.content['message'].pack())
+
+
+def run(backend, spines, leaves):
+    """Color a leaf-spine topology and return the flows installed and the
+    seconds spent pushing them.
+    """
+    switches, links = leaf_spine(spines, leaves)
+    for switch in switches:
+        switch.connection = None
+        switch.is_connected = lambda: True
+    settings.FLOW_BACKEND = backend
+    packed_flow_mod.cache_clear()
+    napp = make_napp(switches)
+    napp.controller.buffers.msg_out = PackingBuffer()
+    push = napp.flow_pusher.push
+    times = []
+
+    def timed_push(flows_by_dpid):
+        start = time.perf_counter()
+        results = push(flows_by_dpid)
+        times.append(time.perf_counter() - start)
+        return results
+
+    napp.flow_pusher.push = timed_push
+    napp.update_colors(links)
+    napp.shutdown()
+    flows = sum(len(switch_state.flows)
+                for switch_state in napp.switches.values())
+    return flows, sum(times)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    with StubFlowManager() as stub:
+        settings.FLOW_MANAGER_URL = stub.url
+        print('%-12s %-13s %10s %10s %12s' %
+              ('topology', 'backend', 'flows', 'seconds', 'flows/s'))
+        for spines, leaves in ((4, 32), (8, 128), (16, 256)):
+            for backend in ('flow_manager', 'openflow'):
+                stub.reset()
+                flows, elapsed = run(backend, spines, leaves)
+                print('%-12s %-13s %10d %10.3f %12.0f' %
+                      ('%dx%d' % (spines, leaves), backend, flows, elapsed,
+                       flows / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Compare per-flow and batched flow installs against a stub flow_manager.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.bench_batching
+"""
+import time
+
+from napps.amlight.coloring import settings
+
+from benchmarks.helpers import leaf_spine, make_napp
+from benchmarks.stub_flow_manager import StubFlowManager
+
+
+def run(spines, leaves, batch_size, stub):
+    """Color a leaf-spine topology and return (requests, flows, seconds)."""
+    switches, links = leaf_spine(spines, leaves)
+    napp = make_napp(switches)
+    settings.FLOW_BATCH_SIZE = batch_size
+    stub.reset()
+    start = time.perf_counter()
+    napp.update_colors(links)
+    elapsed = time.perf_counter() - start
+    napp.shutdown()
+    return stub.requests, stub.total_flows, elapsed
+
+
+def main():
+    """Run the benchmark and print the results."""
+    with StubFlowManager() as stub:
+        settings.FLOW_MANAGER_URL = stub.url
+        print('%-12s %-11s %10s %10s %10s' %
+              ('topology', 'batch size', 'requests', 'flows', 'seconds'))
+        for spines, leaves in ((4, 32), (8, 128)):
+            for batch_size in (1, 100):
+                requests, flows, elapsed = run(spines, leaves, batch_size,
+                                               stub)
+                print('%-12s %-11s %10d %10d %10.3f' %
+                      ('%dx%d' % (spines, leaves), batch_size, requests,
+                       flows, elapsed))
+
+
+if __name__ == '__main__':
+    main()
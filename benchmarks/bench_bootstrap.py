@@ -0,0 +1,116 @@
+"""Measure the import time of the NApp and its time to the first colored
+switch when the controller already knows the topology.
+
+The import time is measured in fresh interpreters that already imported
+kytos.core and flask, as a running controller has, and the modules of the
+NApp with the longest cumulative import time are listed. Then the NApp is
+loaded over a mocked controller whose switches have their links, and
+execute() is ticked until the first switch has its color flows.
+
+Run from the NApp folder with:
+
+    python -m benchmarks.bench_bootstrap
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from napps.amlight.coloring import settings
+
+from benchmarks.helpers import leaf_spine, make_napp
+from benchmarks.stub_flow_manager import StubFlowManager
+
+PRELOADED = 'import kytos.core, flask'
+MODULE = 'napps.amlight.coloring.main'
+
+
+def import_seconds(runs):
+    """Return the median seconds to import the NApp in `runs` fresh
+    interpreters.
+    """
+    code = ('%s; import time; start = time.perf_counter(); import %s; '
+            'print(time.perf_counter() - start)' % (PRELOADED, MODULE))
+    times = [float(subprocess.run([sys.executable, '-c', code], check=True,
+                                  stdout=subprocess.PIPE).stdout)
+             for _ in range(runs)]
+    return statistics.median(times)
+
+
+def imported_modules(code):
+    """Return a dict mapping the modules imported by some code to their
+    cumulative import time, in seconds.
+    """
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            check=True, stderr=subprocess.PIPE).stderr
+    modules = {}
+    for line in stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+def slowest_imports(count):
+    """Return the modules imported by the NApp, but not by the controller,
+    with the longest cumulative import time, in seconds.
+    """
+    preloaded = imported_modules(PRELOADED)
+    modules = imported_modules('%s; import %s' % (PRELOADED, MODULE))
+    return sorted(((name, seconds) for name, seconds in modules.items()
+                   if name not in preloaded),
+                  key=lambda module: -module[1])[:count]
+
+
+def link_interfaces(switches, links):
+    """Attach each link to the interfaces of its switches, as the topology
+    NApp does.
+    """
+    by_dpid = {switch.dpid: switch for switch in switches}
+    for index, link in enumerate(links):
+        endpoints = [by_dpid[link[endpoint]['switch']]
+                     for endpoint in ('endpoint_a', 'endpoint_b')]
+        link_object = SimpleNamespace(
+            id=index, endpoint_a=SimpleNamespace(switch=endpoints[0]),
+            endpoint_b=SimpleNamespace(switch=endpoints[1]))
+        for switch in endpoints:
+            switch.interfaces[index] = SimpleNamespace(link=link_object)
+
+
+def first_colored_seconds(spines, leaves, url):
+    """Return the seconds from loading the NApp to its first colored
+    switch, ticking execute() as the controller does.
+    """
+    switches, links = leaf_spine(spines, leaves)
+    link_interfaces(switches, links)
+    settings.FLOW_MANAGER_URL = url
+    napp = make_napp(switches, seed=True)
+    while napp.first_colored is None:
+        napp.execute()
+        time.sleep(0.01)
+    napp.shutdown()
+    return napp.first_colored
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--spines', type=int, default=8)
+    parser.add_argument('--leaves', type=int, default=128)
+    args = parser.parse_args()
+
+    print('import seconds: %.3f' % import_seconds(args.runs))
+    print('slowest imports:')
+    for name, seconds in slowest_imports(5):
+        print('  %-40s %.3f' % (name, seconds))
+    with StubFlowManager() as stub:
+        print('first colored switch seconds: %.3f' %
+              first_colored_seconds(args.spines, args.leaves, stub.url))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compare encoding colors one at a time with Main.color_to_field and
+encoding them in batches.
+
+Run from the NApp folder with:
+
+    python -m benchmarks.bench_encoding
+"""
+import random
+import time
+
+from napps.amlight.coloring import encoding
+from napps.amlight.coloring.encoding import encode_colors
+from napps.amlight.coloring.main import Main
+
+FIELDS = ('dl_src', 'nw_src', 'tp_src')
+
+
+def timed(function):
+    """Return the seconds taken by a call."""
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main(count=100000):
+    """Run the benchmark and print the results."""
+    rand = random.Random(0)
+    colors = [rand.getrandbits(48) for _ in range(count)]
+    print('%-8s %10s %10s %10s' % ('field', 'per call', 'tables', 'numpy'))
+    for field in FIELDS:
+        per_call = timed(lambda: [Main.color_to_field(color, field)
+                                  for color in colors])
+        tables = timed(lambda: encode_colors(colors, field, False))
+        # NumPy is only used for MAC addresses
+        if not encoding.HAS_NUMPY or field != 'dl_src':
+            vectorized = '-'
+        else:
+            vectorized = '%.3f' % timed(
+                lambda: encode_colors(colors, field, True))
+        print('%-8s %10.3f %10.3f %10s' % (field, per_call, tables,
+                                           vectorized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare the memory of the coloring state with the former dict layout.
+
+The former layout kept a dict per switch, a set of DPID strings for the
+neighbors and a full flow dict per neighbor color. Both are measured with
+tracemalloc on the same synthetic topologies.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.bench_memory
+"""
+import tracemalloc
+
+from napps.amlight.coloring.state import SwitchState
+
+from benchmarks.helpers import fat_tree, leaf_spine, make_napp, ring
+
+
+def measure(build):
+    """Return the bytes kept allocated by build() and its result."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def colored_napp(switches, links):
+    """Return a NApp whose state colors the topology, without pushing."""
+    napp = make_napp(switches)
+    napp.flow_pusher.push = dict
+    napp.flow_pusher.remove = dict
+    napp.update_colors(links)
+    return napp
+
+
+def former_layout(napp):
+    """Return the coloring state in the layout used before SwitchState."""
+    state = {}
+    for switch_state in napp.switches.values():
+        state[switch_state.dpid] = {
+            'color': switch_state.color,
+            'neighbors': {napp.switches[neighbor].dpid
+                          for neighbor in switch_state.neighbors},
+            'flows': {match: switch_state.template.render(match)
+                      for match in switch_state.flows}}
+    return state
+
+
+def compact_layout(napp):
+    """Return a copy of the coloring state, made of SwitchState records."""
+    state = {}
+    for number, switch_state in napp.switches.items():
+        record = SwitchState(switch_state.dpid, switch_state.color)
+        record.neighbors = set(switch_state.neighbors)
+        record.flows = set(switch_state.flows)
+        record.template = switch_state.template
+        state[number] = record
+    return state
+
+
+def main():
+    """Run the benchmark and print the results."""
+    topologies = (('ring 10000', ring(10000)),
+                  ('leaf-spine 32x2048', leaf_spine(32, 2048)),
+                  ('fat-tree k=24', fat_tree(24)))
+    print('%-20s %8s %10s %12s %12s %7s' % ('topology', 'switches', 'flows',
+                                            'former (B)', 'compact (B)',
+                                            'saving'))
+    for name, (switches, links) in topologies:
+        napp = colored_napp(switches, links)
+        former, _ = measure(lambda: former_layout(napp))
+        compact, _ = measure(lambda: compact_layout(napp))
+        flows = sum(len(switch_state.flows)
+                    for switch_state in napp.switches.values())
+        print('%-20s %8d %10d %12d %12d %6.1fx' % (
+            name, len(switches), flows, former, compact, former / compact))
+        napp.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Measure update_colors on large synthetic topologies.
+
+For each topology, the initial coloring and the events of adding and
+removing a single link are timed against a stub flow_manager. Results are
+printed as JSON, so they can be compared between versions.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.bench_scale --sizes 1000,10000 --output scale.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from napps.amlight.coloring import settings
+
+from benchmarks.helpers import (fat_tree, leaf_spine, make_link, make_napp,
+                                random_topology, ring)
+from benchmarks.stub_flow_manager import StubFlowManager
+
+
+def build_topology(kind, size):
+    """Return (switches, links) of a topology with about `size` switches."""
+    if kind == 'ring':
+        return ring(size)
+    if kind == 'leaf-spine':
+        spines = max(size // 32, 2)
+        return leaf_spine(spines, size - spines)
+    if kind == 'fat-tree':
+        pods = 2
+        while 5 * (pods + 2) ** 2 // 4 <= size:
+            pods += 2
+        return fat_tree(pods)
+    if kind == 'random':
+        return random_topology(size, 4)
+    raise ValueError('Unknown topology %s' % kind)
+
+
+def extra_link(switches, links, index):
+    """Return a link between two switches that are not adjacent yet."""
+    adjacent = {(link['endpoint_a']['switch'], link['endpoint_b']['switch'])
+                for link in links}
+    source = switches[-1 - index].dpid
+    for target in reversed(switches[:-1 - index]):
+        if (source, target.dpid) not in adjacent and \
+                (target.dpid, source) not in adjacent:
+            return make_link(source, target.dpid)
+    raise ValueError('The topology is a full mesh')
+
+
+def timed_event(napp, links, stub):
+    """Run update_colors and return its latency and HTTP calls."""
+    stub.reset()
+    start = time.perf_counter()
+    napp.update_colors(links)
+    return time.perf_counter() - start, stub.requests
+
+
+def run(kind, size, stub, events, memory):
+    """Benchmark one topology and return a dict with the results."""
+    switches, links = build_topology(kind, size)
+    napp = make_napp(switches)
+    result = {'topology': kind, 'switches': len(switches),
+              'links': len(links)}
+
+    latency, requests = timed_event(napp, links, stub)
+    result['bring_up'] = {'seconds': latency, 'http_calls': requests}
+
+    flows = [len(switch_state.flows)
+             for switch_state in napp.switches.values()]
+    result['flows'] = {'total': sum(flows), 'max_per_switch': max(flows),
+                       'mean_per_switch': statistics.mean(flows)}
+
+    samples = {'link_added': [], 'link_removed': []}
+    for index in range(events):
+        extra = extra_link(switches, links, index)
+        samples['link_added'].append(
+            timed_event(napp, links + [extra], stub))
+        samples['link_removed'].append(timed_event(napp, links, stub))
+    for name, values in samples.items():
+        latencies = sorted(latency for latency, _ in values)
+        result[name] = {
+            'median_seconds': statistics.median(latencies),
+            'max_seconds': latencies[-1],
+            'http_calls': statistics.mean(calls for _, calls in values)}
+    napp.shutdown()
+
+    if memory:
+        napp = make_napp(switches)
+        tracemalloc.start()
+        napp.update_colors(links)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        napp.shutdown()
+        result['peak_memory_bytes'] = peak
+    return result
+
+
+def main():
+    """Run the benchmark and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--topologies',
+                        default='ring,leaf-spine,fat-tree,random')
+    parser.add_argument('--sizes', default='1000,5000')
+    parser.add_argument('--events', type=int, default=5,
+                        help='Link events timed per topology')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='Skip the peak memory measurement')
+    parser.add_argument('--output', help='File to write the results to')
+    args = parser.parse_args()
+
+    napp_meta = json.loads((Path(__file__).parent.parent /
+                            'kytos.json').read_text())
+    report = {'napp_version': napp_meta['version'],
+              'python': platform.python_version(),
+              'settings': {'color_field': settings.COLOR_FIELD,
+                           'coloring_strategy': settings.COLORING_STRATEGY,
+                           'flow_batch_size': settings.FLOW_BATCH_SIZE,
+                           'flow_push_workers': settings.FLOW_PUSH_WORKERS},
+              'results': []}
+    with StubFlowManager() as stub:
+        settings.FLOW_MANAGER_URL = stub.url
+        for kind in args.topologies.split(','):
+            for size in args.sizes.split(','):
+                report['results'].append(
+                    run(kind, int(size), stub, args.events, args.memory))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
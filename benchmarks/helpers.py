@@ -0,0 +1,102 @@
+"""Helpers to build synthetic topologies for the benchmarks."""
+import random
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from kytos.core import Controller
+from napps.amlight.coloring import settings
+from napps.amlight.coloring.main import Main
+
+
+def dpid_from_int(number):
+    """Return a DPID string for an integer."""
+    hex_dpid = '%016x' % number
+    return ':'.join(hex_dpid[i:i + 2] for i in range(0, 16, 2))
+
+
+def make_switch(number, ofp_version='0x04'):
+    """Return a lightweight switch with the DPID built from an integer."""
+    return SimpleNamespace(dpid=dpid_from_int(number),
+                           ofp_version=ofp_version, interfaces={})
+
+
+def make_link(dpid_a, dpid_b):
+    """Return a link in the format given by Link.as_dict()."""
+    return {'endpoint_a': {'switch': dpid_a},
+            'endpoint_b': {'switch': dpid_b}}
+
+
+def leaf_spine(spines, leaves):
+    """Return (switches, links) of a leaf-spine topology."""
+    switches = [make_switch(i + 1) for i in range(spines + leaves)]
+    links = [make_link(spine.dpid, leaf.dpid)
+             for spine in switches[:spines]
+             for leaf in switches[spines:]]
+    return switches, links
+
+
+def ring(size):
+    """Return (switches, links) of a ring topology."""
+    switches = [make_switch(i + 1) for i in range(size)]
+    links = [make_link(switches[i].dpid, switches[(i + 1) % size].dpid)
+             for i in range(size)]
+    return switches, links
+
+
+def fat_tree(pods):
+    """Return (switches, links) of a k-ary fat-tree, with k = pods.
+
+    It has (k/2)^2 core switches and k/2 aggregation plus k/2 edge switches
+    in each pod.
+    """
+    half = pods // 2
+    count = iter(range(1, 5 * half * half + 1))
+    core = [make_switch(next(count)) for _ in range(half * half)]
+    switches = list(core)
+    links = []
+    for _ in range(pods):
+        aggregation = [make_switch(next(count)) for _ in range(half)]
+        edge = [make_switch(next(count)) for _ in range(half)]
+        switches.extend(aggregation + edge)
+        for index, agg in enumerate(aggregation):
+            links.extend(make_link(agg.dpid, core[index * half + i].dpid)
+                         for i in range(half))
+            links.extend(make_link(agg.dpid, edge_switch.dpid)
+                         for edge_switch in edge)
+    return switches, links
+
+
+def random_topology(size, degree, seed=0):
+    """Return (switches, links) of a connected random topology with about
+    the given average degree.
+    """
+    rand = random.Random(seed)
+    switches = [make_switch(i + 1) for i in range(size)]
+    adjacencies = {(i - 1, i) for i in range(1, size)}
+    while len(adjacencies) < size * degree // 2:
+        source, target = sorted(rand.sample(range(size), 2))
+        adjacencies.add((source, target))
+    links = [make_link(switches[source].dpid, switches[target].dpid)
+             for source, target in sorted(adjacencies)]
+    return switches, links
+
+
+def make_napp(switches, seed=False):
+    """Return a Main instance over a mocked controller with the switches.
+    :param seed: Let the NApp color the switches when it is loaded
+    """
+    settings.STATE_FILE = None
+    settings.REMOVE_FLOWS_ON_SHUTDOWN = False
+    settings.SWITCH_FLOW_RATE = 0
+    settings.GLOBAL_FLOW_RATE = 0
+    controller = Mock(spec=Controller)
+    controller.switches = {switch.dpid: switch for switch in switches}
+    controller.get_switch_by_dpid = controller.switches.get
+    controller.buffers = Mock()
+    if seed:
+        return Main(controller)
+    known = controller.switches
+    controller.switches = {}
+    napp = Main(controller)
+    controller.switches = known
+    return napp
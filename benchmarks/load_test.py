@@ -0,0 +1,260 @@
+"""Load test the flow push path against a local stub flow_manager.
+
+Sequences of topology events (bring-up, link flaps and a mass reconnect of
+the switches) are replayed through topology_updated from a separate
+thread, while execute() runs on its own tick, as in a Kytos controller.
+The stub flow_manager simulates latency, errors and throttling, and the
+rate limits of the NApp can be set. For each scenario, the throughput, the
+tail latency of the requests, the time switches waited in the work queue,
+by priority, and the time to converge after the last event are printed as
+JSON. Nothing leaves the host.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.load_test --spines 8 --leaves 128 --latency 0.005
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+from napps.amlight.coloring import settings
+from napps.amlight.coloring.rate_limit import FlowRateLimiter
+from napps.amlight.coloring.work_queue import WorkQueue
+
+from benchmarks.helpers import leaf_spine, make_napp
+from benchmarks.stub_flow_manager import StubFlowManager
+
+
+def topology_event(links):
+    """Return a kytos/topology.updated event with the links."""
+    def endpoint(dpid):
+        return SimpleNamespace(switch=SimpleNamespace(dpid=dpid))
+
+    return SimpleNamespace(content={'topology': SimpleNamespace(links={
+        index: SimpleNamespace(endpoint_a=endpoint(link['endpoint_a']
+                                                   ['switch']),
+                               endpoint_b=endpoint(link['endpoint_b']
+                                                   ['switch']))
+        for index, link in enumerate(links)})})
+
+
+def links_between(switches, links):
+    """Return the links whose switches are all in a list."""
+    dpids = {switch.dpid for switch in switches}
+    return [link for link in links
+            if link['endpoint_a']['switch'] in dpids and
+            link['endpoint_b']['switch'] in dpids]
+
+
+def bring_up(switches, links, steps):
+    """Return the steps of switches connecting in `steps` waves."""
+    size = -(-len(switches) // steps)
+    return [(switches[:end], links_between(switches[:end], links))
+            for end in range(size, len(switches) + size, size)]
+
+
+def flaps(switches, links, count, times):
+    """Return the steps of `count` links going down and up `times` times."""
+    return [(switches, links[count:] if down else links)
+            for _ in range(times) for down in (True, False)]
+
+
+def mass_reconnect(switches, links):
+    """Return the steps of every switch disconnecting and reconnecting."""
+    return [([], []), (switches, links)]
+
+
+SCENARIOS = {
+    'bring_up': lambda switches, links, args: bring_up(switches, links,
+                                                       args.steps),
+    'flaps': lambda switches, links, args: flaps(switches, links,
+                                                 args.flapping, args.flaps),
+    'mass_reconnect': lambda switches, links, args: mass_reconnect(switches,
+                                                                   links)}
+
+
+def percentile(values, fraction):
+    """Return a percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def converged(napp):
+    """Return True if the NApp has no recoloring or flow push pending."""
+    return not (napp.scheduler.stats['pending'] or napp.work_queue or
+                napp.retry_queue.stats['pending'] or
+                napp.damper.reuse_due())
+
+
+class LoadDriver:
+    """Replay topology events through a NApp and tick its execute()."""
+
+    def __init__(self, napp, tick):
+        self.napp = napp
+        self.tick = tick
+        self.latencies = []
+        send = napp.flow_pusher.send
+
+        def timed_send(method, dpid, batch):
+            start = time.perf_counter()
+            result = send(method, dpid, batch)
+            self.latencies.append(time.perf_counter() - start)
+            return result
+        napp.flow_pusher.send = timed_send
+
+    def replay(self, steps, gap):
+        """Deliver each step as a topology event, `gap` seconds apart."""
+        for switches, links in steps:
+            self.napp.controller.switches = {switch.dpid: switch
+                                             for switch in switches}
+            self.napp.topology_updated(topology_event(links))
+            time.sleep(gap)
+
+    def run(self, steps, gap, timeout):
+        """Replay the steps and tick until the NApp converges.
+        :return: Seconds from the start to the last event and to the
+        convergence, which is None on timeout
+        """
+        events = threading.Thread(target=self.replay, args=(steps, gap))
+        start = time.perf_counter()
+        events.start()
+        last_event = None
+        while True:
+            tick_start = time.perf_counter()
+            self.napp.execute()
+            if last_event is None and not events.is_alive():
+                last_event = time.perf_counter() - start
+            if last_event is not None and converged(self.napp):
+                return last_event, time.perf_counter() - start
+            if time.perf_counter() - start > timeout:
+                events.join()
+                return last_event, None
+            time.sleep(max(self.tick - (time.perf_counter() - tick_start),
+                           0))
+
+
+def run(name, args, stub):
+    """Run a scenario and return a dict with the results."""
+    switches, links = leaf_spine(args.spines, args.leaves)
+    napp = make_napp(switches)
+    napp.controller.switches = {}
+    if name != 'bring_up':
+        napp.update_colors(links)
+        napp.controller.switches = {switch.dpid: switch
+                                    for switch in switches}
+        napp.update_colors(links)
+    stub.reset()
+    retries = napp.metrics.get('coloring_retries_total')
+    napp.rate_limiter = FlowRateLimiter(args.switch_rate, args.switch_burst,
+                                        args.global_rate, args.global_burst)
+    waits = {}
+
+    def observe_wait(priority, wait):
+        napp.observe_wait(priority, wait)
+        waits.setdefault(priority, []).append(wait)
+    napp.work_queue = WorkQueue(observe=observe_wait)
+    driver = LoadDriver(napp, args.tick)
+    steps = SCENARIOS[name](switches, links, args)
+    last_event, convergence = driver.run(steps, args.gap, args.timeout)
+    napp.shutdown()
+
+    latencies = sorted(driver.latencies)
+    flows = stub.total_flows + sum(len(flows)
+                                   for flows in stub.deleted.values())
+    elapsed = convergence or args.timeout
+    return {
+        'scenario': name,
+        'events': len(steps),
+        'seconds_to_last_event': round(last_event, 3),
+        'convergence_seconds': (round(convergence - last_event, 3)
+                                if convergence is not None else None),
+        'requests': sum(stub.responses.values()),
+        'responses': {str(status): count
+                      for status, count in sorted(stub.responses.items())},
+        'flows_sent': flows,
+        'throughput_flows_per_second': round(flows / elapsed, 1),
+        'request_latency_seconds': {
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None,
+            'mean': statistics.mean(latencies) if latencies else None},
+        'retries': napp.metrics.get('coloring_retries_total') - retries,
+        'switches_throttled': napp.rate_limiter.throttled,
+        'work_wait_seconds': {
+            priority: {'p50': percentile(sorted(values), 0.5),
+                       'p95': percentile(sorted(values), 0.95),
+                       'max': max(values)}
+            for priority, values in sorted(waits.items())},
+        'adjacencies_suppressed': sum(
+            1 for record in napp.damper.state().values()
+            if record['suppressed']),
+        'flows_recorded': sum(len(switch_state.flows)
+                              for switch_state in napp.switches.values()),
+        'flows_installed': sum(
+            len(stub.installed.get(switch_state.dpid, {}))
+            for switch_state in napp.switches.values())}
+
+
+def main():
+    """Run the scenarios and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--spines', type=int, default=4)
+    parser.add_argument('--leaves', type=int, default=64)
+    parser.add_argument('--steps', type=int, default=4,
+                        help='Waves of switches connecting in bring_up')
+    parser.add_argument('--flapping', type=int, default=4,
+                        help='Links flapping in flaps')
+    parser.add_argument('--flaps', type=int, default=5,
+                        help='Times each link flaps in flaps')
+    parser.add_argument('--gap', type=float, default=0.2,
+                        help='Seconds between events')
+    parser.add_argument('--tick', type=float, default=0.05,
+                        help='Seconds between calls to execute()')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--jitter', type=float, default=0.002)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Requests per second served by flow_manager')
+    parser.add_argument('--switch-rate', type=float, default=0,
+                        help='Flows per second sent to each switch')
+    parser.add_argument('--switch-burst', type=float, default=0)
+    parser.add_argument('--global-rate', type=float, default=0,
+                        help='Flows per second sent to all switches')
+    parser.add_argument('--global-burst', type=float, default=0)
+    parser.add_argument('--output', help='File to write the results to')
+    args = parser.parse_args()
+
+    # Compress the scheduling times so that scenarios run in seconds
+    settings.COLORING_INTERVAL = args.gap * 2
+    settings.COLORING_QUIET_TIME = args.gap / 2
+    settings.COLORING_MAX_STALENESS = args.gap * 10
+    settings.COLORING_TICK_BUDGET = args.tick
+    settings.RETRY_BASE_DELAY = args.tick
+    settings.RETRY_MAX_DELAY = args.gap * 5
+    settings.BREAKER_TIMEOUT = args.gap * 10
+    settings.FLAP_HALF_LIFE = args.gap * 10
+    settings.FLAP_MAX_SUPPRESS_TIME = args.gap * 100
+
+    report = {'settings': vars(args), 'results': []}
+    for name in args.scenarios.split(','):
+        with StubFlowManager(latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate,
+                             rate_limit=args.rate_limit) as stub:
+            settings.FLOW_MANAGER_URL = stub.url
+            report['results'].append(run(name, args, stub))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
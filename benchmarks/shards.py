@@ -0,0 +1,139 @@
+"""Run the NApp as several shards in worker processes on this host.
+
+Each worker process runs a shard over the same leaf-spine topology, with a
+shared temporary channel folder and a stub flow_manager. Once every switch
+has its color flows, one worker is killed without leaving, and the others
+take over its switches after settings.SHARD_TIMEOUT. The switches of each
+shard, the time to install the flows, the time to rebalance and the
+neighbors each shard sees with the same color are printed as JSON.
+
+Run from the NApp directory with:
+
+    python -m benchmarks.shards --workers 3 --spines 4 --leaves 64
+"""
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+
+from napps.amlight.coloring import settings
+
+from benchmarks.helpers import leaf_spine, make_napp
+from benchmarks.stub_flow_manager import StubFlowManager
+
+
+def worker(shard_id, args, url, folder, reports, stop):
+    """Run a shard, reporting its state on each tick until `stop` is set."""
+    settings.FLOW_MANAGER_URL = url
+    settings.SHARD_ID = shard_id
+    settings.SHARD_CHANNEL = folder
+    settings.SHARD_TIMEOUT = args.shard_timeout
+    settings.COLORING_STRATEGY = args.strategy
+    switches, links = leaf_spine(args.spines, args.leaves)
+    napp = make_napp(switches)
+    while len(napp.sharding.ring.members) < args.workers:
+        napp.sync_shards()
+        time.sleep(args.tick)
+    napp.update_colors(links)
+    while not stop.is_set():
+        napp.execute()
+        owned = [number for number in napp.switches if napp.owns(number)]
+        reports[shard_id] = {
+            'members': len(napp.sharding.ring.members),
+            'owned': len(owned),
+            'conflicts': sum(
+                1 for source, target in napp.adjacencies
+                if napp.switches[source].color ==
+                napp.switches[target].color),
+            'pending': (len(napp.work_queue) +
+                        napp.retry_queue.stats['pending'] +
+                        len(napp.unverified & set(owned)))}
+        time.sleep(args.tick)
+    napp.shutdown()
+
+
+def wait(condition, timeout):
+    """Wait until `condition()` holds.
+    :return: The seconds waited, or None on timeout
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if condition():
+            return round(time.perf_counter() - start, 3)
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    """Run the shards and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--spines', type=int, default=4)
+    parser.add_argument('--leaves', type=int, default=64)
+    parser.add_argument('--tick', type=float, default=0.1,
+                        help='Seconds between calls to execute()')
+    parser.add_argument('--shard-timeout', type=float, default=2)
+    parser.add_argument('--strategy', default='dpid',
+                        help='Coloring strategy of the shards')
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+    switches = args.spines + args.leaves
+    context = multiprocessing.get_context('fork')
+    manager = context.Manager()
+    reports = manager.dict()
+    stop = context.Event()
+
+    with StubFlowManager(latency=args.latency) as stub, \
+            tempfile.TemporaryDirectory() as folder:
+        shard_ids = ['shard%d' % index for index in range(args.workers)]
+        processes = [context.Process(target=worker,
+                                     args=(shard_id, args, stub.url, folder,
+                                           reports, stop))
+                     for shard_id in shard_ids]
+        for process in processes:
+            process.start()
+
+        def converged(shards):
+            def check():
+                current = [reports.get(shard_id) for shard_id in shards]
+                return all(report is not None and
+                           report['members'] == len(shards) and
+                           not report['pending'] for report in current) and \
+                    sum(report['owned'] for report in current) == switches
+            return check
+
+        install = wait(converged(shard_ids), args.timeout)
+        owned = {shard_id: report['owned']
+                 for shard_id, report in sorted(reports.items())}
+        flows = stub.installed_flows
+        stub.reset()
+
+        processes[0].kill()
+        rebalance = wait(converged(shard_ids[1:]), args.timeout)
+        latest = dict(reports)
+        stop.set()
+        for process in processes:
+            process.join()
+        manager.shutdown()
+        print(json.dumps({
+            'settings': vars(args),
+            'switches': switches,
+            'switches_per_shard': owned,
+            'install_seconds': install,
+            'flows_installed': flows,
+            'killed': shard_ids[0],
+            'rebalance_seconds': rebalance,
+            'switches_per_shard_after': {
+                shard_id: latest[shard_id]['owned']
+                for shard_id in shard_ids[1:]},
+            'neighbors_with_same_color': {
+                shard_id: latest[shard_id]['conflicts']
+                for shard_id in shard_ids[1:]},
+            'flows_pushed_after': stub.total_flows,
+            'flows_installed_after': stub.installed_flows}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
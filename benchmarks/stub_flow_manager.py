@@ -0,0 +1,223 @@
+"""Local stand-in for the kytos/flow_manager REST API.
+
+It accepts the same requests as flow_manager's v2/flows/<dpid> endpoint and
+keeps the flows installed in each switch, so the flow push path can be
+measured without a Kytos deployment. Latency, errors and throttling of a
+loaded flow_manager can be simulated.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in a new thread."""
+
+    daemon_threads = True
+
+
+class _FlowManagerHandler(BaseHTTPRequestHandler):
+    """Handle flow_manager requests, recording them in the server stub."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _dpid(self):
+        """Return the DPID in the path."""
+        return self.path.rstrip('/').split('/')[-1]
+
+    def _read_flows(self):
+        """Return the DPID in the path and the flows in the request body."""
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        return self._dpid(), body.get('flows', [])
+
+    def _respond(self, status, body=None):
+        """Send a response with an optional JSON body."""
+        payload = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        if payload:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        """Apply a request after the simulated latency, unless it fails or
+        is throttled.
+        """
+        stub = self.server.stub
+        start = time.perf_counter()
+        if method == 'get':
+            dpid, flows = self._dpid(), None
+        else:
+            dpid, flows = self._read_flows()
+        status = stub.admit()
+        if status == 200:
+            stub.delay()
+            body = stub.apply(method, dpid, flows)
+            self._respond(200 if method == 'get' else 202, body)
+        else:
+            self._respond(status)
+        stub.record(method, status, time.perf_counter() - start)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """List the flows installed in a switch."""
+        self._handle('get')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Receive flows to be installed."""
+        self._handle('post')
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """Receive flows to be removed."""
+        self._handle('delete')
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log each request."""
+
+
+class StubFlowManager:
+    """Lightweight flow_manager server running in a background thread.
+
+    Use it as a context manager. While running, `url` is a flow_manager URL
+    template suitable for settings.FLOW_MANAGER_URL.
+
+    Each request waits `latency` seconds, plus up to `jitter` seconds, and
+    fails with a 500 with probability `error_rate`. With a `rate_limit`,
+    requests beyond `rate_limit` per second, after a burst of `burst`
+    requests, are rejected with a 429.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0,
+                 error_rate=0, rate_limit=None, burst=None, seed=0):
+        self._server = _ThreadingHTTPServer((host, port), _FlowManagerHandler)
+        self._server.stub = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst or rate_limit
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self.installed = {}
+        self.reset()
+
+    @property
+    def url(self):
+        """Flow manager URL template, with %s in place of the dpid."""
+        host, port = self._server.server_address[:2]
+        return ('http://%s:%s/api/kytos/flow_manager/v2/flows/%%s' %
+                (host, port))
+
+    def admit(self):
+        """Return 200 if a request is served, or the error status of a
+        throttled or failed request.
+        """
+        with self._lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (
+                    now - self._refilled) * self.rate_limit)
+                self._refilled = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+            if self._random.random() < self.error_rate:
+                return 500
+            return 200
+
+    def delay(self):
+        """Wait for the simulated latency of a request."""
+        with self._lock:
+            delay = self.latency + self._random.random() * self.jitter
+        if delay:
+            time.sleep(delay)
+
+    def apply(self, method, dpid, flows):
+        """Apply a request to the flows installed in a switch.
+        :return: The response body of a GET, or None
+        """
+        with self._lock:
+            installed = self.installed.setdefault(dpid, {})
+            if method == 'get':
+                return {dpid: {'flows': list(installed.values())}}
+            if method == 'post':
+                self.requests += 1
+                self.flows.setdefault(dpid, []).extend(flows)
+                for flow in flows:
+                    installed[self._flow_key(flow)] = flow
+                return None
+            self.requests += 1
+            self.deleted.setdefault(dpid, []).extend(flows)
+            for flow in flows:
+                if 'match' in flow:
+                    installed.pop(self._flow_key(flow), None)
+                    continue
+                mask = flow.get('cookie_mask', 0)
+                for key, current in list(installed.items()):
+                    if current.get('cookie', 0) & mask == \
+                            flow.get('cookie', 0) & mask:
+                        del installed[key]
+            return None
+
+    @staticmethod
+    def _flow_key(flow):
+        """Return the key of a flow in the flow table of a switch."""
+        return (flow.get('table_id', 0), flow.get('priority'),
+                json.dumps(flow.get('match', {}), sort_keys=True))
+
+    def record(self, method, status, seconds):
+        """Record the outcome and service time of a request."""
+        with self._lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+            self.service_times.append(seconds)
+
+    def reset(self):
+        """Clear the recorded requests and flows, keeping the flows
+        installed in the switches.
+        """
+        with self._lock:
+            self.requests = 0
+            self.flows = {}
+            self.deleted = {}
+            self.responses = {}
+            self.service_times = []
+
+    @property
+    def total_flows(self):
+        """Number of flows received so far."""
+        with self._lock:
+            return sum(len(flows) for flows in self.flows.values())
+
+    @property
+    def installed_flows(self):
+        """Number of flows installed in all switches."""
+        with self._lock:
+            return sum(len(flows) for flows in self.installed.values())
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and release the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,90 @@
+"""Reverse index from encoded colors to the switches having them."""
+from threading import Lock
+
+from napps.amlight.coloring.encoding import field_encoding
+
+
+class ColorIndex:
+    """Map the value of a color encoded in a field to switch keys.
+
+    The index of an encoding is built from the ColorEncodings of the
+    switches on its first lookup and then kept up to date as switches are
+    colored, so each lookup costs O(1). Fields sharing an encoding share
+    their index.
+    """
+
+    def __init__(self, encodings):
+        """
+        :param encodings: ColorEncodings of the switches
+        """
+        self._encodings = encodings
+        self._lock = Lock()
+        self._indexes = {}
+
+    def update(self, keys):
+        """Index the colors of switches, once they are encoded."""
+        with self._lock:
+            for encoded, index, indexed in self._indexes.values():
+                for key in keys:
+                    self._unindex(key, index, indexed)
+                    value = encoded.get(key)
+                    if value is not None:
+                        index.setdefault(value, set()).add(key)
+                        indexed[key] = value
+
+    def remove(self, key):
+        """Remove a switch from the index."""
+        with self._lock:
+            for _, index, indexed in self._indexes.values():
+                self._unindex(key, index, indexed)
+
+    def clear(self):
+        """Drop the indexes, which are built again on the next lookup."""
+        with self._lock:
+            self._indexes = {}
+
+    @staticmethod
+    def _unindex(key, index, indexed):
+        """Remove the color of a switch from an index."""
+        if key not in indexed:
+            return
+        value = indexed.pop(key)
+        keys = index[value]
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+    def _index(self, field):
+        """Return the index of a field, building it if needed."""
+        encoding = field_encoding(field)
+        if encoding not in self._indexes:
+            encoded = self._encodings.field_values(field)
+            index = {}
+            indexed = dict(encoded)
+            for key, value in indexed.items():
+                index.setdefault(value, set()).add(key)
+            self._indexes[encoding] = (encoded, index, indexed)
+        return self._indexes[encoding][1]
+
+    @staticmethod
+    def normalize(value):
+        """Return a value as given by color_to_field."""
+        if isinstance(value, str):
+            value = value.lower()
+            if value.isdigit():
+                return int(value)
+        return value
+
+    def lookup(self, value, field):
+        """Return the set of keys of the switches whose color is encoded
+        as value.
+        """
+        with self._lock:
+            return set(self._index(field).get(self.normalize(value), ()))
+
+    def lookup_many(self, values, field):
+        """Return a list with the set of switch keys of each value."""
+        with self._lock:
+            index = self._index(field)
+            return [set(index.get(self.normalize(value), ()))
+                    for value in values]
@@ -0,0 +1,145 @@
+"""Strategies to pick the color of each switch.
+
+Each strategy colors the switches of the coloring state kept by the NApp, a
+dict mapping the integer DPID of each switch to a SwitchState with its
+color and neighbors. Switches not colored yet have the color None.
+"""
+import heapq
+
+
+class DpidColoring:
+    """Color each switch with the lower bits of its DPID.
+
+    Colors never change, but they may collide once truncated to the width of
+    the color field.
+    """
+
+    @staticmethod
+    def dpid_color(number):
+        """Return the color of a switch based on its integer DPID."""
+        return number & 0xffffffffffff
+
+    def recolor(self, switches, affected):
+        """Color the affected switches that have no color yet.
+        :param switches: The coloring state of all switches
+        :param affected: DPIDs of the switches that are new or had their
+        adjacencies changed
+        :return: The set of DPIDs whose previous color was changed
+        """
+        for dpid in affected:
+            if switches[dpid].color is None:
+                switches[dpid].color = self.dpid_color(dpid)
+        return set()
+
+
+class GreedyColoring:
+    """Distance-1 coloring using the smallest color free among neighbors.
+
+    Colors are kept between updates. Only new switches and switches in
+    conflict with a neighbor because of a new adjacency are recolored, so
+    the palette stays small without changing the colors of the whole
+    network on each update.
+    """
+
+    first_color = 1
+
+    def recolor(self, switches, affected):
+        """Color new switches and solve conflicts between neighbors.
+        :param switches: The coloring state of all switches
+        :param affected: DPIDs of the switches that are new or had their
+        adjacencies changed
+        :return: The set of DPIDs whose previous color was changed
+        """
+        previous = {}
+        uncolored = set()
+        for dpid in sorted(affected):
+            switch_state = switches[dpid]
+            color = switch_state.color
+            if color is None:
+                uncolored.add(dpid)
+            elif any(switches[neighbor].color == color
+                     for neighbor in switch_state.neighbors):
+                previous[dpid] = color
+                switch_state.color = None
+                uncolored.add(dpid)
+
+        self.color_switches(switches, uncolored)
+        return {dpid for dpid, color in previous.items()
+                if switches[dpid].color != color}
+
+    def color_switches(self, switches, uncolored):
+        """Color switches from the highest to the lowest degree."""
+        order = sorted(uncolored,
+                       key=lambda dpid: (-len(switches[dpid].neighbors),
+                                         dpid))
+        for dpid in order:
+            switches[dpid].color = self.free_color(switches, dpid)
+
+    def free_color(self, switches, dpid):
+        """Return the smallest color not used by the neighbors of a switch."""
+        used = {switches[neighbor].color
+                for neighbor in switches[dpid].neighbors}
+        color = self.first_color
+        while color in used:
+            color += 1
+        return color
+
+
+class DSaturColoring(GreedyColoring):
+    """Distance-1 coloring choosing the most saturated switch first.
+
+    The saturation of a switch is the number of distinct colors among its
+    neighbors. Coloring the most constrained switches first usually needs
+    fewer colors than the greedy order.
+    """
+
+    def color_switches(self, switches, uncolored):
+        """Color switches in DSatur order."""
+        saturation = {dpid: {switches[neighbor].color
+                             for neighbor in switches[dpid].neighbors}
+                      - {None}
+                      for dpid in uncolored}
+        heap = [(-len(saturation[dpid]), -len(switches[dpid].neighbors),
+                 dpid) for dpid in uncolored]
+        heapq.heapify(heap)
+        while heap:
+            negative_saturation, _, dpid = heapq.heappop(heap)
+            if dpid not in saturation or \
+                    -negative_saturation != len(saturation[dpid]):
+                continue
+            color = self.free_color(switches, dpid)
+            switches[dpid].color = color
+            del saturation[dpid]
+            for neighbor in switches[dpid].neighbors:
+                if neighbor in saturation and \
+                        color not in saturation[neighbor]:
+                    saturation[neighbor].add(color)
+                    heapq.heappush(heap, (
+                        -len(saturation[neighbor]),
+                        -len(switches[neighbor].neighbors), neighbor))
+
+
+COLORING_STRATEGIES = {
+    'dpid': DpidColoring,
+    'greedy': GreedyColoring,
+    'dsatur': DSaturColoring,
+}
+
+
+def find_collisions(switches, dpids, encoded):
+    """Find neighbors whose colors are the same once encoded in the field.
+    Switches without a color are skipped.
+    :param switches: The coloring state of all switches
+    :param dpids: DPIDs of the switches to be checked
+    :param encoded: dict mapping DPIDs to their colors encoded in the field
+    :return: A sorted list of (dpid, neighbor) tuples with colliding colors
+    """
+    collisions = set()
+    for dpid in dpids:
+        value = encoded.get(dpid)
+        if value is None:
+            continue
+        for neighbor in switches[dpid].neighbors:
+            if encoded.get(neighbor) == value:
+                collisions.add((min(dpid, neighbor), max(dpid, neighbor)))
+    return sorted(collisions)
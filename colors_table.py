@@ -0,0 +1,67 @@
+"""Versioned table of the switch colors served by the REST API."""
+import json
+import uuid
+
+from napps.amlight.coloring.state import int_to_dpid
+
+
+def dpid_pairs(adjacencies):
+    """Return the sorted list of DPID pairs of a set of adjacencies."""
+    return sorted([int_to_dpid(source), int_to_dpid(target)]
+                  for source, target in adjacencies)
+
+
+class ColorsTable:
+    """Encoded colors of the switches and their version.
+
+    The version is bumped whenever the colors or the adjacencies change.
+    Versions restart with each process, so they are only meaningful along
+    with the random epoch of the process. The table and its JSON
+    serialization are only built once per version and color field, when
+    first requested.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex
+        self.version = 0
+        self._cache = None
+
+    def bump(self):
+        """Bump the version, dropping the cached table.
+        :return: The previous version
+        """
+        previous = self.version
+        self.version += 1
+        self._cache = None
+        return previous
+
+    def get(self, encodings, field):
+        """Return the version and the field of the colors, the dict mapping
+        DPIDs to their encoded colors and its JSON serialization.
+        :param encodings: ColorEncodings of the switches, by integer DPID
+        :param field: The field the colors are encoded for
+        """
+        cache = self._cache
+        if cache is None or cache[0] != (self.version, field):
+            version = self.version
+            colors = {int_to_dpid(number): {'color_field': field,
+                                            'color_value': value}
+                      for number, value in sorted(
+                          encodings.field_values(field).items())}
+            body = json.dumps({'colors': colors, 'epoch': self.epoch,
+                               'version': version})
+            cache = ((version, field), colors, body)
+            self._cache = cache
+        return cache
+
+    def snapshot(self, encodings, adjacencies, field):
+        """Return the colors and adjacencies of all switches with their
+        version, so that consumers of the colors_changed events can sync
+        before applying the next deltas.
+        """
+        (version, field), colors, _ = self.get(encodings, field)
+        return {'epoch': self.epoch,
+                'version': version,
+                'color_field': field,
+                'colors': colors,
+                'adjacencies': dpid_pairs(adjacencies)}
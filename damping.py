@@ -0,0 +1,82 @@
+"""Damp the adjacencies that flap, like BGP route flap dampening."""
+import time
+
+
+class FlapDamper:
+    """Hold down the adjacencies that keep going up and down.
+
+    Each time an adjacency goes down it gets `penalty` points, which decay
+    by half every `half_life` seconds. Once its penalty exceeds
+    `suppress_threshold` the adjacency is suppressed, that is, treated as
+    down, until the penalty decays below `reuse_threshold`. The penalty is
+    capped so that no adjacency is suppressed for more than
+    `max_suppress_time` seconds after its last flap.
+    """
+
+    def __init__(self, penalty, half_life, suppress_threshold,
+                 reuse_threshold, max_suppress_time, clock=time.monotonic):
+        self.penalty = penalty
+        self.half_life = half_life
+        self.suppress_threshold = suppress_threshold
+        self.reuse_threshold = reuse_threshold
+        # The exponent is capped so that the float does not overflow
+        self.max_penalty = reuse_threshold * 2 ** min(
+            max_suppress_time / half_life, 64)
+        self._clock = clock
+        self.observed = set()
+        # adjacency -> [penalty, time of the penalty, suppressed, flaps]
+        self._records = {}
+
+    def _decayed(self, record, now):
+        """Return the penalty of a record decayed until now."""
+        return record[0] * 0.5 ** ((now - record[1]) / self.half_life)
+
+    def _refresh(self, now):
+        """Decay the penalties, reinstating and forgetting adjacencies."""
+        for adjacency, record in list(self._records.items()):
+            record[0] = self._decayed(record, now)
+            record[1] = now
+            if record[2] and record[0] < self.reuse_threshold:
+                record[2] = False
+            if not record[2] and record[0] < self.reuse_threshold / 2:
+                del self._records[adjacency]
+
+    def update(self, adjacencies):
+        """Penalize the adjacencies that went down since the previous call.
+        :param adjacencies: Set of the adjacencies currently up
+        :return: The adjacencies up and not suppressed
+        """
+        now = self._clock()
+        self._refresh(now)
+        for adjacency in self.observed - adjacencies:
+            record = self._records.setdefault(adjacency, [0, now, False, 0])
+            record[0] = min(record[0] + self.penalty, self.max_penalty)
+            record[3] += 1
+            if record[0] > self.suppress_threshold:
+                record[2] = True
+        self.observed = adjacencies
+        return {adjacency for adjacency in adjacencies
+                if not self.is_suppressed(adjacency)}
+
+    def is_suppressed(self, adjacency):
+        """Return True if an adjacency is held down."""
+        record = self._records.get(adjacency)
+        return record is not None and record[2]
+
+    def reuse_due(self):
+        """Return True if a suppressed adjacency can be reinstated."""
+        now = self._clock()
+        return any(record[2] and
+                   self._decayed(record, now) < self.reuse_threshold
+                   for record in self._records.values())
+
+    def state(self):
+        """Return the adjacencies with a penalty.
+        :return: A dict mapping each adjacency to a dict with its decayed
+        penalty, number of flaps and whether it is suppressed
+        """
+        now = self._clock()
+        return {adjacency: {'penalty': round(self._decayed(record, now), 1),
+                            'flaps': record[3],
+                            'suppressed': record[2]}
+                for adjacency, record in list(self._records.items())}
@@ -0,0 +1,134 @@
+"""Encode many switch colors at once for the color fields.
+
+The values are the same as Main.color_to_field. Fields sharing an
+encoding, such as dl_src and dl_dst, are encoded once. Colors are encoded
+with lookup tables of the text of each byte. MAC addresses are built with
+NumPy when it is installed: for the other encodings, converting the colors
+to an array costs more than the lookup tables. NumPy is only imported when
+first used, since importing it takes longer than loading the NApp.
+"""
+from functools import lru_cache
+from importlib.util import find_spec
+
+#: True if NumPy is installed
+HAS_NUMPY = find_spec('numpy') is not None
+
+#: Encoding of each color field
+FIELD_ENCODINGS = {'dl_src': 'mac', 'dl_dst': 'mac',
+                   'nw_src': 'ipv4', 'nw_dst': 'ipv4',
+                   'in_port': 'uint16', 'dl_vlan': 'uint16',
+                   'tp_src': 'uint16', 'tp_dst': 'uint16',
+                   'nw_tos': 'uint8', 'nw_proto': 'uint8'}
+
+# Bytes of a MAC address, with 00 replaced by ee as in color_to_field
+_MAC_BYTES = ['%02x' % byte for byte in range(256)]
+_MAC_BYTES[0] = 'ee'
+_IPV4_BYTES = [str(byte) for byte in range(256)]
+
+
+def field_encoding(field):
+    """Return the encoding of a field. Unknown fields use the lower 8 bits
+    of the colors, as in color_to_field.
+    """
+    return FIELD_ENCODINGS.get(field, 'uint8')
+
+
+def _encode_python(colors, encoding):
+    """Encode a list of colors with lookup tables."""
+    if encoding == 'mac':
+        table = _MAC_BYTES
+        return [':'.join((table[color >> 40 & 0xff], table[color >> 32 & 0xff],
+                          table[color >> 24 & 0xff], table[color >> 16 & 0xff],
+                          table[color >> 8 & 0xff], table[color & 0xff]))
+                for color in colors]
+    if encoding == 'ipv4':
+        table = _IPV4_BYTES
+        return ['.'.join((table[color >> 24 & 0xff], table[color >> 16 & 0xff],
+                          table[color >> 8 & 0xff], table[color & 0xff]))
+                for color in colors]
+    mask = 0xffff if encoding == 'uint16' else 0xff
+    return [color & mask for color in colors]
+
+
+@lru_cache(maxsize=None)
+def _numpy_tables():
+    """Import NumPy and return it with the shift of each byte of a MAC
+    address, the position of its hex digits in the text and the hex digits
+    of each byte as ASCII.
+    """
+    import numpy  # pylint: disable=import-outside-toplevel
+    shifts = numpy.arange(40, -1, -8, dtype=numpy.uint64)
+    digits = [index for index in range(17) if index % 3 != 2]
+    ascii_bytes = numpy.array([list(text.encode()) for text in _MAC_BYTES],
+                              dtype=numpy.uint8)
+    return numpy, shifts, digits, ascii_bytes
+
+
+def _encode_mac_numpy(colors):
+    """Encode a list of colors as MAC addresses with vectorized bit
+    operations, writing the text of every address in a single buffer.
+    """
+    numpy, shifts, digits, ascii_bytes = _numpy_tables()
+    array = numpy.fromiter((color & 0xffffffffffff for color in colors),
+                           dtype=numpy.uint64, count=len(colors))
+    octets = (array[:, None] >> shifts) & 0xff
+    text = numpy.full((len(array), 17), ord(':'), dtype=numpy.uint8)
+    text[:, digits] = ascii_bytes[octets].reshape(len(array), 12)
+    return text.view('S17').ravel().astype('U17').tolist()
+
+
+def _encode(colors, encoding, vectorized=None):
+    """Encode a list of colors with an encoding."""
+    if vectorized is None:
+        vectorized = HAS_NUMPY
+    if vectorized and colors and encoding == 'mac':
+        return _encode_mac_numpy(colors)
+    return _encode_python(colors, encoding)
+
+
+def encode_colors(colors, field, vectorized=None):
+    """Encode a list of colors for a field.
+    :param colors: List of non negative integer colors
+    :param vectorized: Use NumPy, by default when it is installed
+    :return: A list with the encoded value of each color
+    """
+    return _encode(colors, field_encoding(field), vectorized)
+
+
+class ColorEncodings:
+    """Colors of the switches encoded for every color field.
+
+    Each encoding is computed when the color of a switch changes, so
+    serving any field, or changing settings.COLOR_FIELD, needs no encoding.
+    """
+
+    def __init__(self):
+        self._values = {encoding: {} for encoding in
+                        set(FIELD_ENCODINGS.values())}
+
+    def update(self, colors):
+        """Encode the colors of switches.
+        :param colors: dict mapping switch keys to their colors
+        """
+        keys = [key for key, color in colors.items() if color is not None]
+        values = [colors[key] for key in keys]
+        for encoding, encoded in self._values.items():
+            encoded.update(zip(keys, _encode(values, encoding)))
+
+    def remove(self, key):
+        """Forget the encodings of a switch."""
+        for encoded in self._values.values():
+            encoded.pop(key, None)
+
+    def clear(self):
+        """Forget the encodings of every switch."""
+        for encoded in self._values.values():
+            encoded.clear()
+
+    def get(self, key, field):
+        """Return the color of a switch encoded for a field."""
+        return self._values[field_encoding(field)][key]
+
+    def field_values(self, field):
+        """Return the dict mapping switch keys to their encoded colors."""
+        return self._values[field_encoding(field)]
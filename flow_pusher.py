@@ -0,0 +1,162 @@
+"""Push flows to kytos/flow_manager.
+
+Flows are sent in batches over a shared keep-alive session, using a pool of
+worker threads so that many switches are programmed in parallel.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from kytos.core import log
+from napps.amlight.coloring import settings
+from napps.amlight.coloring.metrics import Metrics
+
+
+class FlowPusher:
+    """Send flows to flow_manager with bounded parallelism.
+
+    At most `workers` requests are in flight at the same time, and each of
+    them reuses a pooled connection to flow_manager.
+    """
+
+    def __init__(self, workers=None, metrics=None):
+        self.workers = max(workers or settings.FLOW_PUSH_WORKERS, 1)
+        self.metrics = metrics or Metrics()
+        self.metrics.describe('coloring_flow_manager_request_seconds',
+                              'histogram',
+                              'Latency of the requests to flow_manager.')
+        self.metrics.describe('coloring_flows_pushed_total', 'counter',
+                              'Color flows sent to flow_manager, by result.')
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=self.workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = None
+
+    @property
+    def executor(self):
+        """Thread pool used to send the requests, created on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix='coloring_flow_pusher')
+        return self._executor
+
+    @staticmethod
+    def batches(flows):
+        """Split a list of flows in batches of settings.FLOW_BATCH_SIZE."""
+        batch_size = max(settings.FLOW_BATCH_SIZE, 1)
+        return [flows[start:start + batch_size]
+                for start in range(0, len(flows), batch_size)]
+
+    def send(self, method, dpid, batch):
+        """Send one batch of flows to a switch.
+        :param method: HTTP method, 'post' to install and 'delete' to remove
+        :return: True if the batch was accepted by flow_manager
+        """
+        try:
+            with self.metrics.timer('coloring_flow_manager_request_seconds',
+                                    method=method):
+                returned = self.session.request(
+                    method, settings.FLOW_MANAGER_URL % dpid,
+                    json={'flows': batch}, timeout=settings.FLOW_PUSH_TIMEOUT)
+        except requests.RequestException as error:
+            log.error('Error sending %s flows to flow manager (%s) on switch '
+                      '%s: %s' % (len(batch), method, dpid, error))
+            success = False
+        else:
+            success = returned.status_code // 100 == 2
+            if not success:
+                log.error('Flow manager returned an error on %s of %s flows '
+                          'on switch %s. Status code %s' %
+                          (method, len(batch), dpid, returned.status_code))
+        self.metrics.inc('coloring_flows_pushed_total', len(batch),
+                         method=method,
+                         result='success' if success else 'failure')
+        return success
+
+    def run(self, method, flows_by_dpid):
+        """Send flows to many switches in parallel.
+        :param method: HTTP method, 'post' to install and 'delete' to remove
+        :param flows_by_dpid: dict mapping each DPID to a list of flow dicts
+        :return: dict mapping each DPID to a list with one boolean per batch
+        """
+        futures = {dpid: [self.executor.submit(self.send, method, dpid, batch)
+                          for batch in self.batches(flows)]
+                   for dpid, flows in flows_by_dpid.items()}
+        return {dpid: [future.result() for future in dpid_futures]
+                for dpid, dpid_futures in futures.items()}
+
+    def push(self, flows_by_dpid):
+        """Install flows in many switches in parallel.
+        :param flows_by_dpid: dict mapping each DPID to a list of flow dicts
+        :return: dict mapping each DPID to a list with one boolean per batch
+        """
+        return self.run('post', flows_by_dpid)
+
+    def remove(self, flows_by_dpid):
+        """Remove flows from many switches in parallel.
+        :param flows_by_dpid: dict mapping each DPID to a list of flow dicts
+        :return: dict mapping each DPID to a list with one boolean per batch
+        """
+        return self.run('delete', flows_by_dpid)
+
+    def fetch(self, dpid):
+        """Return the flows installed in a switch according to flow_manager.
+        :return: A list of flow dicts, or None if the query failed
+        """
+        try:
+            with self.metrics.timer('coloring_flow_manager_request_seconds',
+                                    method='get'):
+                returned = self.session.get(
+                    settings.FLOW_MANAGER_URL % dpid,
+                    timeout=settings.FLOW_PUSH_TIMEOUT)
+        except requests.RequestException as error:
+            log.error('Error fetching flows of switch %s from flow manager: '
+                      '%s' % (dpid, error))
+            return None
+        if returned.status_code // 100 != 2:
+            log.error('Flow manager returned an error listing flows of '
+                      'switch %s. Status code %s' %
+                      (dpid, returned.status_code))
+            return None
+        return returned.json().get(dpid, {}).get('flows', [])
+
+    def fetch_stats(self, dpid):
+        """Return the flows a switch reported in its latest flow statistics,
+        according to amlight/flow_stats.
+        :return: A list of flow dicts, or None if the query failed
+        """
+        try:
+            with self.metrics.timer('coloring_flow_manager_request_seconds',
+                                    method='stats'):
+                returned = self.session.get(
+                    settings.FLOW_STATS_URL % dpid,
+                    timeout=settings.FLOW_PUSH_TIMEOUT)
+        except requests.RequestException as error:
+            log.error('Error fetching flow stats of switch %s: %s' %
+                      (dpid, error))
+            return None
+        if returned.status_code // 100 != 2:
+            log.error('Flow stats returned an error listing flows of switch '
+                      '%s. Status code %s' % (dpid, returned.status_code))
+            return None
+        return [flow.get('flow', flow) for flow in returned.json()]
+
+    def fetch_all(self, dpids, stats=False):
+        """Query the flows installed in many switches in parallel.
+        :param stats: Query amlight/flow_stats instead of flow_manager
+        :return: dict mapping each DPID to a list of flow dicts, or None if
+        the query of that switch failed
+        """
+        fetch = self.fetch_stats if stats else self.fetch
+        futures = {dpid: self.executor.submit(fetch, dpid)
+                   for dpid in dpids}
+        return {dpid: future.result() for dpid, future in futures.items()}
+
+    def shutdown(self):
+        """Wait for the pending requests and release the resources."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
@@ -6,17 +6,54 @@ NApp to color a network topology
 # with isort.
 # pylint: disable=wrong-import-order
 # isort:skip_file
+import json
 import struct
+import time
 
-import requests
-from flask import jsonify
-from kytos.core import KytosNApp, log, rest
+from flask import current_app, jsonify, request
+from kytos.core import KytosEvent, KytosNApp, log, rest
 from kytos.core.helpers import listen_to
 from napps.amlight.coloring import settings
-from pyof.v0x01.common.phy_port import Port
-from pyof.v0x04.common.port import PortNo
+from napps.amlight.coloring.aggregation import MASKABLE_FIELDS, masked_matches
+from napps.amlight.coloring.audit import FlowAuditor
+from napps.amlight.coloring.color_index import ColorIndex
+from napps.amlight.coloring.colors_table import ColorsTable, dpid_pairs
+from napps.amlight.coloring.damping import FlapDamper
+from napps.amlight.coloring.encoding import FIELD_ENCODINGS, ColorEncodings
+from napps.amlight.coloring.coloring import (COLORING_STRATEGIES,
+                                             DpidColoring, find_collisions)
+from napps.amlight.coloring.flow_pusher import FlowPusher
+from napps.amlight.coloring.metrics import NAPP_METRICS, Metrics
+from napps.amlight.coloring.rate_limit import FlowRateLimiter
+from napps.amlight.coloring.retry import RetryQueue
+from napps.amlight.coloring.scheduler import CoalescingScheduler
+from napps.amlight.coloring.sharding import ShardChannel, Sharding
+from napps.amlight.coloring.state import (FlowTemplate, SwitchState,
+                                          color_cookie, dpid_to_int,
+                                          dump_switches, int_to_dpid,
+                                          load_switches)
+from napps.amlight.coloring.storage import StateStore
+from napps.amlight.coloring.work_queue import (PRIORITY_NEW, PRIORITY_REPAIR,
+                                               PRIORITY_UPDATE, WorkQueue)
 
 
+# Settings listed by GET /settings, by their lowercase names
+EXPOSED_SETTINGS = (
+    'COLOR_FIELD', 'COLORING_STRATEGY', 'COLOR_AGGREGATION',
+    'COLORING_INTERVAL', 'COLORING_QUIET_TIME', 'COLORING_MAX_STALENESS',
+    'TOPOLOGY_URL', 'FLOW_MANAGER_URL', 'FLOW_BATCH_SIZE', 'FLOW_PUSH_WORKERS',
+    'FLOW_PUSH_TIMEOUT', 'FLOW_BACKEND', 'REMOVE_FLOWS_ON_SHUTDOWN',
+    'FLAP_PENALTY', 'FLAP_HALF_LIFE', 'FLAP_SUPPRESS_THRESHOLD',
+    'FLAP_REUSE_THRESHOLD', 'FLAP_MAX_SUPPRESS_TIME', 'RETRY_BASE_DELAY',
+    'RETRY_MAX_DELAY', 'BREAKER_THRESHOLD', 'BREAKER_TIMEOUT',
+    'COLORING_TICK_BUDGET', 'COLORING_CHUNK_SIZE', 'FLOW_STATS_URL',
+    'AUDIT_INTERVAL', 'AUDIT_SAMPLE_RATE', 'AUDIT_SWITCH_BUDGET',
+    'AUDIT_GRACE_TIME', 'SWITCH_FLOW_RATE', 'SWITCH_FLOW_BURST',
+    'GLOBAL_FLOW_RATE', 'GLOBAL_FLOW_BURST', 'SHARD_ID', 'SHARD_CHANNEL',
+    'SHARD_TIMEOUT', 'SHARD_REPLICAS')
+
+
+# pylint: disable=too-many-public-methods,too-many-instance-attributes
 class Main(KytosNApp):
     """Main class of amlight/coloring NApp.
 
@@ -31,85 +68,752 @@ class Main(KytosNApp):
 
         So, if you have any setup routine, insert it here.
         """
+        self.started = time.monotonic()
+        self.first_colored = None
         self.switches = {}
+        self.adjacencies = set()
+        self.damper = FlapDamper(settings.FLAP_PENALTY,
+                                 settings.FLAP_HALF_LIFE,
+                                 settings.FLAP_SUPPRESS_THRESHOLD,
+                                 settings.FLAP_REUSE_THRESHOLD,
+                                 settings.FLAP_MAX_SUPPRESS_TIME)
+        self.coloring = self.coloring_strategy()
+        self.palette = (settings.COLOR_FIELD, settings.COLORING_STRATEGY)
+        self.palette_version = 0
+        self.purges = {}
+        self.encodings = ColorEncodings()
+        self.color_index = ColorIndex(self.encodings)
+        self.colors = ColorsTable()
+        self.metrics = Metrics()
+        self.describe_metrics()
+        if settings.FLOW_BACKEND == 'openflow':
+            # pyof is only imported by the NApp when FlowMods are built
+            # pylint: disable=import-outside-toplevel
+            from napps.amlight.coloring.openflow_pusher import OpenFlowPusher
+            self.flow_pusher = OpenFlowPusher(self.controller,
+                                              metrics=self.metrics)
+        else:
+            if settings.FLOW_BACKEND != 'flow_manager':
+                log.error('Unknown flow backend %s. Using flow_manager '
+                          'instead.' % (settings.FLOW_BACKEND,))
+            self.flow_pusher = FlowPusher(metrics=self.metrics)
+        self.retry_queue = RetryQueue(settings.RETRY_BASE_DELAY,
+                                      settings.RETRY_MAX_DELAY,
+                                      settings.BREAKER_THRESHOLD,
+                                      settings.BREAKER_TIMEOUT)
+        self.work_queue = WorkQueue(observe=self.observe_wait)
+        self.rate_limiter = FlowRateLimiter(settings.SWITCH_FLOW_RATE,
+                                            settings.SWITCH_FLOW_BURST,
+                                            settings.GLOBAL_FLOW_RATE,
+                                            settings.GLOBAL_FLOW_BURST)
+        self.auditor = FlowAuditor(settings.AUDIT_INTERVAL,
+                                   settings.AUDIT_SAMPLE_RATE,
+                                   settings.AUDIT_SWITCH_BUDGET,
+                                   settings.AUDIT_GRACE_TIME)
+        self.scheduler = CoalescingScheduler(settings.COLORING_INTERVAL,
+                                             settings.COLORING_QUIET_TIME,
+                                             settings.COLORING_MAX_STALENESS)
+        self.unverified = set()
+        self.sharding = None
+        if settings.SHARD_ID:
+            channel = ShardChannel(settings.SHARD_CHANNEL, settings.SHARD_ID,
+                                   settings.SHARD_TIMEOUT / 3)
+            self.sharding = Sharding(settings.SHARD_ID, channel,
+                                     settings.SHARD_TIMEOUT,
+                                     settings.SHARD_REPLICAS)
+            self.sharding.sync({})
+        self.state_store = None
+        if settings.STATE_FILE:
+            self.state_store = StateStore(settings.STATE_FILE)
+            state = self.state_store.load()
+            if state:
+                self.restore_state(state)
+        self.seed_colors()
         self.execute_as_loop(1)
 
+    def seed_colors(self):
+        """Color the switches and links the controller already knows,
+        queueing their flows to be installed by execute() without waiting
+        for the first topology update.
+        The switches and adjacencies restored from disk are kept until the
+        first topology update, as switches usually connect after the NApp
+        is loaded.
+        """
+        if not self.controller.switches:
+            return
+        links = {}
+        for switch in list(self.controller.switches.values()):
+            for interface in list(switch.interfaces.values()):
+                if interface.link is not None:
+                    links[interface.link.id] = interface.link
+        links = self.link_dicts(links.values())
+        links.extend({'endpoint_a': {'switch': int_to_dpid(source)},
+                      'endpoint_b': {'switch': int_to_dpid(target)}}
+                     for source, target in self.adjacencies)
+        self.schedule_colors(links, prune=False)
+        if self.switches:
+            log.info('Seeded the coloring with %s switches and %s links.' %
+                     (len(self.switches), len(links)))
+
+    @staticmethod
+    def coloring_strategy():
+        """Return the coloring strategy in settings.COLORING_STRATEGY."""
+        strategy = COLORING_STRATEGIES.get(settings.COLORING_STRATEGY)
+        if strategy is None:
+            log.error('Unknown coloring strategy %s. Using dpid instead.' %
+                      (settings.COLORING_STRATEGY,))
+            strategy = DpidColoring
+        return strategy()
+
+    def describe_metrics(self):
+        """Declare the metrics of the NApp."""
+        for metric in NAPP_METRICS:
+            self.metrics.describe(*metric)
+
     def execute(self):
-        """ Topology updates are executed through events. """
+        """ Recolor the latest topology received, once the burst of
+            topology updates is over, and reconcile the flows of the
+            affected switches within the time budget of each tick.
+            Periodically audit the flows of a sample of the switches.
+        """
+        if self.sharding is not None:
+            self.sync_shards()
+        if self.scheduler.due():
+            links = self.scheduler.take()
+            log.debug('Recoloring topology. Scheduler stats: %s' %
+                      (self.scheduler.stats,))
+            self.schedule_colors(links)
+        elif self.damper.reuse_due():
+            log.info('Reinstating adjacencies that stopped flapping.')
+            self.schedule_colors()
+        if self.retry_queue.due():
+            self.retry_flows()
+        if self.auditor.due():
+            self.audit_flows()
+        if self.work_queue:
+            self.process_work(settings.COLORING_TICK_BUDGET)
+            if self.work_queue:
+                log.debug('%s switches left to reconcile.' %
+                          (len(self.work_queue),))
+            else:
+                self.save_state()
 
     @listen_to('kytos/topology.updated')
     def topology_updated(self, event):
-        """Update colors on topology update."""
+        """Schedule a color update on topology update."""
         topology = event.content['topology']
-        self.update_colors(
-            [link.as_dict() for link in topology.links.values()]
-        )
+        self.scheduler.notify(self.link_dicts(topology.links.values()))
+
+    @staticmethod
+    def link_dicts(links):
+        """Return the endpoints of Link objects in the format of
+        Link.as_dict().
+        """
+        return [{'endpoint_a': {'switch': link.endpoint_a.switch.dpid},
+                 'endpoint_b': {'switch': link.endpoint_b.switch.dpid}}
+                for link in links]
 
     def update_colors(self, links):
-        """ Color each switch, with the color based on the switch's DPID.
+        """ Color each switch, with the color picked by the coloring strategy
+            in settings.COLORING_STRATEGY.
             After that, if not yet installed, installs, for each switch, flows
-            with the color of its neighbors, to send probe packets to the
+            with the colors of its neighbors, to send probe packets to the
             controller.
+            Only the switches that are new or whose adjacencies changed
+            since the previous call are processed.
         """
-        url = settings.FLOW_MANAGER_URL
+        self.schedule_colors(links)
+        self.process_work()
 
-        for switch in self.controller.switches.values():
-            if switch.dpid not in self.switches:
-                color = int(switch.dpid.replace(':', '')[4:], 16)
-                self.switches[switch.dpid] = {'color': color,
-                                              'neighbors': set(),
-                                              'flows': {}}
+    def schedule_colors(self, links=None, prune=True):
+        """Recolor the switches affected by the changes in the topology,
+        queueing them to have their flows reconciled.
+        :param links: List of links, in the format of Link.as_dict(), or
+        None to recolor with the latest links received
+        :param prune: Forget the switches the controller does not know
+        """
+        with self.metrics.timer('coloring_stage_seconds', stage='switches'):
+            added, removed = self.update_switches(prune)
+            recolored = set()
+            if self.palette != (settings.COLOR_FIELD,
+                                settings.COLORING_STRATEGY):
+                recolored = self.change_palette()
+            affected = added | recolored
+            adjacencies = self.adjacencies
+        with self.metrics.timer('coloring_stage_seconds',
+                                stage='adjacencies'):
+            affected |= self.update_adjacencies(links)
+
+            # Switches restored from disk are checked against the flows
+            # that are really installed before being reconciled
+            unverified = {number for number in self.unverified
+                          if number in self.switches and self.owns(number)}
+            if unverified:
+                self.verify_flows(unverified)
+                affected.update(unverified)
+        with self.metrics.timer('coloring_stage_seconds', stage='colors'):
+            recolored |= self.update_switch_colors(affected)
+        self.publish_colors(added, removed, recolored - added, adjacencies)
+        self.queue_switches(affected)
+        self.metrics.inc('coloring_updates_total')
+
+    def queue_switches(self, numbers):
+        """Queue the switches of this shard to have their flows
+        reconciled, those without any color flow first.
+        """
+        numbers = {number for number in numbers if self.owns(number)}
+        new = {number for number in numbers
+               if not self.switches[number].flows}
+        self.work_queue.add(sorted(new), PRIORITY_NEW)
+        self.work_queue.add(sorted(numbers - new), PRIORITY_UPDATE)
+
+    def owns(self, number):
+        """Return True if the flows of a switch are handled by this shard,
+        which is always the case without sharding.
+        """
+        return self.sharding is None or \
+            self.sharding.owns(self.switches[number].dpid)
+
+    def sync_shards(self):
+        """Exchange the colors of the switches with the other shards,
+        adopting the colors of the switches they own, and take over or hand
+        over switches when shards join or leave.
+        """
+        recolored, gained, lost = self.sharding.update(self.switches)
+        affected = recolored | gained
+        for number in recolored:
+            affected.update(self.switches[number].neighbors)
+        for number in lost:
+            self.switches[number].flows = set()
+            self.discard_work(number)
+        if gained:
+            self.unverified |= gained
+            self.verify_flows(gained)
+        if affected:
+            recolored |= self.update_switch_colors(affected)
+            self.publish_colors(set(), set(), recolored, self.adjacencies)
+            self.queue_switches(affected)
+
+    def process_work(self, budget=None):
+        """Reconcile the flows of the queued switches, in chunks of
+        settings.COLORING_CHUNK_SIZE switches.
+        :param budget: Seconds after which no new chunk is started, or None
+        to process the whole queue
+        """
+        self.work_queue.drain(self.reconcile_chunk,
+                              settings.COLORING_CHUNK_SIZE, budget)
+
+    def observe_wait(self, priority, wait):
+        """Record the seconds a switch waited in the work queue."""
+        self.metrics.observe('coloring_work_wait_seconds', wait,
+                             priority=priority)
+
+    def reconcile_chunk(self, numbers):
+        """Reconcile and push the flows of a chunk of switches."""
+        with self.metrics.timer('coloring_stage_seconds', stage='flows'):
+            stale_flows, pending_flows = self.reconcile_flows(numbers)
+            # Switches retried with nothing left to reconcile, such as
+            # the ones that lost their neighbors, are no longer retried
+            for number in numbers:
+                switch_state = self.switches.get(number)
+                if switch_state is None or not self.owns(number):
+                    continue
+                dpid = switch_state.dpid
+                if dpid not in stale_flows and dpid not in pending_flows \
+                        and self.retry_queue.ready(dpid):
+                    self.retry_queue.succeeded(dpid)
+            self.throttle_flows(numbers, stale_flows, pending_flows)
+        with self.metrics.timer('coloring_stage_seconds', stage='push'):
+            self.push_flows(stale_flows, pending_flows)
+        if self.first_colored is None and any(
+                self.switches[number].flows for number in numbers
+                if number in self.switches):
+            self.first_colored = time.monotonic() - self.started
+            self.metrics.set('coloring_first_colored_switch_seconds',
+                             self.first_colored)
+            log.info('First switch colored %.3f seconds after loading.' %
+                     (self.first_colored,))
+
+    def throttle_flows(self, numbers, stale_flows, pending_flows):
+        """Take the flows of each switch from its token bucket and the
+        global one, in the order of the chunk. Switches over their rate
+        limit are left out of the flows to be sent and deferred until
+        their buckets refill.
+        :param numbers: The switches of the chunk, by priority
+        :param stale_flows: dict mapping DPIDs to the flows to be removed
+        :param pending_flows: dict mapping DPIDs to the flows to be installed
+        """
+        for number in numbers:
+            switch_state = self.switches.get(number)
+            if switch_state is None:
+                continue
+            dpid = switch_state.dpid
+            cost = len(stale_flows.get(dpid, ())) + \
+                len(pending_flows.get(dpid, ()))
+            if not cost:
+                continue
+            delay = self.rate_limiter.acquire(dpid, cost)
+            if delay:
+                stale_flows.pop(dpid, None)
+                pending_flows.pop(dpid, None)
+                self.work_queue.defer(number, delay)
+                self.metrics.inc('coloring_switches_throttled_total')
+
+    def change_palette(self):
+        """Start a new palette version after a change of color field or
+        coloring strategy, dropping the colors and scheduling the removal
+        of the flows of the previous version.
+        :return: The set of switches to be recolored
+        """
+        log.info('Color field or coloring strategy changed. Recoloring all '
+                 'switches.')
+        self.palette = (settings.COLOR_FIELD, settings.COLORING_STRATEGY)
+        self.palette_version += 1
+        self.coloring = self.coloring_strategy()
+        for number, switch_state in self.switches.items():
+            if switch_state.template is not None:
+                self.purges[number] = switch_state.template.purge_flows(
+                    switch_state.flows)
+            switch_state.color = None
+            switch_state.flows = set()
+            switch_state.template = None
+        self.encodings.clear()
+        self.color_index.clear()
+        return set(self.switches)
+
+    def remove_color_flows(self):
+        """Remove the color flows of every switch, of any palette version,
+        forgetting the flows of the switches where it succeeded.
+        """
+        stale_flows = {}
+        for number, switch_state in self.switches.items():
+            if switch_state.template is not None and self.owns(number):
+                stale_flows[switch_state.dpid] = \
+                    switch_state.template.purge_flows(switch_state.flows,
+                                                      any_version=True)
+        for dpid, results in self.flow_pusher.remove(stale_flows).items():
+            if all(results):
+                self.switches[dpid_to_int(dpid)].flows = set()
+
+    def retry_flows(self):
+        """Queue again the switches whose retry is due."""
+        numbers = set()
+        for dpid in self.retry_queue.due():
+            number = dpid_to_int(dpid)
+            if number in self.switches:
+                numbers.add(number)
             else:
-                self.switches[switch.dpid]['neighbors'] = set()
+                self.retry_queue.discard(dpid)
+        self.metrics.inc('coloring_retries_total', len(numbers))
+        self.work_queue.add(sorted(numbers), PRIORITY_REPAIR)
 
-        for link in links:
-            source = link['endpoint_a']['switch']
-            target = link['endpoint_b']['switch']
-            if source != target:
-                self.switches[source]['neighbors'].add(target)
-                self.switches[target]['neighbors'].add(source)
-
-        # Create the flows for each neighbor of each switch and installs it
-        # if not already installed
-        for dpid, switch_dict in self.switches.items():
-            switch = self.controller.get_switch_by_dpid(dpid)
-            if switch.ofp_version == '0x01':
-                controller_port = Port.OFPP_CONTROLLER
-            elif switch.ofp_version == '0x04':
-                controller_port = PortNo.OFPP_CONTROLLER
+    def audit_flows(self):
+        """Compare the color flows a sample of the switches report to
+        amlight/flow_stats with their desired flows. Switches with missing
+        or unexpected flows have their recorded flows replaced with the
+        reported ones and are queued, so that only the difference is
+        repaired. Switches with pending work are left out of the sample.
+        """
+        candidates = [number for number, switch_state in self.switches.items()
+                      if switch_state.template is not None and
+                      number not in self.work_queue and
+                      number not in self.purges and
+                      number not in self.unverified and
+                      self.retry_queue.ready(switch_state.dpid) and
+                      self.owns(number)]
+        dpids = {self.switches[number].dpid: number
+                 for number in self.auditor.select(candidates)}
+        self.metrics.inc('coloring_switches_audited_total', len(dpids))
+        drifted = set()
+        for dpid, flows in self.flow_pusher.fetch_all(set(dpids),
+                                                      stats=True).items():
+            number = dpids[dpid]
+            switch_state = self.switches.get(number)
+            if flows is None or switch_state is None:
+                continue
+            installed = {flow['match'][settings.COLOR_FIELD]
+                         for flow in flows if self.is_color_flow(flow)}
+            desired = self.color_matches(number)
+            missing = len(desired - installed)
+            unexpected = len(installed - desired)
+            if missing or unexpected:
+                log.warning('Switch %s has %s missing and %s unexpected color '
+                            'flows. Repairing them.' %
+                            (dpid, missing, unexpected))
+                self.metrics.inc('coloring_flow_drift_total', missing,
+                                 kind='missing')
+                self.metrics.inc('coloring_flow_drift_total', unexpected,
+                                 kind='unexpected')
+                drifted.add(number)
+            switch_state.flows = installed
+        self.work_queue.add(sorted(drifted), PRIORITY_REPAIR)
+
+    def push_flows(self, stale_flows, pending_flows):
+        """Remove and install flows, recording the flows of each switch
+        only once flow_manager accepted them. Switches with a failed batch
+        are retried later by the retry queue.
+        :param stale_flows: dict mapping DPIDs to the flows to be removed
+        :param pending_flows: dict mapping DPIDs to the flows to be installed
+        """
+        failed = set()
+        for flows_by_dpid, run, installed in (
+                (stale_flows, self.flow_pusher.remove, False),
+                (pending_flows, self.flow_pusher.push, True)):
+            for dpid, results in run(flows_by_dpid).items():
+                number = dpid_to_int(dpid)
+                switch_state = self.switches.get(number)
+                purge = not installed and number in self.purges
+                for batch, success in zip(
+                        self.flow_pusher.batches(flows_by_dpid[dpid]),
+                        results):
+                    if not success:
+                        failed.add(dpid)
+                    elif switch_state is not None and not purge:
+                        matches = {flow['match'][settings.COLOR_FIELD]
+                                   for flow in batch}
+                        if installed:
+                            switch_state.flows |= matches
+                        else:
+                            switch_state.flows -= matches
+
+                # The flows of the new palette are only installed once the
+                # flows of the previous one are gone
+                if purge and dpid not in failed:
+                    del self.purges[number]
+                    self.work_queue.add([number], PRIORITY_NEW)
+        for dpid in set(stale_flows) | set(pending_flows):
+            self.auditor.touch([dpid_to_int(dpid)])
+            if dpid in failed:
+                self.retry_queue.failed(dpid)
             else:
+                self.retry_queue.succeeded(dpid)
+
+    def update_switches(self, prune=True):
+        """Add the new switches of the controller to the coloring state and
+        forget the switches that left it.
+        :param prune: Forget the switches that left the controller
+        :return: The sets of switches added and removed
+        """
+        added = set()
+        numbers = set()
+        # Switches of other shards start with the colors their shards picked
+        remote_colors = self.sharding.remote_colors if self.sharding else {}
+        for switch in self.controller.switches.values():
+            number = dpid_to_int(switch.dpid)
+            numbers.add(number)
+            if number not in self.switches:
+                self.switches[number] = SwitchState(
+                    switch.dpid, remote_colors.get(switch.dpid))
+                added.add(number)
+
+        # The adjacencies of switches that left are removed by
+        # update_adjacencies, along with the flows of their neighbors.
+        removed = set()
+        if prune:
+            removed = set(self.switches) - numbers
+        for number in removed:
+            self.discard_work(number)
+            dpid = self.switches.pop(number).dpid
+            self.encodings.remove(number)
+            self.color_index.remove(number)
+            self.rate_limiter.discard(dpid)
+        return added, removed
+
+    def discard_work(self, number):
+        """Drop the pending flow operations, retries and audits of a
+        switch.
+        """
+        self.retry_queue.discard(self.switches[number].dpid)
+        self.work_queue.discard(number)
+        self.purges.pop(number, None)
+        self.auditor.discard(number)
+
+    def update_adjacencies(self, links=None):
+        """Update the neighbors of the switches with the changes in the
+        adjacencies since the previous update. Adjacencies suppressed for
+        flapping are left out.
+        :param links: List of links, in the format of Link.as_dict(), or
+        None to use the latest links received
+        :return: The set of switches whose neighbors changed
+        """
+        affected = set()
+        if links is None:
+            adjacencies = {(source, target)
+                           for source, target in self.damper.observed
+                           if source in self.switches and
+                           target in self.switches}
+        else:
+            adjacencies = self.link_adjacencies(links)
+        adjacencies = self.damper.update(adjacencies)
+        for adjacency in self.adjacencies - adjacencies:
+            for source, target in (adjacency, adjacency[::-1]):
+                if source in self.switches:
+                    self.switches[source].neighbors.discard(target)
+                    affected.add(source)
+        for source, target in adjacencies - self.adjacencies:
+            self.switches[source].neighbors.add(target)
+            self.switches[target].neighbors.add(source)
+            affected.update((source, target))
+        self.adjacencies = adjacencies
+        return affected
+
+    def update_switch_colors(self, affected):
+        """Color the affected switches with the coloring strategy, adding
+        the neighbors of recolored switches to the affected ones.
+        :param affected: Set of switches, updated in place
+        :return: The set of switches whose previous color changed
+        """
+        # The neighbors of recolored switches must match the new colors.
+        # Switches of other shards keep the colors their shard picked.
+        local = affected
+        if self.sharding is not None:
+            local = {number for number in affected if
+                     self.sharding.picks_color(self.switches[number].dpid)}
+        recolored = self.coloring.recolor(self.switches, local)
+        for number in recolored:
+            affected.update(self.switches[number].neighbors)
+        self.encodings.update({number: self.switches[number].color
+                               for number in affected})
+        self.color_index.update(affected)
+
+        collisions = find_collisions(
+            self.switches, affected,
+            self.encodings.field_values(settings.COLOR_FIELD))
+        if collisions:
+            log.warning('%s pairs of neighbors have the same color in field '
+                        '%s, e.g. %s' % (len(collisions), settings.COLOR_FIELD,
+                                         tuple(map(int_to_dpid,
+                                                   collisions[0]))))
+        return recolored
+
+    def publish_colors(self, added, removed, recolored, adjacencies):
+        """Bump the version of the colors and emit the changes since the
+        previous version in an amlight/coloring.colors_changed event, if
+        anything changed.
+        :param added: Switches added
+        :param removed: Switches removed
+        :param recolored: Switches whose color changed
+        :param adjacencies: The adjacencies before the changes
+        """
+        field = settings.COLOR_FIELD
+        encoded = self.encodings.field_values(field)
+
+        def colors(numbers):
+            return {self.switches[number].dpid: {
+                'color_field': field, 'color_value': encoded[number]}
+                    for number in numbers if number in encoded}
+
+        neighbors_added = self.adjacencies - adjacencies
+        neighbors_removed = adjacencies - self.adjacencies
+        if not (added or removed or recolored or neighbors_added or
+                neighbors_removed):
+            return
+        previous_version = self.colors.bump()
+        content = {
+            'epoch': self.colors.epoch,
+            'version': self.colors.version,
+            'previous_version': previous_version,
+            'added': colors(added),
+            'recolored': colors(recolored),
+            'removed': sorted(int_to_dpid(number) for number in removed),
+            'neighbors_added': dpid_pairs(neighbors_added),
+            'neighbors_removed': dpid_pairs(neighbors_removed)}
+        self.controller.buffers.app.put(
+            KytosEvent(name='amlight/coloring.colors_changed',
+                       content=content))
+
+    def reconcile_flows(self, affected):
+        """Reconcile the flows of each affected switch with the colors of
+        its neighbors. Switches waiting for a retry or with an open circuit
+        breaker are left to the retry queue, and switches with flows of a
+        previous palette only have them removed.
+        :return: A tuple with the dicts mapping DPIDs to the flows to be
+        removed and to the flows to be installed
+        """
+        stale_flows = {}
+        pending_flows = {}
+        for number in affected:
+            if number not in self.switches:
+                continue
+            dpid = self.switches[number].dpid
+            if not self.owns(number) or not self.retry_queue.ready(dpid):
+                continue
+            if number in self.purges:
+                stale_flows[dpid] = self.purges[number]
+                continue
+            flows = self.stale_flows(number)
+            if flows:
+                stale_flows[dpid] = flows
+            flows = self.missing_flows(number)
+            if flows:
+                pending_flows[dpid] = flows
+        return stale_flows, pending_flows
+
+    def link_adjacencies(self, links):
+        """Return the set of adjacencies between known switches.
+        :param links: List of links, in the format of Link.as_dict()
+        :return: A set of tuples with the integer DPIDs of the switches,
+        with the lowest first
+        """
+        adjacencies = set()
+        for link in links:
+            source = dpid_to_int(link['endpoint_a']['switch'])
+            target = dpid_to_int(link['endpoint_b']['switch'])
+            if source != target and source in self.switches \
+                    and target in self.switches:
+                adjacencies.add((min(source, target), max(source, target)))
+        return adjacencies
+
+    def neighbor_colors(self, number):
+        """Return the distinct colors of the neighbors of a switch, encoded
+        for settings.COLOR_FIELD.
+        """
+        encoded = self.encodings.field_values(settings.COLOR_FIELD)
+        return {encoded[neighbor]
+                for neighbor in self.switches[number].neighbors
+                if neighbor in encoded}
+
+    def flow_template(self, number):
+        """Return the flow template of a switch, based on its OpenFlow
+        version, or None if the switch is not supported.
+        """
+        switch_state = self.switches[number]
+        if switch_state.template is None or \
+                switch_state.template.field != settings.COLOR_FIELD:
+            switch = self.controller.get_switch_by_dpid(switch_state.dpid)
+            if switch is None:
+                return None
+            switch_state.template = FlowTemplate.get(switch.ofp_version,
+                                                     settings.COLOR_FIELD,
+                                                     self.palette_version)
+        return switch_state.template
+
+    def color_matches(self, number):
+        """Return the values of settings.COLOR_FIELD to be matched by the
+        flows of a switch. When settings.COLOR_AGGREGATION is enabled and
+        the field is maskable, the neighbor colors of OpenFlow 1.3 switches
+        are aggregated into masked values.
+        """
+        colors = self.neighbor_colors(number)
+        if settings.COLOR_AGGREGATION and \
+                settings.COLOR_FIELD in MASKABLE_FIELDS:
+            template = self.flow_template(number)
+            if template is not None and template.ofp_version == '0x04':
+                return masked_matches(colors, settings.COLOR_FIELD)
+        return colors
+
+    def stale_flows(self, number):
+        """Return the flows of a switch matching colors no neighbor has.
+        :param number: The integer DPID of the switch
+        :return: A list with the flow dicts to be removed from the switch
+        """
+        switch_state = self.switches[number]
+        stale = switch_state.flows - self.color_matches(number)
+        return switch_state.render_flows(stale)
+
+    def missing_flows(self, number):
+        """Create the flows for the neighbor colors of a switch that do not
+        have one installed yet.
+        :param number: The integer DPID of the switch
+        :return: A list with the new flow dicts
+        """
+        switch_state = self.switches[number]
+        if self.flow_template(number) is None:
+            self.metrics.inc('coloring_switches_skipped_total')
+            return []
+        matches = self.color_matches(number)
+        self.metrics.inc('coloring_flows_skipped_total',
+                         len(matches & switch_state.flows))
+        return switch_state.render_flows(matches - switch_state.flows)
+
+    def is_color_flow(self, flow):
+        """Return True if a flow listed by flow_manager is a color flow of
+        the current palette.
+        """
+        return (flow.get('cookie') == color_cookie(self.palette_version) and
+                flow.get('priority') == 50000 and
+                flow.get('table_id', 0) == 0 and
+                list(flow.get('match', {})) == [settings.COLOR_FIELD])
+
+    def verify_flows(self, numbers):
+        """Replace the flows recorded for switches restored from disk with
+        the color flows flow_manager lists as installed, with a single
+        query per switch.
+        """
+        dpids = {self.switches[number].dpid: number for number in numbers}
+        for dpid, flows in self.flow_pusher.fetch_all(set(dpids)).items():
+            if flows is None:
                 continue
-            for neighbor in switch_dict['neighbors']:
-                if neighbor not in switch_dict['flows']:
-                    flow_dict = {
-                        'table_id': 0,
-                        'match': {},
-                        'priority': 50000,
-                        'actions': [
-                            {'action_type': 'output', 'port': controller_port}
-                        ]}
-
-                    flow_dict['match'][settings.COLOR_FIELD] = \
-                        self.color_to_field(
-                            self.switches[neighbor]['color'],
-                            settings.COLOR_FIELD
-                        )
-
-                    switch_dict['flows'][neighbor] = flow_dict
-                    returned = requests.post(
-                        url % dpid,
-                        json={'flows': [flow_dict]}
-                    )
-                    if returned.status_code // 100 != 2:
-                        log.error('Flow manager returned an error inserting '
-                                  'flow. Status code %s' %
-                                  (returned.status_code,))
+            number = dpids[dpid]
+            self.unverified.discard(number)
+            self.switches[number].flows = {
+                flow['match'][settings.COLOR_FIELD]
+                for flow in flows if self.is_color_flow(flow)}
+
+    def dump_state(self):
+        """Return the coloring state in a format suitable for JSON."""
+        switches, adjacencies = dump_switches(self.switches,
+                                              self.adjacencies)
+        return {'color_field': self.palette[0],
+                'coloring_strategy': self.palette[1],
+                'palette_version': self.palette_version,
+                'purges': {self.switches[number].dpid: flows
+                           for number, flows in self.purges.items()
+                           if number in self.switches},
+                'adjacencies': adjacencies,
+                'switches': switches}
+
+    def restore_state(self, state):
+        """Restore the coloring state saved by dump_state. The flows of the
+        restored switches are verified before being reconciled.
+        If the color field or the coloring strategy changed, only the
+        removal of the flows of the saved palette is restored.
+        """
+        version = state.get('palette_version', 0)
+        self.purges = {dpid_to_int(dpid): flows
+                       for dpid, flows in state.get('purges', {}).items()}
+        if state.get('color_field') != settings.COLOR_FIELD or \
+                state.get('coloring_strategy') != settings.COLORING_STRATEGY:
+            log.info('Ignoring coloring state saved with other settings.')
+            self.palette_version = version + 1
+            for dpid, switch in state['switches'].items():
+                template = FlowTemplate.get(switch['ofp_version'],
+                                            state['color_field'], version)
+                if template is not None:
+                    self.purges[dpid_to_int(dpid)] = template.purge_flows(
+                        switch['flows'])
+            return
+        self.palette_version = version
+        self.switches, self.adjacencies = load_switches(
+            state['switches'], state['adjacencies'], settings.COLOR_FIELD,
+            version)
+        self.encodings.clear()
+        self.encodings.update({number: switch_state.color for number,
+                               switch_state in self.switches.items()})
+        self.color_index.clear()
+        self.colors.bump()
+        self.unverified = set(self.switches)
+        log.info('Restored coloring state of %s switches.' %
+                 (len(self.switches),))
+
+    def save_state(self):
+        """Save the coloring state, if persistence is enabled."""
+        if self.state_store is not None:
+            self.state_store.save(self.dump_state())
 
     def shutdown(self):
         """This method is executed when your napp is unloaded.
 
         If you have some cleanup procedure, insert it here.
         """
+        # Flows are left to the other shards, if any
+        if settings.REMOVE_FLOWS_ON_SHUTDOWN and (
+                self.sharding is None or self.sharding.alone):
+            self.remove_color_flows()
+        self.save_state()
+        if self.sharding is not None:
+            self.sharding.leave()
+        self.flow_pusher.shutdown()
 
     @staticmethod
     def color_to_field(color, field='dl_src'):
@@ -135,17 +839,143 @@ class Main(KytosNApp):
             return color & 0xff
         return color & 0xff
 
+    @rest('colors/snapshot')
+    def rest_colors_snapshot(self):
+        """ Colors and adjacencies of all switches, with the version of
+            the colors. The amlight/coloring.colors_changed events carry
+            the changes from one version to the next.
+        """
+        return jsonify(self.colors.snapshot(self.encodings, self.adjacencies,
+                                            settings.COLOR_FIELD))
+
     @rest('colors')
     def rest_colors(self):
-        """ List of switch colors."""
-        colors = {}
-        for dpid, switch_dict in self.switches.items():
-            colors[dpid] = {'color_field': settings.COLOR_FIELD,
-                            'color_value': self.color_to_field(
-                                switch_dict['color'],
-                                settings.COLOR_FIELD
-                            )}
-        return jsonify({'colors': colors})
+        """ List of switch colors.
+            Responses carry an ETag, so a request with a matching
+            If-None-Match header gets a 304 response. An optional 'dpids'
+            query argument, with comma separated DPIDs, filters the switches.
+        """
+        (version, field), colors, body = self.colors.get(
+            self.encodings, settings.COLOR_FIELD)
+        etag = '%s-%s-%s' % (self.colors.epoch, version, field)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            dpids = request.args.get('dpids')
+            if dpids:
+                body = json.dumps({
+                    'colors': {dpid: colors[dpid]
+                               for dpid in dpids.split(',')
+                               if dpid in colors},
+                    'epoch': self.colors.epoch,
+                    'version': version})
+            response = current_app.response_class(
+                body, mimetype='application/json')
+        response.set_etag(etag)
+        return response
+
+    def decode_colors(self, values, field=None, switch=None):
+        """Find the switches whose colors are encoded as the given values.
+        :param values: List of color values, as returned by color_to_field
+        :param field: The field of the values, settings.COLOR_FIELD by
+        default
+        :param switch: If given, only neighbors of this switch are returned,
+        as when decoding a probe received by it
+        :return: A list with the sorted list of DPIDs of each value
+        """
+        results = self.color_index.lookup_many(values,
+                                               field or settings.COLOR_FIELD)
+        if switch is not None:
+            switch_state = self.switches.get(dpid_to_int(switch))
+            neighbors = switch_state.neighbors if switch_state else set()
+            results = [numbers & neighbors for numbers in results]
+        return [[int_to_dpid(number) for number in sorted(numbers)]
+                for numbers in results]
+
+    @rest('colors/decode', methods=['POST'])
+    def rest_decode_colors(self):
+        """ Decode many color values into the DPIDs of their switches.
+            Expects a JSON with a list of 'values' and, optionally, the
+            'color_field' of the values and the 'switch' that received them.
+        """
+        content = request.get_json(silent=True) or {}
+        values = content.get('values')
+        if not isinstance(values, list) or not all(
+                isinstance(value, (str, int)) and not isinstance(value, bool)
+                for value in values):
+            return jsonify({'error': 'A list of values, strings or '
+                                     'integers, is required.'}), 400
+        field = content.get('color_field', settings.COLOR_FIELD)
+        if not isinstance(field, str) or field not in FIELD_ENCODINGS:
+            return jsonify({'error': 'Unknown color field %s.' %
+                                     (field,)}), 400
+        switch = content.get('switch')
+        try:
+            results = self.decode_colors(values, field, switch)
+        except (AttributeError, ValueError):
+            return jsonify({'error': 'Invalid switch %s.' % (switch,)}), 400
+        return jsonify({'color_field': field,
+                        'results': [{'color_value': value, 'dpids': dpids}
+                                    for value, dpids in zip(values,
+                                                            results)]})
+
+    @rest('metrics')
+    def rest_metrics(self):
+        """ Metrics of the NApp in the Prometheus text format."""
+        self.metrics.set('coloring_switches', len(self.switches))
+        self.metrics.set('coloring_adjacencies', len(self.adjacencies))
+        self.metrics.set('coloring_flows',
+                         sum(len(switch_state.flows)
+                             for switch_state in list(self.switches.values())))
+        stats = self.scheduler.stats
+        self.metrics.set('coloring_topology_events_total',
+                         stats['events_received'] - stats['events_coalesced'],
+                         outcome='processed')
+        self.metrics.set('coloring_topology_events_total',
+                         stats['events_coalesced'], outcome='coalesced')
+        stats = self.retry_queue.stats
+        self.metrics.set('coloring_retry_pending', stats['pending'])
+        self.metrics.set('coloring_circuit_breakers_open', stats['open'])
+        for priority, stats in self.work_queue.stats['priorities'].items():
+            self.metrics.set('coloring_work_pending', stats['pending'],
+                             priority=priority)
+            self.metrics.set('coloring_work_oldest_wait_seconds',
+                             stats['oldest_wait'], priority=priority)
+        self.metrics.set('coloring_adjacencies_suppressed',
+                         sum(1 for record in self.damper.state().values()
+                             if record['suppressed']))
+        return current_app.response_class(
+            self.metrics.render(),
+            mimetype='text/plain; version=0.0.4')
+
+    @rest('damping')
+    def rest_damping(self):
+        """ Flap damping state of the adjacencies with a penalty, sorted
+            by decreasing penalty. Suppressed adjacencies are held down.
+        """
+        adjacencies = [dict(record, switches=[int_to_dpid(source),
+                                              int_to_dpid(target)])
+                       for (source, target), record in
+                       self.damper.state().items()]
+        adjacencies.sort(key=lambda record: -record['penalty'])
+        return jsonify({'adjacencies': adjacencies})
+
+    @rest('aggregation')
+    def rest_aggregation(self):
+        """ Number of flows saved in each switch by the aggregation of
+            neighbor colors, whether or not they are installed yet.
+        """
+        switches = {}
+        for number, switch_state in list(self.switches.items()):
+            colors = len(self.neighbor_colors(number))
+            flows = len(self.color_matches(number))
+            switches[switch_state.dpid] = {'neighbor_colors': colors,
+                                           'flows': flows,
+                                           'flows_saved': colors - flows}
+        total = sum(switch['flows_saved'] for switch in switches.values())
+        return jsonify({'enabled': settings.COLOR_AGGREGATION,
+                        'flows_saved': total,
+                        'switches': switches})
 
     @staticmethod
     @rest('/settings', methods=['GET'])
@@ -154,9 +984,6 @@ class Main(KytosNApp):
             Return:
             SETTINGS in JSON format
         """
-        settings_dict = dict()
-        settings_dict['color_field'] = settings.COLOR_FIELD
-        settings_dict['coloring_interval'] = settings.COLORING_INTERVAL
-        settings_dict['topology_url'] = settings.TOPOLOGY_URL
-        settings_dict['flow_manager_url'] = settings.FLOW_MANAGER_URL
+        settings_dict = {name.lower(): getattr(settings, name)
+                         for name in EXPOSED_SETTINGS}
         return jsonify(settings_dict)
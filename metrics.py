@@ -0,0 +1,155 @@
+"""Counters, gauges and histograms exported in the Prometheus text format."""
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+#: Default histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+#: Metrics of the NApp, as the arguments of Metrics.describe
+NAPP_METRICS = (
+    ('coloring_updates_total', 'counter',
+     'Topology updates processed by update_colors.'),
+    ('coloring_stage_seconds', 'histogram',
+     'Seconds spent in each stage of update_colors.'),
+    ('coloring_switches_skipped_total', 'counter',
+     'Switches skipped due to an unsupported OpenFlow version.'),
+    ('coloring_flows_skipped_total', 'counter',
+     'Color flows not pushed because they were installed.'),
+    ('coloring_switches', 'gauge', 'Switches colored.'),
+    ('coloring_adjacencies', 'gauge',
+     'Adjacencies between colored switches.'),
+    ('coloring_flows', 'gauge', 'Color flows installed.'),
+    ('coloring_topology_events_total', 'counter',
+     'Topology update events received, by outcome.'),
+    ('coloring_retries_total', 'counter',
+     'Switches whose failed flow operations were retried.'),
+    ('coloring_retry_pending', 'gauge',
+     'Switches with flow operations pending a retry.'),
+    ('coloring_circuit_breakers_open', 'gauge',
+     'Switches whose circuit breaker is open.'),
+    ('coloring_work_pending', 'gauge',
+     'Switches waiting for their flows to be reconciled, by priority.'),
+    ('coloring_work_oldest_wait_seconds', 'gauge',
+     'Seconds waited by the oldest switch queued, by priority.'),
+    ('coloring_work_wait_seconds', 'histogram',
+     'Seconds switches waited to have their flows reconciled.',
+     (0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)),
+    ('coloring_switches_throttled_total', 'counter',
+     'Switches whose flows were deferred by the rate limits.'),
+    ('coloring_adjacencies_suppressed', 'gauge',
+     'Adjacencies held down because they flap.'),
+    ('coloring_switches_audited_total', 'counter',
+     'Switches whose flows were audited against flow_stats.'),
+    ('coloring_flow_drift_total', 'counter',
+     'Color flows found missing or unexpected by the audit.'),
+    ('coloring_first_colored_switch_seconds', 'gauge',
+     'Seconds from the load of the NApp until the first switch '
+     'had its color flows.'))
+
+
+class Metrics:
+    """Registry of the metrics of the NApp.
+
+    Metrics are identified by name and an optional set of labels, given as
+    keyword arguments. They must be described before being used.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._descriptions = {}
+        self._values = {}
+        self._histograms = {}
+
+    def describe(self, name, kind, description, buckets=BUCKETS):
+        """Declare a metric.
+        :param kind: 'counter', 'gauge' or 'histogram'
+        """
+        with self._lock:
+            self._descriptions[name] = (kind, description, buckets)
+            if kind == 'histogram':
+                self._histograms.setdefault(name, {})
+            else:
+                self._values.setdefault(name, {})
+
+    @staticmethod
+    def _key(labels):
+        """Return a hashable key for a set of labels."""
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter."""
+        key = self._key(labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set the value of a gauge."""
+        with self._lock:
+            self._values[name][self._key(labels)] = value
+
+    def get(self, name, **labels):
+        """Return the value of a counter or gauge."""
+        with self._lock:
+            return self._values[name].get(self._key(labels), 0)
+
+    def observe(self, name, value, **labels):
+        """Record a value in a histogram."""
+        key = self._key(labels)
+        buckets = self._descriptions[name][2]
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = {'buckets': [0] * len(buckets), 'sum': 0,
+                             'count': 0}
+                self._histograms[name][key] = histogram
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the seconds spent in a block in a histogram."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    @staticmethod
+    def _labels(key, extra=()):
+        """Return the Prometheus representation of a set of labels."""
+        items = list(key) + list(extra)
+        if not items:
+            return ''
+        return '{%s}' % ','.join('%s="%s"' % (label, value)
+                                 for label, value in items)
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            for name, (kind, description, buckets) in sorted(
+                    self._descriptions.items()):
+                lines.append('# HELP %s %s' % (name, description))
+                lines.append('# TYPE %s %s' % (name, kind))
+                if kind != 'histogram':
+                    for key, value in sorted(self._values[name].items()):
+                        lines.append('%s%s %s' % (name, self._labels(key),
+                                                  value))
+                    continue
+                for key, histogram in sorted(self._histograms[name].items()):
+                    for bound, count in zip(buckets, histogram['buckets']):
+                        lines.append('%s_bucket%s %s' % (
+                            name, self._labels(key, [('le', bound)]), count))
+                    lines.append('%s_bucket%s %s' % (
+                        name, self._labels(key, [('le', '+Inf')]),
+                        histogram['count']))
+                    lines.append('%s_sum%s %s' % (name, self._labels(key),
+                                                  histogram['sum']))
+                    lines.append('%s_count%s %s' % (name, self._labels(key),
+                                                    histogram['count']))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,192 @@
+"""Install color flows with FlowMods sent through the controller.
+
+This bypasses the REST API of flow_manager: the flow dicts of each switch
+are turned into OpenFlow 1.0 or 1.3 FlowMods, with the same cookies, and
+queued in the msg_out buffer of the controller as a single batch.
+
+Building and packing a FlowMod with pyof takes about a millisecond, so each
+distinct FlowMod is packed once and sent to every switch needing it, only
+with a new xid each time. Switches with neighbors of the same color share
+the same color flows.
+"""
+import copy
+import ipaddress
+import struct
+from functools import lru_cache
+from random import randint
+
+from kytos.core import KytosEvent, log
+from napps.amlight.coloring.flow_pusher import FlowPusher
+from napps.amlight.coloring.state import COLOR_COOKIE_MASK
+from pyof.foundation.basic_types import HWAddress, UBInt8, UBInt16, UBInt32
+from pyof.foundation.constants import UBINT32_MAX_VALUE as MAXID
+from pyof.v0x01.common.action import ActionOutput as ActionOutput10
+from pyof.v0x01.common.flow_match import Match as Match10
+from pyof.v0x01.controller2switch.flow_mod import FlowMod as FlowMod10
+from pyof.v0x01.controller2switch.flow_mod import \
+    FlowModCommand as FlowModCommand10
+from pyof.v0x04.common.action import ActionOutput as ActionOutput13
+from pyof.v0x04.common.flow_instructions import InstructionApplyAction
+from pyof.v0x04.common.flow_match import Match as Match13
+from pyof.v0x04.common.flow_match import OxmOfbMatchField, OxmTLV
+from pyof.v0x04.controller2switch.flow_mod import FlowMod as FlowMod13
+from pyof.v0x04.controller2switch.flow_mod import \
+    FlowModCommand as FlowModCommand13
+
+#: OXM field and encoder of each color field, for OpenFlow 1.3
+OXM_FIELDS = {
+    'dl_src': (OxmOfbMatchField.OFPXMT_OFB_ETH_SRC, HWAddress),
+    'dl_dst': (OxmOfbMatchField.OFPXMT_OFB_ETH_DST, HWAddress),
+    'nw_src': (OxmOfbMatchField.OFPXMT_OFB_IPV4_SRC, None),
+    'nw_dst': (OxmOfbMatchField.OFPXMT_OFB_IPV4_DST, None),
+    'in_port': (OxmOfbMatchField.OFPXMT_OFB_IN_PORT, UBInt32),
+    'dl_vlan': (OxmOfbMatchField.OFPXMT_OFB_VLAN_VID, UBInt16),
+    'tp_src': (OxmOfbMatchField.OFPXMT_OFB_TCP_SRC, UBInt16),
+    'tp_dst': (OxmOfbMatchField.OFPXMT_OFB_TCP_DST, UBInt16),
+    'nw_tos': (OxmOfbMatchField.OFPXMT_OFB_IP_DSCP, UBInt8),
+    'nw_proto': (OxmOfbMatchField.OFPXMT_OFB_IP_PROTO, UBInt8)}
+
+#: Bit set in the VLAN_VID OXM field when a VLAN tag is present
+OFPVID_PRESENT = 0x1000
+#: Packing of the xid, the last field of the OpenFlow header
+XID = struct.Struct('!I')
+
+
+def oxm_tlv(field, value):
+    """Return the OXM TLV matching a value of a color field, which may be
+    masked as 'value/mask' or, for the nw fields, 'ip/prefix length'.
+    """
+    oxm_field, encoder = OXM_FIELDS[field]
+    if encoder is None:
+        network = ipaddress.IPv4Network(value)
+        payload = network.network_address.packed
+        if network.prefixlen == 32:
+            return OxmTLV(oxm_field=oxm_field, oxm_value=payload)
+        return OxmTLV(oxm_field=oxm_field, oxm_hasmask=True,
+                      oxm_value=payload + network.netmask.packed)
+    if field == 'dl_vlan':
+        value |= OFPVID_PRESENT
+    if isinstance(value, str) and '/' in value:
+        value, mask = value.split('/')
+        return OxmTLV(oxm_field=oxm_field, oxm_hasmask=True,
+                      oxm_value=encoder(value).pack() + encoder(mask).pack())
+    return OxmTLV(oxm_field=oxm_field, oxm_value=encoder(value).pack())
+
+
+def flow_mod(ofp_version, flow, delete=False):
+    """Return the FlowMod adding or deleting a flow dict rendered by
+    FlowTemplate. Flow dicts without a match delete the flows with their
+    cookie, under their cookie mask, in OpenFlow 1.3.
+    """
+    if 'match' not in flow:
+        return FlowMod13(command=FlowModCommand13.OFPFC_DELETE,
+                         cookie=flow['cookie'],
+                         cookie_mask=flow['cookie_mask'],
+                         table_id=flow['table_id'], match=Match13())
+    port = flow['actions'][0]['port']
+    if ofp_version == '0x01':
+        if delete:
+            return FlowMod10(command=FlowModCommand10.OFPFC_DELETE_STRICT,
+                             cookie=flow['cookie'], priority=flow['priority'],
+                             match=Match10(**flow['match']))
+        return FlowMod10(command=FlowModCommand10.OFPFC_ADD,
+                         cookie=flow['cookie'], priority=flow['priority'],
+                         match=Match10(**flow['match']),
+                         actions=[ActionOutput10(port=port)])
+    match = Match13(oxm_match_fields=[oxm_tlv(field, value)
+                                      for field, value in
+                                      flow['match'].items()])
+    if delete:
+        return FlowMod13(command=FlowModCommand13.OFPFC_DELETE_STRICT,
+                         cookie=flow['cookie'], cookie_mask=COLOR_COOKIE_MASK,
+                         table_id=flow['table_id'],
+                         priority=flow['priority'], match=match)
+    return FlowMod13(command=FlowModCommand13.OFPFC_ADD, cookie=flow['cookie'],
+                     table_id=flow['table_id'], priority=flow['priority'],
+                     match=match,
+                     instructions=[InstructionApplyAction(
+                         actions=[ActionOutput13(port=port)])])
+
+
+class PackedMessage:
+    """Message packed once, sent by the controller with its own xid."""
+
+    __slots__ = ('header', '_packed')
+
+    def __init__(self, header, packed, xid=None):
+        """
+        :param header: The header of the message, copied with the new xid
+        :param packed: The packed message, with any xid
+        :param xid: The xid of the message, random by default as in pyof
+        """
+        self.header = copy.copy(header)
+        self.header.xid = randint(0, MAXID) if xid is None else xid
+        self._packed = packed
+
+    def pack(self):
+        """Return the packed message, with its xid."""
+        return b''.join((self._packed[:4], XID.pack(self.header.xid),
+                         self._packed[8:]))
+
+
+# pylint: disable=too-many-arguments
+@lru_cache(maxsize=65536)
+def packed_flow_mod(ofp_version, field, value, priority, port, cookie,
+                    delete):
+    """Return the header and the packed FlowMod of a color flow in table
+    0, to be sent as a PackedMessage.
+    """
+    flow = {'table_id': 0, 'cookie': cookie, 'match': {field: value},
+            'priority': priority,
+            'actions': [{'action_type': 'output', 'port': port}]}
+    message = flow_mod(ofp_version, flow, delete)
+    return message.header, message.pack()
+
+
+class OpenFlowPusher(FlowPusher):
+    """Send flows straight to the switches, as FlowMods.
+
+    All the flows of a switch are sent as one batch. The flows installed
+    are still listed through flow_manager, which reads them from the
+    switches.
+    """
+
+    def __init__(self, controller, workers=None, metrics=None):
+        super().__init__(workers=workers, metrics=metrics)
+        self.controller = controller
+
+    @staticmethod
+    def batches(flows):
+        """Return all the flows of a switch as a single batch."""
+        return [flows] if flows else []
+
+    def send(self, method, dpid, batch):
+        """Queue the FlowMods of a batch of flows to a switch.
+        :param method: 'post' to install and 'delete' to remove
+        :return: True if the FlowMods were queued to a connected switch
+        """
+        switch = self.controller.get_switch_by_dpid(dpid)
+        if switch is None or not switch.is_connected():
+            log.error('Error sending %s flows (%s) to switch %s: switch not '
+                      'connected' % (len(batch), method, dpid))
+            success = False
+        else:
+            for flow in batch:
+                if 'match' in flow:
+                    (field, value), = flow['match'].items()
+                    message = PackedMessage(*packed_flow_mod(
+                        switch.ofp_version, field, value, flow['priority'],
+                        flow['actions'][0]['port'], flow['cookie'],
+                        method == 'delete'))
+                else:
+                    message = flow_mod(switch.ofp_version, flow,
+                                       method == 'delete')
+                self.controller.buffers.msg_out.put(KytosEvent(
+                    name='amlight/coloring.messages.out.ofpt_flow_mod',
+                    content={'destination': switch.connection,
+                             'message': message}))
+            success = True
+        self.metrics.inc('coloring_flows_pushed_total', len(batch),
+                         method=method,
+                         result='success' if success else 'failure')
+        return success
@@ -0,0 +1,91 @@
+"""Limit the rate of flow operations sent to each switch and overall."""
+import time
+from threading import Lock
+
+
+class TokenBucket:
+    """Bucket holding up to `burst` tokens, refilled at `rate` tokens per
+    second.
+
+    An operation costing more tokens than the bucket holds is allowed once
+    the bucket is full, leaving it in debt, so that large operations are
+    delayed instead of blocked forever.
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = now
+
+    def refill(self, now):
+        """Add the tokens accumulated since the last refill."""
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost):
+        """Return the seconds until an operation of `cost` tokens is
+        allowed, 0 if it is allowed now.
+        """
+        needed = min(cost, self.burst)
+        if self.tokens >= needed:
+            return 0
+        return (needed - self.tokens) / self.rate
+
+
+class FlowRateLimiter:
+    """Token buckets limiting the flow operations of each switch and of all
+    switches together.
+
+    Rates are in flows per second, and a rate of 0 disables that limit.
+    """
+
+    def __init__(self, switch_rate, switch_burst, global_rate, global_burst,
+                 clock=time.monotonic):
+        self.switch_rate = switch_rate
+        self.switch_burst = switch_burst
+        self._clock = clock
+        self._lock = Lock()
+        self._switches = {}
+        self._global = None
+        if global_rate > 0:
+            self._global = TokenBucket(global_rate, global_burst, clock())
+        self.throttled = 0
+
+    def acquire(self, key, cost):
+        """Take the tokens of an operation on a switch, if both its bucket
+        and the global one have enough.
+        :param cost: Number of flows of the operation
+        :return: 0 if the operation may be sent now, or the seconds to wait
+        before trying again
+        """
+        with self._lock:
+            now = self._clock()
+            buckets = []
+            if self.switch_rate > 0:
+                bucket = self._switches.get(key)
+                if bucket is None:
+                    bucket = TokenBucket(self.switch_rate, self.switch_burst,
+                                         now)
+                    self._switches[key] = bucket
+                buckets.append(bucket)
+            if self._global is not None:
+                buckets.append(self._global)
+            for bucket in buckets:
+                bucket.refill(now)
+            delay = max([bucket.delay(cost) for bucket in buckets],
+                        default=0)
+            if delay:
+                self.throttled += 1
+                return delay
+            for bucket in buckets:
+                bucket.tokens -= cost
+            return 0
+
+    def discard(self, key):
+        """Forget the bucket of a switch."""
+        with self._lock:
+            self._switches.pop(key, None)
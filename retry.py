@@ -0,0 +1,93 @@
+"""Retry the flow operations of switches with exponential backoff."""
+import random
+import time
+from threading import Lock
+
+
+class _SwitchRetry:
+    """Retry state of a switch."""
+
+    __slots__ = ('failures', 'next_attempt', 'open_until')
+
+    def __init__(self):
+        self.failures = 0
+        self.next_attempt = 0
+        self.open_until = None
+
+
+class RetryQueue:
+    """Switches whose flow operations failed and must be retried.
+
+    Each failure doubles the delay before the next attempt, up to
+    `max_delay`, with a random jitter so that switches failing together are
+    not retried together. After `breaker_threshold` consecutive failures the
+    circuit breaker of the switch opens and no operation is attempted for
+    `breaker_timeout` seconds. Then a single attempt is allowed, closing the
+    breaker on success or opening it again on failure.
+    """
+
+    def __init__(self, base_delay, max_delay, breaker_threshold,
+                 breaker_timeout, clock=time.monotonic, rand=random.random):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_timeout = breaker_timeout
+        self._clock = clock
+        self._random = rand
+        self._lock = Lock()
+        self._switches = {}
+
+    def failed(self, dpid):
+        """Record a failed operation on a switch, scheduling a retry."""
+        with self._lock:
+            now = self._clock()
+            retry = self._switches.setdefault(dpid, _SwitchRetry())
+            retry.failures += 1
+            delay = min(self.max_delay,
+                        self.base_delay * 2 ** (retry.failures - 1))
+            retry.next_attempt = now + delay * (0.5 + self._random() / 2)
+            if retry.failures >= self.breaker_threshold:
+                retry.open_until = now + self.breaker_timeout
+                retry.next_attempt = max(retry.next_attempt,
+                                         retry.open_until)
+
+    def succeeded(self, dpid):
+        """Record that every operation on a switch succeeded."""
+        with self._lock:
+            self._switches.pop(dpid, None)
+
+    def discard(self, dpid):
+        """Stop retrying the operations of a switch."""
+        self.succeeded(dpid)
+
+    def ready(self, dpid):
+        """Return True if operations on a switch may be attempted now."""
+        with self._lock:
+            retry = self._switches.get(dpid)
+            return retry is None or retry.next_attempt <= self._clock()
+
+    def due(self):
+        """Return the DPIDs of the switches whose retry is due."""
+        with self._lock:
+            now = self._clock()
+            return [dpid for dpid, retry in self._switches.items()
+                    if retry.next_attempt <= now]
+
+    def is_open(self, dpid):
+        """Return True if the circuit breaker of a switch is open."""
+        with self._lock:
+            retry = self._switches.get(dpid)
+            return (retry is not None and retry.open_until is not None and
+                    retry.open_until > self._clock())
+
+    @property
+    def stats(self):
+        """Return the number of switches pending a retry and with an open
+        circuit breaker.
+        """
+        with self._lock:
+            now = self._clock()
+            return {'pending': len(self._switches),
+                    'open': sum(1 for retry in self._switches.values()
+                                if retry.open_until is not None and
+                                retry.open_until > now)}
@@ -0,0 +1,73 @@
+"""Coalesce bursts of topology updates into a single recoloring."""
+import time
+from threading import Lock
+
+
+class CoalescingScheduler:
+    """Keep the latest pending topology and decide when to recolor.
+
+    A recoloring is due when the topology has been quiet for `quiet_time`
+    seconds and at least `interval` seconds have passed since the previous
+    one. Pending changes never wait more than `max_staleness` seconds.
+    """
+
+    def __init__(self, interval, quiet_time, max_staleness,
+                 clock=time.monotonic):
+        self.interval = interval
+        self.quiet_time = quiet_time
+        self.max_staleness = max_staleness
+        self._clock = clock
+        self._lock = Lock()
+        self._pending = None
+        self._dirty = False
+        self._first_event = None
+        self._last_event = None
+        self._last_run = None
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.runs = 0
+
+    def notify(self, content):
+        """Record a topology update, replacing any pending one."""
+        with self._lock:
+            now = self._clock()
+            self.events_received += 1
+            if self._dirty:
+                self.events_coalesced += 1
+            else:
+                self._first_event = now
+            self._dirty = True
+            self._pending = content
+            self._last_event = now
+
+    def due(self):
+        """Return True if the pending topology should be recolored now."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            now = self._clock()
+            if now - self._first_event >= self.max_staleness:
+                return True
+            quiet = now - self._last_event >= self.quiet_time
+            rested = (self._last_run is None or
+                      now - self._last_run >= self.interval)
+            return quiet and rested
+
+    def take(self):
+        """Return the pending topology, marking it as processed."""
+        with self._lock:
+            content = self._pending
+            self._pending = None
+            self._dirty = False
+            self._last_run = self._clock()
+            self.runs += 1
+            return content
+
+    @property
+    def stats(self):
+        """Return the counters of the scheduler."""
+        with self._lock:
+            return {'events_received': self.events_received,
+                    'events_coalesced': self.events_coalesced,
+                    'recolors': self.runs,
+                    'pending': self._dirty}
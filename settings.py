@@ -1,5 +1,92 @@
 """NApp settings."""
+import os
+
+# Minimum interval, in seconds, between two recolorings of the topology
 COLORING_INTERVAL = 10
+# Seconds without topology updates before a pending recoloring runs
+COLORING_QUIET_TIME = 1
+# Maximum seconds a topology update may wait to be recolored
+COLORING_MAX_STALENESS = 30
+# Seconds each tick of execute() may spend reconciling the flows of the
+# switches affected by a recoloring. The remaining switches are left for
+# the next ticks.
+COLORING_TICK_BUDGET = 0.5
+# Number of switches reconciled and pushed together
+COLORING_CHUNK_SIZE = 100
+# Flap damping of the adjacencies. Each time an adjacency goes down it gets
+# FLAP_PENALTY points, halved every FLAP_HALF_LIFE seconds. Above
+# FLAP_SUPPRESS_THRESHOLD the adjacency is ignored until its penalty is
+# below FLAP_REUSE_THRESHOLD, for at most FLAP_MAX_SUPPRESS_TIME seconds
+# after its last flap. Set FLAP_PENALTY to 0 to disable it.
+FLAP_PENALTY = 1000
+FLAP_HALF_LIFE = 60
+FLAP_SUPPRESS_THRESHOLD = 2000
+FLAP_REUSE_THRESHOLD = 750
+FLAP_MAX_SUPPRESS_TIME = 600
 COLOR_FIELD = 'dl_src'
+# How switch colors are picked: 'dpid' uses the lower bits of the DPID,
+# 'greedy' and 'dsatur' use the fewest colors so that neighbors differ
+COLORING_STRATEGY = 'dpid'
+# Aggregate the neighbor colors of OpenFlow 1.3 switches into masked matches
+# when COLOR_FIELD is maskable (dl_src, dl_dst, nw_src or nw_dst)
+COLOR_AGGREGATION = False
 FLOW_MANAGER_URL = 'http://localhost:8181/api/kytos/flow_manager/v2/flows/%s'
+FLOW_STATS_URL = 'http://localhost:8181/api/amlight/flow_stats/flow/list/%s'
 TOPOLOGY_URL = 'http://localhost:8181/api/kytos/topology/v3/links'
+# Maximum number of flows sent to flow_manager in a single request
+FLOW_BATCH_SIZE = 100
+# Number of requests to flow_manager that can be in flight at the same time
+FLOW_PUSH_WORKERS = 8
+# Timeout, in seconds, of each request to flow_manager
+FLOW_PUSH_TIMEOUT = 10
+# How color flows are installed: 'flow_manager' uses its REST API and
+# 'openflow' sends FlowMods to the switches through the controller
+FLOW_BACKEND = 'flow_manager'
+# Remove the color flows from the switches when the NApp is unloaded. The
+# flows are then installed again once it is loaded, so each restart leaves
+# the switches without color flows until then. Keep it disabled to restart
+# with the flows in place, checked against STATE_FILE.
+REMOVE_FLOWS_ON_SHUTDOWN = False
+# Flows, installed or removed, sent per second to each switch and to all
+# switches together, with bursts of up to the *_BURST flows. Switches over
+# a limit wait for their next turn. Set a rate to 0 to disable its limit.
+SWITCH_FLOW_RATE = 100
+SWITCH_FLOW_BURST = 500
+GLOBAL_FLOW_RATE = 2000
+GLOBAL_FLOW_BURST = 10000
+# Delay, in seconds, before retrying the flow operations that failed on a
+# switch. It doubles on each consecutive failure, up to RETRY_MAX_DELAY.
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+# Consecutive failures after which no flow operation is attempted on a
+# switch for BREAKER_TIMEOUT seconds
+BREAKER_THRESHOLD = 5
+BREAKER_TIMEOUT = 300
+# Audit of the color flows against the flows the switches report to
+# amlight/flow_stats. Every AUDIT_INTERVAL seconds the next AUDIT_SAMPLE_RATE
+# fraction of the switches, at most AUDIT_SWITCH_BUDGET of them, is audited,
+# and the missing or unexpected color flows are repaired. Switches whose
+# flows changed in the last AUDIT_GRACE_TIME seconds are skipped. Set
+# AUDIT_INTERVAL to 0 to disable it.
+AUDIT_INTERVAL = 60
+AUDIT_SAMPLE_RATE = 0.1
+AUDIT_SWITCH_BUDGET = 50
+AUDIT_GRACE_TIME = 120
+# Sharding of the switches between several Kytos instances or worker
+# processes, each one with its own SHARD_ID, pushing the flows of the
+# switches assigned to it by consistent hashing of their DPIDs. The shards
+# exchange the colors of their switches through files in SHARD_CHANNEL, a
+# folder shared by all of them. A shard not updating its file for
+# SHARD_TIMEOUT seconds is considered gone and its switches are taken over
+# by the others. SHARD_REPLICAS is the number of points of each shard in
+# the hash ring. Shards on the same host need their own STATE_FILE. Set
+# SHARD_ID to None to disable sharding.
+SHARD_ID = None
+SHARD_CHANNEL = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'shards')
+SHARD_TIMEOUT = 15
+SHARD_REPLICAS = 64
+# File where the coloring state is saved to be restored after a restart.
+# Set it to None to disable the persistence of the state.
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'coloring_state.json')
@@ -288,6 +288,7 @@ setup(name=f'{NAPP_USERNAME}_{NAPP_NAME}',
               'yala',
               'tox',
           ],
+          'numpy': ['numpy'],
       },
       cmdclass={
           'clean': Cleaner,
@@ -0,0 +1,225 @@
+"""Split the switches between several shards of the NApp.
+
+Each shard is a Kytos instance or worker process running the NApp with its
+own settings.SHARD_ID. Switches are assigned to the shards by consistent
+hashing of their DPIDs, and each shard only renders and pushes the flows
+of its switches. Shards exchange the colors of their switches through a
+channel, a folder with a small JSON file per shard that also works as a
+heartbeat. When a shard leaves or stops updating its file, its switches
+are spread over the remaining shards.
+"""
+import hashlib
+import json
+import os
+import time
+from bisect import bisect_right
+
+from kytos.core import log
+from napps.amlight.coloring.state import dpid_to_int
+from napps.amlight.coloring.storage import StateStore
+
+
+def _hash(value):
+    """Return a 64 bit hash of a string, the same in every process."""
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+# pylint: disable=too-few-public-methods
+class HashRing:
+    """Consistent hashing of keys to members.
+
+    Each member is placed `replicas` times on the ring, so that keys are
+    evenly spread and only the keys of a member that leaves are moved.
+    """
+
+    def __init__(self, members, replicas=64):
+        self.members = frozenset(members)
+        points = sorted((_hash('%s#%d' % (member, index)), member)
+                        for member in self.members
+                        for index in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._members = [member for _, member in points]
+
+    def owner(self, key):
+        """Return the member owning a key, or None if there is no member."""
+        if not self._hashes:
+            return None
+        index = bisect_right(self._hashes, _hash(key)) % len(self._hashes)
+        return self._members[index]
+
+
+class ShardChannel:
+    """Folder where each shard publishes its state in a JSON file.
+
+    A shard's file is only rewritten when its state changes or every
+    `heartbeat` seconds, and the files of the other shards are only parsed
+    again when they change.
+    """
+
+    def __init__(self, path, shard_id, heartbeat, clock=time.time):
+        self.path = path
+        self.shard_id = shard_id
+        self.heartbeat = heartbeat
+        self._clock = clock
+        self._store = StateStore(self._file(shard_id))
+        # The state last written and when
+        self._published = (None, None)
+        self._cache = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, shard_id):
+        """Return the path of the file of a shard."""
+        return os.path.join(self.path, '%s.json' % shard_id)
+
+    def publish(self, state):
+        """Write the state of this shard, if it changed or the heartbeat
+        is due.
+        """
+        now = self._clock()
+        published, published_at = self._published
+        if state == published and now - published_at < self.heartbeat:
+            return
+        self._store.save({'shard': self.shard_id, 'heartbeat': now,
+                          'state': state})
+        self._published = (state, now)
+
+    def read(self, timeout):
+        """Return the states of the shards whose heartbeat is more recent
+        than `timeout` seconds, including this one.
+        :return: dict mapping shard IDs to their states
+        """
+        now = self._clock()
+        states = {}
+        try:
+            names = os.listdir(self.path)
+        except OSError as error:
+            log.error('Error listing the shards in %s: %s' %
+                      (self.path, error))
+            return states
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                modified = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._cache.get(path)
+            if cached is None or cached[0] != modified:
+                try:
+                    with open(path, encoding='utf-8') as shard_file:
+                        cached = (modified, json.load(shard_file))
+                except (OSError, ValueError):
+                    continue
+                self._cache[path] = cached
+            content = cached[1]
+            if now - content['heartbeat'] < timeout:
+                states[content['shard']] = content['state']
+        return states
+
+    def leave(self):
+        """Remove the file of this shard, so the others take over its
+        switches right away.
+        """
+        try:
+            os.remove(self._file(self.shard_id))
+        except OSError:
+            pass
+        self._published = (None, None)
+
+
+class Sharding:
+    """Ownership of the switches by the shards, kept in sync through a
+    ShardChannel.
+
+    The colors of the switches of a shard are decided by that shard. The
+    colors it published are only used by the other shards while it still
+    owns the switches.
+    """
+
+    def __init__(self, shard_id, channel, timeout, replicas=64):
+        self.shard_id = shard_id
+        self.channel = channel
+        self.timeout = timeout
+        self.replicas = replicas
+        self.ring = HashRing([shard_id], replicas)
+        self.remote_colors = {}
+        self._owners = {}
+
+    def owner(self, dpid):
+        """Return the shard owning a switch."""
+        owner = self._owners.get(dpid)
+        if owner is None:
+            owner = self._owners[dpid] = self.ring.owner(dpid)
+        return owner
+
+    def owns(self, dpid):
+        """Return True if this shard owns a switch."""
+        return self.owner(dpid) == self.shard_id
+
+    @property
+    def alone(self):
+        """True if no other shard is alive."""
+        return self.ring.members == {self.shard_id}
+
+    def picks_color(self, dpid):
+        """Return True if this shard picks the color of a switch, which
+        it does for its own switches and for those whose shard published
+        no color yet.
+        """
+        return self.owns(dpid) or dpid not in self.remote_colors
+
+    def sync(self, colors):
+        """Publish the colors of the switches of this shard and read the
+        colors of the switches of the others into `remote_colors`.
+        :param colors: dict mapping the DPIDs of the switches of this shard
+        to their colors
+        :return: The previous HashRing if shards joined or left, else None
+        """
+        self.channel.publish({'colors': colors})
+        states = self.channel.read(self.timeout)
+        previous = None
+        members = set(states) | {self.shard_id}
+        if members != self.ring.members:
+            log.info('Coloring shards changed to %s.' % (sorted(members),))
+            previous = self.ring
+            self.ring = HashRing(members, self.replicas)
+            self._owners = {}
+        self.remote_colors = {
+            dpid: color for shard_id, state in states.items()
+            if shard_id != self.shard_id
+            for dpid, color in state['colors'].items()
+            if self.owner(dpid) == shard_id}
+        return previous
+
+    def update(self, switches):
+        """Sync the colors of the switches with the other shards, adopting
+        the colors the others picked for their switches.
+        :param switches: dict mapping integer DPIDs to SwitchStates
+        :return: A tuple with the sets of switches recolored, taken over
+        from other shards and handed over to them
+        """
+        previous = self.sync({switch_state.dpid: switch_state.color
+                              for switch_state in list(switches.values())
+                              if switch_state.color is not None and
+                              self.owns(switch_state.dpid)})
+        recolored = set()
+        for dpid, color in self.remote_colors.items():
+            switch_state = switches.get(dpid_to_int(dpid))
+            if switch_state is not None and switch_state.color != color:
+                switch_state.color = color
+                recolored.add(switch_state.number)
+        gained = set()
+        lost = set()
+        if previous is not None:
+            for number, switch_state in switches.items():
+                owned = previous.owner(switch_state.dpid) == self.shard_id
+                if self.owns(switch_state.dpid) != owned:
+                    (lost if owned else gained).add(number)
+            log.info('Took over %s switches and handed over %s to other '
+                     'shards.' % (len(gained), len(lost)))
+        return recolored, gained, lost
+
+    def leave(self):
+        """Leave the shards."""
+        self.channel.leave()
@@ -36,10 +36,7 @@ class Switches(metaclass=Singleton):
             a kytos.core.switch.Switch() object
             False if not found
         """
-        for switch in self._switches.values():
-            if switch.dpid == dpid:
-                return self._switches[switch.dpid]
-        return False
+        return self._switches.get(dpid, False)
 
     def get_switches(self):
         """Return all switches """
@@ -0,0 +1,158 @@
+"""Compact records of the coloring state.
+
+Switches are identified by the integer value of their DPIDs, and their
+color flows are kept as the values matched, while the fields shared by the
+flows of all switches come from a single flow template.
+"""
+from collections import namedtuple
+
+#: Controller port of each supported OpenFlow version, OFPP_CONTROLLER in
+#: pyof.v0x01.common.phy_port.Port and pyof.v0x04.common.port.PortNo
+CONTROLLER_PORTS = {'0x01': 0xfffd,
+                    '0x04': 0xfffffffd}
+#: Cookie identifying the color flows, and the mask of its bits. The low
+#: bits of the cookie of each flow carry the version of the palette.
+COLOR_COOKIE = 0xc0 << 56
+COLOR_COOKIE_MASK = 0xff << 56
+#: Mask of the version of the palette in the cookie
+COLOR_VERSION_MASK = 0xffffffff
+#: Mask matching every bit of a cookie
+FULL_COOKIE_MASK = 0xffffffffffffffff
+
+
+def dpid_to_int(dpid):
+    """Return the integer value of a DPID string."""
+    return int(dpid.replace(':', ''), 16)
+
+
+def int_to_dpid(number):
+    """Return the DPID string of an integer."""
+    hex_dpid = '%016x' % number
+    return ':'.join(hex_dpid[i:i + 2] for i in range(0, 16, 2))
+
+
+def color_cookie(version):
+    """Return the cookie of the color flows of a palette version."""
+    return COLOR_COOKIE | (version & COLOR_VERSION_MASK)
+
+
+class FlowTemplate(namedtuple('FlowTemplate',
+                              'ofp_version field controller_port cookie')):
+    """Immutable fields of the color flows of the switches with an
+    OpenFlow version, for a color field and a palette version.
+
+    Use FlowTemplate.get, so that each template is shared by all switches.
+    """
+
+    __slots__ = ()
+    _templates = {}
+
+    @classmethod
+    def get(cls, ofp_version, field, version=0):
+        """Return the shared template, or None if the OpenFlow version is
+        not supported.
+        """
+        key = (ofp_version, field, version)
+        if key not in cls._templates:
+            if ofp_version not in CONTROLLER_PORTS:
+                return None
+            cls._templates[key] = cls(ofp_version, field,
+                                      CONTROLLER_PORTS[ofp_version],
+                                      color_cookie(version))
+        return cls._templates[key]
+
+    def render(self, match):
+        """Return the flow dict, in the flow_manager format, sending the
+        packets with the matched color to the controller.
+        """
+        return {
+            'table_id': 0,
+            'cookie': self.cookie,
+            'match': {self.field: match},
+            'priority': 50000,
+            'actions': [
+                {'action_type': 'output', 'port': self.controller_port}
+            ]}
+
+    def purge_flows(self, matches, any_version=False):
+        """Return the flow dicts deleting the color flows of a switch.
+
+        OpenFlow 1.3 switches get a single delete of the flows with the
+        cookie of this template, or with the cookie of any palette version.
+        OpenFlow 1.0 has no cookie mask, so each flow is deleted by its
+        match.
+        :param matches: The values matched by the flows of the switch
+        """
+        if self.ofp_version == '0x01':
+            return [self.render(match) for match in matches]
+        return [{'table_id': 0, 'cookie': self.cookie,
+                 'cookie_mask': (COLOR_COOKIE_MASK if any_version
+                                 else FULL_COOKIE_MASK)}]
+
+
+class SwitchState:
+    """Coloring state of a switch.
+
+    `neighbors` holds the integer DPIDs of the neighbors and `flows` the
+    values matched by the color flows installed in the switch, rendered
+    with `template`.
+    """
+
+    __slots__ = ('dpid', 'number', 'color', 'neighbors', 'flows',
+                 'template')
+
+    def __init__(self, dpid, color=None):
+        self.dpid = dpid
+        self.number = dpid_to_int(dpid)
+        self.color = color
+        self.neighbors = set()
+        self.flows = set()
+        self.template = None
+
+    def render_flows(self, matches):
+        """Return the flow dicts of a list of matched values."""
+        return [self.template.render(match) for match in matches]
+
+
+def dump_switches(switches, adjacencies):
+    """Return the switches and adjacencies in a format suitable for JSON.
+    :param switches: dict mapping integer DPIDs to SwitchStates
+    :param adjacencies: set of pairs of integer DPIDs
+    :return: A tuple with the dict of switches, by DPID, and the list of
+    pairs of DPIDs
+    """
+    dumped = {}
+    for switch_state in switches.values():
+        template = switch_state.template
+        dumped[switch_state.dpid] = {
+            'color': switch_state.color,
+            'ofp_version': template.ofp_version if template else None,
+            'flows': sorted(switch_state.flows, key=str)}
+    return dumped, [[switches[source].dpid, switches[target].dpid]
+                    for source, target in adjacencies]
+
+
+def load_switches(dumped, adjacencies, field, version):
+    """Return the switches and adjacencies dumped by dump_switches, dropping
+    the adjacencies of unknown switches.
+    :param field: The color field of the flow templates
+    :param version: The version of the palette of the flow templates
+    :return: A tuple with the dict mapping integer DPIDs to SwitchStates
+    and the set of pairs of integer DPIDs
+    """
+    switches = {}
+    for dpid, switch in dumped.items():
+        switch_state = SwitchState(dpid, switch['color'])
+        switch_state.flows = set(switch['flows'])
+        if switch['ofp_version']:
+            switch_state.template = FlowTemplate.get(switch['ofp_version'],
+                                                     field, version)
+        switches[switch_state.number] = switch_state
+    loaded = set()
+    for source, target in adjacencies:
+        source, target = sorted((dpid_to_int(source), dpid_to_int(target)))
+        if source in switches and target in switches:
+            loaded.add((source, target))
+            switches[source].neighbors.add(target)
+            switches[target].neighbors.add(source)
+    return switches, loaded
@@ -0,0 +1,35 @@
+"""Persist the coloring state to a local file between restarts."""
+import json
+import os
+
+from kytos.core import log
+
+
+class StateStore:
+    """Save and load the coloring state as a compact JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the saved state, or None if there is no usable state."""
+        try:
+            with open(self.path, encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as error:
+            log.error('Error loading coloring state from %s: %s' %
+                      (self.path, error))
+            return None
+
+    def save(self, state):
+        """Save the state, replacing the previous one atomically."""
+        temp_path = '%s.tmp' % self.path
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as state_file:
+                json.dump(state, state_file, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        except OSError as error:
+            log.error('Error saving coloring state to %s: %s' %
+                      (self.path, error))
@@ -11,3 +11,20 @@ def get_controller_mock():
     controller = Controller(options)
     controller.log = Mock()
     return controller
+
+
+def make_switches(controller, count, ofp_version='0x04'):
+    """Add switch mocks, with the DPIDs from 1 to `count`, to a controller
+    mock.
+    :return: dict mapping the DPIDs to the switch mocks
+    """
+    switches = {}
+    for number in range(1, count + 1):
+        switch = Mock()
+        switch.dpid = '00:00:00:00:00:00:00:%02x' % number
+        switch.ofp_version = ofp_version
+        switch.interfaces = {}
+        switches[switch.dpid] = switch
+    controller.switches = switches
+    controller.get_switch_by_dpid = Mock(side_effect=switches.get)
+    return switches
@@ -0,0 +1,38 @@
+"""Test the aggregation of neighbor colors."""
+from unittest import TestCase
+
+from napps.amlight.coloring.aggregation import aggregate, masked_matches
+
+
+class TestAggregation(TestCase):
+    """Test the aggregation of neighbor colors."""
+
+    def test_aggregate(self):
+        """Test values are covered exactly by masked cubes."""
+        values = {0b0000, 0b0001, 0b0010, 0b0011, 0b0101, 0b1101}
+        cover = aggregate(values, 4)
+        self.assertEqual(cover, [(0b0000, 0b1100), (0b0101, 0b0111)])
+        matched = {value for value in range(16)
+                   if any(value & mask == cube for cube, mask in cover)}
+        self.assertEqual(matched, values)
+
+    def test_aggregate_prefix_only(self):
+        """Test only prefix masks are produced."""
+        cover = aggregate({0b0100, 0b0101, 0b0110, 0b0111, 0b1000}, 4,
+                          prefix_only=True)
+        self.assertEqual(cover, [(0b0100, 0b1100), (0b1000, 0b1111)])
+        cover = aggregate({0b0001, 0b0011}, 4, prefix_only=True)
+        self.assertEqual(len(cover), 2)
+
+    def test_masked_matches_dl(self):
+        """Test MAC colors are rendered as value/mask."""
+        matches = masked_matches({'ee:ee:ee:ee:ee:02', 'ee:ee:ee:ee:ee:03',
+                                  'ee:ee:ee:ee:ee:10'}, 'dl_src')
+        self.assertEqual(matches, {'ee:ee:ee:ee:ee:02/ff:ff:ff:ff:ff:fe',
+                                   'ee:ee:ee:ee:ee:10'})
+
+    def test_masked_matches_nw(self):
+        """Test IP colors are rendered as prefixes."""
+        matches = masked_matches({'0.0.0.4', '0.0.0.5', '0.0.0.6',
+                                  '0.0.0.7'}, 'nw_src')
+        self.assertEqual(matches, {'0.0.0.4/30'})
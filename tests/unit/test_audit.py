@@ -0,0 +1,39 @@
+"""Test the FlowAuditor class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.audit import FlowAuditor
+
+
+class TestFlowAuditor(TestCase):
+    """Test the FlowAuditor class."""
+
+    def setUp(self):
+        self.now = 0
+        self.auditor = FlowAuditor(10, 0.5, 3, 15, clock=lambda: self.now)
+
+    def test_due(self):
+        """Test cycles run every interval."""
+        self.assertFalse(self.auditor.due())
+        self.now = 10
+        self.assertTrue(self.auditor.due())
+        self.auditor.select([])
+        self.assertFalse(self.auditor.due())
+        self.auditor.interval = 0
+        self.now = 100
+        self.assertFalse(self.auditor.due())
+
+    def test_select(self):
+        """Test each cycle samples the next switches, within the budget."""
+        self.assertEqual(self.auditor.select([4, 2, 1, 3]), [1, 2])
+        self.assertEqual(self.auditor.select([4, 2, 1, 3]), [3, 4])
+        self.assertEqual(self.auditor.select([1, 3, 5]), [5, 1])
+        self.assertEqual(self.auditor.select(range(1, 11)), [2, 3, 4])
+        self.assertEqual(self.auditor.stats, {'cycles': 4, 'audited': 9})
+
+    def test_grace_time(self):
+        """Test switches whose flows just changed are skipped."""
+        self.auditor.touch([1])
+        self.assertEqual(self.auditor.select([1, 2, 3, 4]), [2])
+        self.now = 15
+        self.assertEqual(self.auditor.select([1, 2, 3, 4]), [3, 4])
+        self.assertEqual(self.auditor.select([1, 2, 3, 4]), [1, 2])
@@ -0,0 +1,35 @@
+"""Test the ColorIndex class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.color_index import ColorIndex
+from napps.amlight.coloring.encoding import ColorEncodings
+
+
+class TestColorIndex(TestCase):
+    """Test the ColorIndex class."""
+
+    def setUp(self):
+        self.encodings = ColorEncodings()
+        self.index = ColorIndex(self.encodings)
+        self.encodings.update({1: 0x101, 2: 0x201})
+        self.index.update([1, 2])
+
+    def test_lookup(self):
+        """Test colors are decoded for each field."""
+        self.assertEqual(self.index.lookup('EE:EE:EE:EE:01:01', 'dl_src'),
+                         {1})
+        self.assertEqual(self.index.lookup(1, 'nw_tos'), {1, 2})
+        self.assertEqual(self.index.lookup('513', 'tp_src'), {2})
+        self.assertEqual(self.index.lookup('0.0.1.1', 'nw_src'), {1})
+
+    def test_update(self):
+        """Test built indexes follow color changes."""
+        self.index.lookup(1, 'nw_tos')
+        self.encodings.update({1: 0x102})
+        self.index.update([1])
+        self.encodings.remove(2)
+        self.index.remove(2)
+        self.assertEqual(self.index.lookup_many([1, 2], 'nw_tos'),
+                         [set(), {1}])
+        self.assertEqual(self.index.lookup(0x102, 'tp_dst'), {1})
+        self.assertEqual(self.index.lookup(2, 'nw_proto'), {1})
@@ -0,0 +1,76 @@
+"""Test the coloring strategies."""
+from unittest import TestCase
+
+from napps.amlight.coloring.coloring import (DpidColoring, DSaturColoring,
+                                             GreedyColoring, find_collisions)
+from napps.amlight.coloring.state import SwitchState, int_to_dpid
+
+
+def build_switches(adjacencies):
+    """Return an uncolored coloring state from a list of adjacencies
+    between integer DPIDs.
+    """
+    switches = {}
+    for source, target in adjacencies:
+        for number in (source, target):
+            switches.setdefault(number, SwitchState(int_to_dpid(number)))
+        switches[source].neighbors.add(target)
+        switches[target].neighbors.add(source)
+    return switches
+
+
+def is_proper(switches):
+    """Return True if no neighbors share a color."""
+    return all(switches[neighbor].color != switch_state.color
+               for switch_state in switches.values()
+               for neighbor in switch_state.neighbors)
+
+
+class TestColoring(TestCase):
+    """Test the coloring strategies."""
+
+    def test_dpid_coloring(self):
+        """Test colors are based on the DPID."""
+        switches = build_switches([(0x1000000000012c, 2)])
+        changed = DpidColoring().recolor(switches, set(switches))
+        self.assertEqual(changed, set())
+        self.assertEqual(switches[0x1000000000012c].color, 300)
+        self.assertEqual(switches[2].color, 2)
+
+    def test_greedy_coloring(self):
+        """Test a star is colored with two colors."""
+        switches = build_switches([(1, leaf) for leaf in range(2, 12)])
+        GreedyColoring().recolor(switches, set(switches))
+        self.assertTrue(is_proper(switches))
+        colors = {switch_state.color for switch_state in switches.values()}
+        self.assertEqual(colors, {1, 2})
+
+    def test_greedy_conflict(self):
+        """Test a new adjacency between same colored switches is solved."""
+        switches = build_switches([(1, 2), (3, 4)])
+        coloring = GreedyColoring()
+        coloring.recolor(switches, set(switches))
+        switches[1].neighbors.add(3)
+        switches[3].neighbors.add(1)
+
+        changed = coloring.recolor(switches, {1, 3})
+
+        self.assertEqual(changed, {1})
+        self.assertTrue(is_proper(switches))
+
+    def test_dsatur_coloring(self):
+        """Test DSatur colors a bipartite crown graph with two colors."""
+        adjacencies = [(i, 10 + j)
+                       for i in range(4) for j in range(4) if i != j]
+        switches = build_switches(adjacencies)
+        DSaturColoring().recolor(switches, set(switches))
+        self.assertTrue(is_proper(switches))
+        colors = {switch_state.color for switch_state in switches.values()}
+        self.assertEqual(len(colors), 2)
+
+    def test_find_collisions(self):
+        """Test neighbors with the same encoded color are found."""
+        switches = build_switches([(1, 2), (2, 3), (3, 4)])
+        collisions = find_collisions(switches, {1, 2, 3, 4},
+                                     {1: 1, 2: 1, 3: 2})
+        self.assertEqual(collisions, [(1, 2)])
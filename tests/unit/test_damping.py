@@ -0,0 +1,60 @@
+"""Test the FlapDamper class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.damping import FlapDamper
+
+
+class TestFlapDamper(TestCase):
+    """Test the FlapDamper class."""
+
+    def setUp(self):
+        self.now = 0
+        self.damper = FlapDamper(1000, 10, 2000, 750, 60,
+                                 clock=lambda: self.now)
+
+    def flap(self, times):
+        """Take the adjacency (1, 2) down and up again."""
+        for _ in range(times):
+            self.damper.update(set())
+            result = self.damper.update({(1, 2)})
+        return result
+
+    def test_suppress_and_reuse(self):
+        """Test a flapping adjacency is held down until it decays."""
+        self.assertEqual(self.damper.update({(1, 2), (2, 3)}),
+                         {(1, 2), (2, 3)})
+        self.assertEqual(self.flap(2), {(1, 2)})
+        self.assertEqual(self.flap(1), set())
+        self.assertTrue(self.damper.is_suppressed((1, 2)))
+        self.assertEqual(self.damper.state()[(1, 2)],
+                         {'penalty': 3000, 'flaps': 3, 'suppressed': True})
+
+        self.now = 15
+        self.assertFalse(self.damper.reuse_due())
+        self.now = 21
+        self.assertTrue(self.damper.reuse_due())
+        self.assertEqual(self.damper.update({(1, 2)}), {(1, 2)})
+        self.assertFalse(self.damper.is_suppressed((1, 2)))
+
+        self.now = 40
+        self.damper.update({(1, 2)})
+        self.assertEqual(self.damper.state(), {})
+
+    def test_max_penalty(self):
+        """Test the penalty is capped by the maximum suppress time."""
+        self.damper.update({(1, 2)})
+        self.flap(100)
+        self.assertEqual(self.damper.state()[(1, 2)]['penalty'], 48000)
+
+    def test_short_half_life(self):
+        """Test a half life much shorter than the maximum suppress time
+        does not overflow the maximum penalty.
+        """
+        damper = FlapDamper(1000, 0.001, 2000, 750, 60,
+                            clock=lambda: self.now)
+        self.assertEqual(damper.max_penalty, 750 * 2 ** 64)
+        damper.update({(1, 2)})
+        damper.update(set())
+        self.assertEqual(damper.update({(1, 2)}), {(1, 2)})
+        self.now = 1
+        self.assertEqual(damper.state()[(1, 2)]['penalty'], 0)
@@ -0,0 +1,55 @@
+"""Test the batch color encoding."""
+from unittest import TestCase, skipIf
+
+from napps.amlight.coloring import encoding
+from napps.amlight.coloring.encoding import (FIELD_ENCODINGS, ColorEncodings,
+                                             encode_colors)
+from napps.amlight.coloring.main import Main
+
+COLORS = [0, 1, 0xff, 0x100, 0x1234, 0xabcdef, 0xffffffff, 0x123456789abc,
+          0xffffffffffff, 0x1000000000001]
+
+
+class TestEncodeColors(TestCase):
+    """Test the encode_colors function."""
+
+    def assert_encodes(self, vectorized):
+        """Assert every field is encoded as in Main.color_to_field."""
+        for field in list(FIELD_ENCODINGS) + ['unknown']:
+            self.assertEqual(
+                encode_colors(COLORS, field, vectorized),
+                [Main.color_to_field(color, field) for color in COLORS],
+                field)
+
+    def test_python(self):
+        """Test the lookup tables encoding."""
+        self.assert_encodes(False)
+
+    @skipIf(not encoding.HAS_NUMPY, 'NumPy is not installed')
+    def test_numpy(self):
+        """Test the NumPy encoding."""
+        self.assert_encodes(True)
+
+    def test_empty(self):
+        """Test an empty list of colors."""
+        self.assertEqual(encode_colors([], 'dl_src'), [])
+
+
+class TestColorEncodings(TestCase):
+    """Test the ColorEncodings class."""
+
+    def test_update(self):
+        """Test colors are encoded for every field."""
+        encodings = ColorEncodings()
+        encodings.update({1: 0x101, 2: 0x201, 3: None})
+        self.assertEqual(encodings.get(1, 'dl_dst'), 'ee:ee:ee:ee:01:01')
+        self.assertEqual(encodings.get(2, 'nw_src'), '0.0.2.1')
+        self.assertEqual(encodings.field_values('tp_src'),
+                         {1: 0x101, 2: 0x201})
+        self.assertEqual(encodings.field_values('nw_tos'), {1: 1, 2: 1})
+
+        encodings.update({1: 0x102})
+        encodings.remove(2)
+        self.assertEqual(encodings.field_values('dl_vlan'), {1: 0x102})
+        encodings.clear()
+        self.assertEqual(encodings.field_values('dl_src'), {})
@@ -0,0 +1,68 @@
+"""Test the FlowPusher class."""
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import requests
+from napps.amlight.coloring.flow_pusher import FlowPusher
+
+
+@patch('napps.amlight.coloring.flow_pusher.settings')
+class TestFlowPusher(TestCase):
+    """Test the FlowPusher class."""
+
+    def setUp(self):
+        self.pusher = FlowPusher(workers=2)
+        self.pusher.session = Mock()
+
+    def tearDown(self):
+        self.pusher.shutdown()
+
+    def test_push_batches(self, settings_mock):
+        """Test method push sends the flows of a switch in batches."""
+        settings_mock.FLOW_MANAGER_URL = 'http://localhost/flows/%s'
+        settings_mock.FLOW_BATCH_SIZE = 2
+        settings_mock.FLOW_PUSH_TIMEOUT = 5
+        self.pusher.session.request.side_effect = [
+            Mock(status_code=201), Mock(status_code=500)]
+        flows = [{'priority': 50000}, {'priority': 50001},
+                 {'priority': 50002}]
+
+        results = self.pusher.push({'00:00:00:00:00:00:00:01': flows})
+
+        self.assertEqual(results, {'00:00:00:00:00:00:00:01': [True, False]})
+        self.assertEqual(self.pusher.session.request.call_count, 2)
+        self.pusher.session.request.assert_any_call(
+            'post', 'http://localhost/flows/00:00:00:00:00:00:00:01',
+            json={'flows': flows[:2]}, timeout=5)
+        self.pusher.session.request.assert_any_call(
+            'post', 'http://localhost/flows/00:00:00:00:00:00:00:01',
+            json={'flows': flows[2:]}, timeout=5)
+
+    def test_push(self, settings_mock):
+        """Test method push installs flows in every switch."""
+        settings_mock.FLOW_MANAGER_URL = 'http://localhost/flows/%s'
+        settings_mock.FLOW_BATCH_SIZE = 100
+
+        def post(_, url, **__):
+            if url.endswith('02'):
+                raise requests.Timeout('timed out')
+            return Mock(status_code=201)
+        self.pusher.session.request.side_effect = post
+
+        results = self.pusher.push({'00:01': [{}, {}], '00:02': [{}]})
+
+        self.assertEqual(results, {'00:01': [True], '00:02': [False]})
+
+    def test_remove(self, settings_mock):
+        """Test method remove deletes flows from every switch."""
+        settings_mock.FLOW_MANAGER_URL = 'http://localhost/flows/%s'
+        settings_mock.FLOW_BATCH_SIZE = 100
+        settings_mock.FLOW_PUSH_TIMEOUT = 5
+        self.pusher.session.request.return_value = Mock(status_code=202)
+
+        results = self.pusher.remove({'00:01': [{'priority': 50000}]})
+
+        self.assertEqual(results, {'00:01': [True]})
+        self.pusher.session.request.assert_called_once_with(
+            'delete', 'http://localhost/flows/00:01',
+            json={'flows': [{'priority': 50000}]}, timeout=5)
@@ -1,17 +1,28 @@
 """Test the Main class."""
+import json
+import tempfile
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+from flask import Flask
+from napps.amlight.coloring import settings
+from napps.amlight.coloring.coloring import GreedyColoring
 from napps.amlight.coloring.main import Main
+from napps.amlight.coloring.rate_limit import FlowRateLimiter
+from napps.amlight.coloring.state import (COLOR_COOKIE, COLOR_COOKIE_MASK,
+                                          FlowTemplate, SwitchState,
+                                          int_to_dpid)
+from napps.amlight.coloring.storage import StateStore
 
-from tests.helpers import get_controller_mock
+from tests.helpers import get_controller_mock, make_switches
 
 
 class TestMain(TestCase):
     """Test the Main class."""
 
     def setUp(self):
-        self.napp = Main(get_controller_mock())
+        with patch.object(settings, 'STATE_FILE', None):
+            self.napp = Main(get_controller_mock())
 
     def test_color_to_field(self):
         """Test method color_to_field."""
@@ -19,9 +30,10 @@ class TestMain(TestCase):
         color = self.napp.color_to_field(300, 'dl_src')
         self.assertEqual(color, 'ee:ee:ee:ee:01:2c')
 
-    @patch('requests.post')
-    def test_update_colors(self, req_post_mock):
+    @patch('requests.Session.request')
+    def test_update_colors(self, request_mock):
         """Test method update_colors."""
+        request_mock.return_value = Mock(status_code=201)
         switch1 = Mock()
         switch1.dpid = '00:00:00:00:00:00:00:01'
         switch1.ofp_version = '0x04'
@@ -52,7 +64,7 @@ class TestMain(TestCase):
         ]
 
         self.napp.update_colors(links)
-        self.assertEqual(req_post_mock.call_count, 2)
+        self.assertEqual(request_mock.call_count, 2)
 
         links = [
             {
@@ -61,6 +73,633 @@ class TestMain(TestCase):
             }
         ]
 
-        req_post_mock.reset_mock()
+        request_mock.reset_mock()
         self.napp.update_colors(links)
-        req_post_mock.assert_not_called()
+        methods = [call[0][0] for call in request_mock.call_args_list]
+        self.assertEqual(methods, ['delete', 'delete'])
+
+    @patch('requests.Session.request')
+    def test_update_colors_incremental(self, request_mock):
+        """Test update_colors only processes the switches that changed."""
+        request_mock.return_value = Mock(status_code=201)
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+
+        def link(source, target):
+            return {'endpoint_a': {'switch': source},
+                    'endpoint_b': {'switch': target}}
+
+        self.napp.update_colors([link(dpid1, dpid2)])
+        self.assertEqual(request_mock.call_count, 2)
+
+        request_mock.reset_mock()
+        with patch.object(self.napp, 'missing_flows',
+                          wraps=self.napp.missing_flows) as missing_mock:
+            self.napp.update_colors([link(dpid1, dpid2),
+                                     link(dpid3, dpid2)])
+        self.assertEqual(request_mock.call_count, 2)
+        checked = {call[0][0] for call in missing_mock.call_args_list}
+        self.assertEqual(checked, {2, 3})
+        self.assertEqual(self.napp.switches[2].neighbors, {1, 3})
+
+        request_mock.reset_mock()
+        self.napp.update_colors([link(dpid3, dpid2)])
+        self.assertEqual(self.napp.switches[1].neighbors, set())
+        self.assertEqual(self.napp.switches[2].neighbors, {3})
+        self.assertEqual(self.napp.switches[1].flows, set())
+        self.assertEqual(self.napp.switches[2].flows,
+                         {'ee:ee:ee:ee:ee:03'})
+        methods = sorted(call[0][0] for call in request_mock.call_args_list)
+        self.assertEqual(methods, ['delete', 'delete'])
+
+        request_mock.reset_mock()
+        del switches[dpid3]
+        self.napp.update_colors([link(dpid3, dpid2)])
+        self.assertNotIn(3, self.napp.switches)
+        self.assertEqual(self.napp.switches[2].flows, set())
+        request_mock.assert_called_once()
+
+    @patch('requests.Session.request')
+    def test_update_colors_retry(self, request_mock):
+        """Test flows are recorded only once installed, retrying failures."""
+        request_mock.return_value = Mock(status_code=500)
+        switches = make_switches(self.napp.controller, 2)
+        dpid1, dpid2 = sorted(switches)
+        self.napp.retry_queue._clock = Mock(return_value=0)
+
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+        self.assertEqual(self.napp.switches[1].flows, set())
+        self.assertEqual(self.napp.retry_queue.due(), [])
+
+        request_mock.reset_mock()
+        request_mock.return_value = Mock(status_code=201)
+        self.napp.execute()
+        request_mock.assert_not_called()
+
+        self.napp.retry_queue._clock.return_value = 60
+        self.napp.execute()
+        self.assertEqual(request_mock.call_count, 2)
+        self.assertEqual(self.napp.switches[1].flows, {'ee:ee:ee:ee:ee:02'})
+        self.assertEqual(self.napp.retry_queue.stats,
+                         {'pending': 0, 'open': 0})
+
+    @patch('requests.Session.request')
+    def test_retry_nothing_left(self, request_mock):
+        """Test a failed switch with nothing left to reconcile is no longer
+        retried."""
+        request_mock.return_value = Mock(status_code=500)
+        switches = make_switches(self.napp.controller, 2)
+        dpid1, dpid2 = sorted(switches)
+        self.napp.retry_queue._clock = Mock(return_value=0)
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+        self.assertEqual(self.napp.retry_queue.stats['pending'], 2)
+
+        self.napp.update_colors([])
+        self.napp.retry_queue._clock.return_value = 60
+        for _ in range(10):
+            self.napp.execute()
+        self.assertEqual(self.napp.metrics.get('coloring_retries_total'), 2)
+        self.assertEqual(self.napp.retry_queue.stats,
+                         {'pending': 0, 'open': 0})
+
+    def test_topology_updated(self):
+        """Test topology updates are recolored by execute once due."""
+        self.napp.schedule_colors = Mock()
+        self.napp.scheduler.quiet_time = 0
+        link = Mock()
+        link.endpoint_a.switch.dpid = '00:00:00:00:00:00:00:01'
+        link.endpoint_b.switch.dpid = '00:00:00:00:00:00:00:02'
+        event = Mock()
+        event.content = {'topology': Mock(links={'1': link})}
+
+        self.napp.topology_updated(event)
+        self.napp.topology_updated(event)
+        self.napp.schedule_colors.assert_not_called()
+
+        self.napp.execute()
+        self.napp.execute()
+        self.napp.schedule_colors.assert_called_once_with([
+            {'endpoint_a': {'switch': '00:00:00:00:00:00:00:01'},
+             'endpoint_b': {'switch': '00:00:00:00:00:00:00:02'}}])
+
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('requests.Session.request')
+    def test_execute_chunks(self, request_mock, settings_mock):
+        """Test the flows of recolored switches are pushed over ticks."""
+        request_mock.return_value = Mock(status_code=201)
+        settings_mock.COLOR_FIELD = 'dl_src'
+        settings_mock.COLOR_AGGREGATION = False
+        settings_mock.COLORING_CHUNK_SIZE = 2
+        settings_mock.COLORING_TICK_BUDGET = 0
+        switches = make_switches(self.napp.controller, 5)
+        dpids = sorted(switches)
+
+        self.napp.schedule_colors([{'endpoint_a': {'switch': source},
+                                    'endpoint_b': {'switch': target}}
+                                   for source, target in zip(dpids,
+                                                             dpids[1:])])
+        request_mock.assert_not_called()
+        self.assertEqual(len(self.napp.work_queue), 5)
+
+        self.napp.execute()
+        self.assertEqual(request_mock.call_count, 2)
+        self.assertEqual(len(self.napp.work_queue), 3)
+        self.napp.execute()
+        self.napp.execute()
+        self.assertEqual(request_mock.call_count, 5)
+        self.assertEqual(len(self.napp.work_queue), 0)
+
+    @patch('requests.Session.request')
+    def test_update_colors_greedy(self, request_mock):
+        """Test a switch has one flow per distinct neighbor color."""
+        request_mock.return_value = Mock(status_code=201)
+        self.napp.coloring = GreedyColoring()
+        switches = make_switches(self.napp.controller, 4)
+        hub = '00:00:00:00:00:00:00:01'
+        links = [{'endpoint_a': {'switch': hub},
+                  'endpoint_b': {'switch': dpid}}
+                 for dpid in sorted(switches)[1:]]
+
+        self.napp.update_colors(links)
+
+        self.assertEqual(len(self.napp.switches[1].flows), 1)
+        self.assertEqual(request_mock.call_count, 4)
+
+    @patch('napps.amlight.coloring.main.settings')
+    @patch('requests.Session.request')
+    def test_update_colors_aggregation(self, request_mock, settings_mock):
+        """Test neighbor colors are aggregated into masked matches."""
+        request_mock.return_value = Mock(status_code=201)
+        settings_mock.COLOR_FIELD = 'dl_src'
+        settings_mock.COLOR_AGGREGATION = True
+        settings_mock.COLORING_CHUNK_SIZE = 100
+        switches = make_switches(self.napp.controller, 5)
+        hub = '00:00:00:00:00:00:00:01'
+        links = [{'endpoint_a': {'switch': hub},
+                  'endpoint_b': {'switch': dpid}}
+                 for dpid in sorted(switches)[1:]]
+
+        self.napp.update_colors(links)
+
+        self.assertEqual(self.napp.switches[1].flows,
+                         {'ee:ee:ee:ee:ee:04/ff:ff:ff:ff:ff:fe',
+                          'ee:ee:ee:ee:ee:02/ff:ff:ff:ff:ff:fe'})
+        request_mock.assert_called()
+
+        self.napp.switches[1].flows = set()
+        with Flask(__name__).test_request_context('/aggregation'):
+            response = self.napp.rest_aggregation()
+        content = json.loads(response.get_data())
+        self.assertEqual(content['switches']['00:00:00:00:00:00:00:01'],
+                         {'neighbor_colors': 4, 'flows': 2, 'flows_saved': 2})
+        self.assertEqual(content['flows_saved'], 2)
+
+        settings_mock.COLOR_AGGREGATION = False
+        with Flask(__name__).test_request_context('/aggregation'):
+            response = self.napp.rest_aggregation()
+        self.assertEqual(json.loads(response.get_data())['flows_saved'], 0)
+
+    @patch('requests.Session.request')
+    def test_warm_restart(self, request_mock):
+        """Test a restored state only pushes the flows really missing."""
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}},
+                 {'endpoint_a': {'switch': dpid2},
+                  'endpoint_b': {'switch': dpid3}}]
+        self.napp.update_colors(links)
+        request_mock.reset_mock()
+        self.napp.shutdown()
+        request_mock.assert_not_called()
+        state = self.napp.dump_state()
+
+        with patch.object(settings, 'STATE_FILE', None):
+            napp = Main(self.napp.controller)
+        napp.restore_state(state)
+        self.assertEqual(napp.switches[2].neighbors, {1, 3})
+
+        template = FlowTemplate.get('0x04', 'dl_src')
+        installed = {
+            dpid1: [template.render('ee:ee:ee:ee:ee:02')],
+            dpid2: [template.render('ee:ee:ee:ee:ee:01'),
+                    template.render('ee:ee:ee:ee:ee:09')],
+            dpid3: []}
+        napp.flow_pusher.fetch_all = Mock(return_value=installed)
+        napp.flow_pusher.push = Mock(return_value={})
+        napp.flow_pusher.remove = Mock(return_value={})
+
+        napp.update_colors(links)
+
+        napp.flow_pusher.fetch_all.assert_called_once_with(
+            {dpid1, dpid2, dpid3})
+        pushed = napp.flow_pusher.push.call_args[0][0]
+        self.assertEqual(
+            {dpid: [flow['match']['dl_src'] for flow in flows]
+             for dpid, flows in pushed.items()},
+            {dpid2: ['ee:ee:ee:ee:ee:03'], dpid3: ['ee:ee:ee:ee:ee:02']})
+        removed = napp.flow_pusher.remove.call_args[0][0]
+        self.assertEqual(list(removed), [dpid2])
+        self.assertEqual(napp.unverified, set())
+        # The stale flow of dpid2 is not counted as a flow skipped
+        self.assertEqual(napp.metrics.get('coloring_flows_skipped_total'), 2)
+
+    @patch('requests.Session.request')
+    def test_warm_restart_seed(self, request_mock):
+        """Test the switches restored when the NApp is loaded are kept
+        until the first topology update."""
+        request_mock.return_value = Mock(status_code=201,
+                                         json=Mock(return_value={}))
+        switches = make_switches(self.napp.controller, 2)
+        dpid1, dpid2 = sorted(switches)
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}}]
+        self.napp.update_colors(links)
+        state = self.napp.dump_state()
+        state['purges'] = {dpid2: [{'cookie': 1}]}
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        state_file = '%s/state.json' % folder.name
+        StateStore(state_file).save(state)
+
+        for known in ({}, {dpid1: switches[dpid1]}):
+            controller = get_controller_mock()
+            controller.switches = known
+            controller.buffers.app.put = Mock()
+            with patch.object(settings, 'STATE_FILE', state_file):
+                napp = Main(controller)
+            self.assertEqual(set(napp.switches), {1, 2})
+            self.assertEqual(napp.switches[1].neighbors, {2})
+            self.assertEqual(napp.purges, {2: [{'cookie': 1}]})
+            controller.buffers.app.put.assert_not_called()
+
+        napp.update_colors(links)
+        self.assertEqual(set(napp.switches), {1})
+        self.assertEqual(napp.purges, {})
+
+    @patch('requests.Session.request')
+    def test_seed_colors(self, request_mock):
+        """Test the switches and links known when the NApp is loaded are
+        colored without waiting for a topology update."""
+        request_mock.return_value = Mock(status_code=201)
+        controller = get_controller_mock()
+        switches = make_switches(controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        for number, (source, target) in enumerate(((dpid1, dpid2),
+                                                   (dpid2, dpid3))):
+            link = Mock(id=number)
+            link.endpoint_a.switch = switches[source]
+            link.endpoint_b.switch = switches[target]
+            switches[source].interfaces[number] = Mock(link=link)
+            switches[target].interfaces[number] = Mock(link=link)
+        switches[dpid3].interfaces[2] = Mock(link=None)
+
+        with patch.object(settings, 'STATE_FILE', None):
+            napp = Main(controller)
+        self.assertEqual(napp.switches[2].neighbors, {1, 3})
+        self.assertEqual(len(napp.work_queue), 3)
+        self.assertIsNone(napp.first_colored)
+
+        napp.execute()
+        self.assertEqual(len(napp.switches[2].flows), 2)
+        self.assertEqual(
+            napp.metrics.get('coloring_first_colored_switch_seconds'),
+            napp.first_colored)
+        self.assertGreater(napp.first_colored, 0)
+
+    @patch('requests.Session.request')
+    def test_palette_change(self, request_mock):
+        """Test a new palette removes the previous flows by cookie first."""
+        request_mock.return_value = Mock(status_code=201)
+        switches = make_switches(self.napp.controller, 2)
+        dpid1, dpid2 = sorted(switches)
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}}]
+        self.napp.update_colors(links)
+
+        request_mock.reset_mock()
+        with patch.object(settings, 'COLOR_FIELD', 'nw_tos'):
+            self.napp.schedule_colors(links)
+            self.assertEqual(self.napp.palette_version, 1)
+            self.napp.work_queue.drain(self.napp.reconcile_chunk, 10)
+            self.assertEqual(self.napp.purges, {})
+
+            calls = [(call[0][0], call[1]['json']['flows'][0])
+                     for call in request_mock.call_args_list]
+            self.assertEqual(calls[0], ('delete', {
+                'table_id': 0, 'cookie': COLOR_COOKIE,
+                'cookie_mask': 0xffffffffffffffff}))
+            self.assertEqual(calls[-1][0], 'post')
+            self.assertEqual(calls[-1][1]['cookie'], COLOR_COOKIE | 1)
+            self.assertEqual(self.napp.switches[1].flows, {2})
+
+        request_mock.reset_mock()
+        with patch.object(settings, 'REMOVE_FLOWS_ON_SHUTDOWN', True):
+            self.napp.shutdown()
+        self.assertEqual(request_mock.call_count, 2)
+        self.assertEqual(
+            request_mock.call_args[1]['json']['flows'][0]['cookie_mask'],
+            COLOR_COOKIE_MASK)
+        self.assertEqual(self.napp.switches[1].flows, set())
+
+    @patch('requests.Session.request')
+    def test_colors_changed(self, _):
+        """Test color changes are published as deltas with a version."""
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        self.napp.controller.buffers.app.put = Mock()
+        put = self.napp.controller.buffers.app.put
+
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+        event = put.call_args[0][0]
+        self.assertEqual(event.name, 'amlight/coloring.colors_changed')
+        self.assertEqual(event.content['version'], 1)
+        self.assertEqual(sorted(event.content['added']), [dpid1, dpid2, dpid3])
+        self.assertEqual(event.content['neighbors_added'], [[dpid1, dpid2]])
+        snapshot = self.napp.colors.snapshot(
+            self.napp.encodings, self.napp.adjacencies, settings.COLOR_FIELD)
+        self.assertEqual(snapshot['version'], 1)
+        self.assertEqual(snapshot['epoch'], event.content['epoch'])
+        self.assertEqual(snapshot['adjacencies'], [[dpid1, dpid2]])
+
+        put.reset_mock()
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+        put.assert_not_called()
+
+        del switches[dpid3]
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid2},
+                                  'endpoint_b': {'switch': dpid3}}])
+        content = put.call_args[0][0].content
+        self.assertEqual((content['previous_version'], content['version']),
+                         (1, 2))
+        self.assertEqual(content['removed'], [dpid3])
+        self.assertEqual(content['added'], {})
+        self.assertEqual(content['neighbors_removed'], [[dpid1, dpid2]])
+
+    @patch('requests.Session.request')
+    def test_flap_damping(self, request_mock):
+        """Test an adjacency that keeps flapping is held down."""
+        request_mock.return_value = Mock(status_code=201)
+        switches = make_switches(self.napp.controller, 2)
+        dpid1, dpid2 = sorted(switches)
+        self.napp.damper._clock = Mock(return_value=0)
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}}]
+        self.napp.update_colors(links)
+        for _ in range(3):
+            self.napp.update_colors([])
+            self.napp.update_colors(links)
+        self.assertEqual(self.napp.switches[1].neighbors, set())
+        self.assertEqual(self.napp.switches[1].flows, set())
+
+        with Flask(__name__).test_request_context('/damping'):
+            response = self.napp.rest_damping()
+        self.assertEqual(json.loads(response.get_data()), {'adjacencies': [
+            {'switches': [dpid1, dpid2], 'penalty': 3000, 'flaps': 3,
+             'suppressed': True}]})
+
+        request_mock.reset_mock()
+        self.napp.damper._clock.return_value = 180
+        self.napp.execute()
+        self.assertEqual(self.napp.switches[1].neighbors, {2})
+        self.assertEqual(request_mock.call_count, 2)
+
+    @patch('requests.Session.request')
+    def test_flow_audit(self, request_mock):
+        """Test the audit only repairs the flows that drifted."""
+        request_mock.return_value = Mock(status_code=201)
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}},
+                 {'endpoint_a': {'switch': dpid2},
+                  'endpoint_b': {'switch': dpid3}}]
+        self.napp.update_colors(links)
+
+        self.napp.auditor.sample_rate = 1
+        self.napp.auditor.grace_time = 0
+        template = FlowTemplate.get('0x04', 'dl_src')
+        reported = {
+            dpid1: [template.render('ee:ee:ee:ee:ee:02')],
+            dpid2: [template.render('ee:ee:ee:ee:ee:01'),
+                    template.render('ee:ee:ee:ee:ee:09')],
+            dpid3: None}
+        self.napp.flow_pusher.fetch_all = Mock(return_value=reported)
+        self.napp.flow_pusher.push = Mock(return_value={})
+        self.napp.flow_pusher.remove = Mock(return_value={})
+        self.napp.audit_flows()
+
+        self.napp.flow_pusher.fetch_all.assert_called_once_with(
+            {dpid1, dpid2, dpid3}, stats=True)
+        self.assertEqual(len(self.napp.work_queue), 1)
+        self.napp.process_work()
+        pushed = self.napp.flow_pusher.push.call_args[0][0]
+        self.assertEqual(
+            {dpid: [flow['match']['dl_src'] for flow in flows]
+             for dpid, flows in pushed.items()},
+            {dpid2: ['ee:ee:ee:ee:ee:03']})
+        removed = self.napp.flow_pusher.remove.call_args[0][0]
+        self.assertEqual(
+            {dpid: [flow['match']['dl_src'] for flow in flows]
+             for dpid, flows in removed.items()},
+            {dpid2: ['ee:ee:ee:ee:ee:09']})
+
+    @patch('requests.Session.request')
+    def test_rate_limit(self, request_mock):
+        """Test switches over the rate limits are deferred."""
+        request_mock.return_value = Mock(status_code=201)
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        clock = Mock(return_value=0)
+        self.napp.rate_limiter = FlowRateLimiter(0, 0, 1, 2, clock=clock)
+        self.napp.work_queue._clock = clock
+        links = [{'endpoint_a': {'switch': dpid1},
+                  'endpoint_b': {'switch': dpid2}},
+                 {'endpoint_a': {'switch': dpid2},
+                  'endpoint_b': {'switch': dpid3}}]
+        self.napp.update_colors(links)
+        self.assertEqual(len(self.napp.switches[1].flows), 1)
+        self.assertEqual(self.napp.switches[2].flows, set())
+        self.assertEqual(len(self.napp.switches[3].flows), 1)
+        self.assertEqual(self.napp.work_queue.stats['deferred'], 1)
+
+        clock.return_value = 2
+        self.napp.process_work()
+        self.assertEqual(len(self.napp.switches[2].flows), 2)
+        self.assertEqual(len(self.napp.work_queue), 0)
+        self.assertEqual(
+            self.napp.metrics.get('coloring_switches_throttled_total'), 1)
+
+    def test_sharding(self):
+        """Test shards push the flows of their switches and take over the
+        switches of a shard that leaves."""
+        dpids = [int_to_dpid(number) for number in range(1, 9)]
+        links = [{'endpoint_a': {'switch': source},
+                  'endpoint_b': {'switch': target}}
+                 for source, target in zip(dpids, dpids[1:])]
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        napps = []
+        for shard_id in ('a', 'b'):
+            with patch.multiple(settings, STATE_FILE=None, SHARD_ID=shard_id,
+                                SHARD_CHANNEL=folder.name):
+                napp = Main(get_controller_mock())
+            make_switches(napp.controller, 8)
+            napp.flow_pusher.push = Mock(return_value={})
+            napp.flow_pusher.fetch_all = Mock(return_value={})
+            napps.append(napp)
+        napp_a, napp_b = napps
+        napp_a.sync_shards()
+
+        pushed = []
+        for napp in napps:
+            napp.update_colors(links)
+            pushed.append(set(napp.flow_pusher.push.call_args[0][0]))
+        self.assertEqual(pushed[0] | pushed[1], set(dpids))
+        self.assertEqual(pushed[0] & pushed[1], set())
+        self.assertTrue(pushed[0] and pushed[1])
+
+        with patch.object(settings, 'REMOVE_FLOWS_ON_SHUTDOWN', True):
+            napp_b.shutdown()
+        napp_a.flow_pusher.push.reset_mock()
+        napp_a.execute()
+        self.assertEqual(set(napp_a.flow_pusher.fetch_all.call_args[0][0]),
+                         pushed[1])
+        self.assertEqual(set(napp_a.flow_pusher.push.call_args[0][0]),
+                         pushed[1])
+
+    def test_sharding_join(self):
+        """Test a shard loaded after another published its colors adopts
+        them for the switches of the other shard."""
+        dpids = [int_to_dpid(number) for number in range(1, 9)]
+        links = [{'endpoint_a': {'switch': source},
+                  'endpoint_b': {'switch': target}}
+                 for source, target in zip(dpids, dpids[1:])]
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        napps = []
+        for shard_id in ('a', 'b'):
+            controller = get_controller_mock()
+            make_switches(controller, 8)
+            with patch.multiple(settings, STATE_FILE=None, SHARD_ID=shard_id,
+                                SHARD_CHANNEL=folder.name,
+                                COLORING_STRATEGY='greedy'):
+                napp = Main(controller)
+                napp.flow_pusher.push = Mock(return_value={})
+                napp.flow_pusher.fetch_all = Mock(return_value={})
+                napp.update_colors(links)
+                napp.sync_shards()
+            napps.append(napp)
+        napp_a, napp_b = napps
+
+        with patch.object(settings, 'COLORING_STRATEGY', 'greedy'):
+            napp_a.sync_shards()
+            napp_b.sync_shards()
+        owned = {number for number in napp_b.switches if napp_b.owns(number)}
+        self.assertTrue(owned and owned != set(napp_b.switches))
+        for number, switch_state in napp_b.switches.items():
+            self.assertIsNotNone(switch_state.color)
+            self.assertEqual(switch_state.color,
+                             napp_a.switches[number].color)
+
+    @patch('requests.Session.request')
+    def test_decode_colors(self, _):
+        """Test color values are decoded into DPIDs."""
+        switches = make_switches(self.napp.controller, 3)
+        dpid1, dpid2, dpid3 = sorted(switches)
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+
+        self.assertEqual(
+            self.napp.decode_colors(['ee:ee:ee:ee:ee:02', 'ee:ee:ee:ee:ee:04',
+                                     'ee:ee:ee:ee:ee:03']),
+            [[dpid2], [], [dpid3]])
+        self.assertEqual(
+            self.napp.decode_colors([1, 3], field='nw_tos', switch=dpid2),
+            [[dpid1], []])
+
+        app = Flask(__name__)
+        with app.test_request_context(
+                '/colors/decode', method='POST',
+                json={'values': ['ee:ee:ee:ee:ee:02'], 'switch': dpid1}):
+            response = self.napp.rest_decode_colors()
+        self.assertEqual(json.loads(response.get_data())['results'],
+                         [{'color_value': 'ee:ee:ee:ee:ee:02',
+                           'dpids': [dpid2]}])
+        for content in ({'values': [[1]]}, {'values': [True]},
+                        {'values': [1], 'color_field': 'bogus'},
+                        {'values': [1], 'color_field': ['dl_src']},
+                        {'values': [1], 'switch': 'bogus'},
+                        {'values': [1], 'switch': 1}):
+            with app.test_request_context('/colors/decode', method='POST',
+                                          json=content):
+                _, status = self.napp.rest_decode_colors()
+            self.assertEqual(status, 400)
+
+    def test_rest_colors(self):
+        """Test the colors table is cached and supports conditional GET."""
+        self.napp.switches = {
+            1: SwitchState('00:00:00:00:00:00:00:01', 1),
+            2: SwitchState('00:00:00:00:00:00:00:02', 2)}
+        self.napp.encodings.update({1: 1, 2: 2})
+        self.napp.colors.bump()
+        app = Flask(__name__)
+
+        with patch('napps.amlight.coloring.encoding._encode') as encode_mock:
+            with app.test_request_context('/colors'):
+                response = self.napp.rest_colors()
+            self.assertEqual(response.status_code, 200)
+            content = json.loads(response.get_data())
+            self.assertEqual(content['version'], 1)
+            self.assertEqual(
+                content['colors']['00:00:00:00:00:00:00:02']['color_value'],
+                'ee:ee:ee:ee:ee:02')
+            etag = response.headers['ETag']
+
+            with app.test_request_context(
+                    '/colors', headers={'If-None-Match': etag}):
+                response = self.napp.rest_colors()
+            self.assertEqual(response.status_code, 304)
+
+            with app.test_request_context(
+                    '/colors?dpids=00:00:00:00:00:00:00:01'):
+                response = self.napp.rest_colors()
+            encode_mock.assert_not_called()
+        content = json.loads(response.get_data())
+        self.assertEqual(list(content['colors']), ['00:00:00:00:00:00:00:01'])
+
+        self.napp.colors.bump()
+        with app.test_request_context(
+                '/colors', headers={'If-None-Match': etag}):
+            response = self.napp.rest_colors()
+        self.assertEqual(response.status_code, 200)
+
+        # The same version in another process has another ETag
+        etag = response.headers['ETag']
+        with patch.object(self.napp.colors, 'epoch', 'restarted'):
+            with app.test_request_context(
+                    '/colors', headers={'If-None-Match': etag}):
+                response = self.napp.rest_colors()
+        self.assertEqual(response.status_code, 200)
+
+    @patch('requests.Session.request')
+    def test_rest_metrics(self, request_mock):
+        """Test metrics are exported in the Prometheus text format."""
+        request_mock.return_value = Mock(status_code=201)
+        dpid1, dpid2 = sorted(make_switches(self.napp.controller, 2))
+        self.napp.update_colors([{'endpoint_a': {'switch': dpid1},
+                                  'endpoint_b': {'switch': dpid2}}])
+
+        with Flask(__name__).test_request_context('/metrics'):
+            response = self.napp.rest_metrics()
+
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn('coloring_switches 2', lines)
+        self.assertIn('coloring_flows 2', lines)
+        self.assertIn('coloring_flows_pushed_total'
+                      '{method="post",result="success"} 2', lines)
+        self.assertIn('coloring_stage_seconds_count{stage="push"} 1', lines)
@@ -0,0 +1,36 @@
+"""Test the Metrics class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.metrics import Metrics
+
+
+class TestMetrics(TestCase):
+    """Test the Metrics class."""
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_counter(self):
+        """Test counters are rendered with their labels."""
+        self.metrics.describe('flows_total', 'counter', 'Flows.')
+        self.metrics.inc('flows_total', 2, result='success')
+        self.metrics.inc('flows_total', result='success')
+        self.assertEqual(self.metrics.get('flows_total', result='success'), 3)
+        self.assertEqual(self.metrics.render(),
+                         '# HELP flows_total Flows.\n'
+                         '# TYPE flows_total counter\n'
+                         'flows_total{result="success"} 3\n')
+
+    def test_histogram(self):
+        """Test histograms have cumulative buckets, sum and count."""
+        self.metrics.describe('latency_seconds', 'histogram', 'Latency.',
+                              buckets=(0.1, 1))
+        self.metrics.observe('latency_seconds', 0.05)
+        self.metrics.observe('latency_seconds', 0.5)
+        self.metrics.observe('latency_seconds', 2)
+        lines = self.metrics.render().splitlines()
+        self.assertEqual(lines[2:], ['latency_seconds_bucket{le="0.1"} 1',
+                                     'latency_seconds_bucket{le="1"} 2',
+                                     'latency_seconds_bucket{le="+Inf"} 3',
+                                     'latency_seconds_sum 2.55',
+                                     'latency_seconds_count 3'])
@@ -0,0 +1,77 @@
+"""Test the OpenFlowPusher class."""
+from unittest import TestCase
+from unittest.mock import Mock
+
+from napps.amlight.coloring.openflow_pusher import (OpenFlowPusher,
+                                                    flow_mod, packed_flow_mod)
+from napps.amlight.coloring.state import COLOR_COOKIE, FlowTemplate
+from pyof.v0x04.controller2switch.flow_mod import FlowMod, FlowModCommand
+
+
+class TestOpenFlowPusher(TestCase):
+    """Test the OpenFlowPusher class."""
+
+    def setUp(self):
+        self.controller = Mock()
+        self.pusher = OpenFlowPusher(self.controller, workers=2)
+
+    def tearDown(self):
+        self.pusher.shutdown()
+
+    def test_push(self):
+        """Test the flows of each switch are queued as FlowMods at once."""
+        switch = Mock(ofp_version='0x04')
+        switch.is_connected.return_value = True
+        self.controller.get_switch_by_dpid.side_effect = {
+            '00:00:00:00:00:00:00:01': switch}.get
+        template = FlowTemplate.get('0x04', 'dl_src')
+        flows = [template.render('ee:ee:ee:ee:ee:02'),
+                 template.render('ee:ee:ee:ee:ee:03')]
+
+        results = self.pusher.push({'00:00:00:00:00:00:00:01': flows,
+                                    '00:00:00:00:00:00:00:02': flows})
+
+        self.assertEqual(results, {'00:00:00:00:00:00:00:01': [True],
+                                   '00:00:00:00:00:00:00:02': [False]})
+        events = [call[0][0] for call in
+                  self.controller.buffers.msg_out.put.call_args_list]
+        self.assertEqual(len(events), 2)
+        self.assertIs(events[0].destination, switch.connection)
+        message = FlowMod()
+        message.unpack(events[0].content['message'].pack()[8:])
+        self.assertEqual(message.command, FlowModCommand.OFPFC_ADD)
+        self.assertEqual(message.cookie, COLOR_COOKIE)
+        _, packed = packed_flow_mod('0x04', 'dl_src', 'ee:ee:ee:ee:ee:03',
+                                    50000, template.controller_port,
+                                    COLOR_COOKIE, False)
+        self.assertEqual(events[1].content['message'].pack()[8:], packed[8:])
+
+        # Each message sent has its own xid
+        self.pusher.push({'00:00:00:00:00:00:00:01': flows})
+        messages = [call[0][0].content['message'] for call in
+                    self.controller.buffers.msg_out.put.call_args_list]
+        self.assertEqual(len({message.header.xid for message in messages}),
+                         len(messages))
+        for message in messages:
+            self.assertEqual(message.pack()[4:8],
+                             message.header.xid.to_bytes(4, 'big'))
+
+    def test_flow_mod(self):
+        """Test masked matches and deletes of OpenFlow 1.3 FlowMods."""
+        template = FlowTemplate.get('0x04', 'dl_src')
+        message = flow_mod('0x04', template.render(
+            'ee:ee:ee:ee:ee:02/ff:ff:ff:ff:ff:fe'), delete=True)
+        self.assertEqual(message.command, FlowModCommand.OFPFC_DELETE_STRICT)
+        tlv = message.match.oxm_match_fields[0]
+        self.assertTrue(tlv.oxm_hasmask)
+        self.assertEqual(tlv.oxm_value, bytes.fromhex('eeeeeeeeee02'
+                                                      'fffffffffffe'))
+
+        message = flow_mod('0x04', template.purge_flows([])[0], delete=True)
+        self.assertEqual(message.command, FlowModCommand.OFPFC_DELETE)
+        self.assertEqual(message.cookie, COLOR_COOKIE)
+
+        template = FlowTemplate.get('0x01', 'nw_src')
+        message = flow_mod('0x01', template.render('10.0.0.1'))
+        self.assertEqual(str(message.match.nw_src), '10.0.0.1')
+        self.assertEqual(message.actions[0].port, template.controller_port)
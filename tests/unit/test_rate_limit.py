@@ -0,0 +1,38 @@
+"""Test the FlowRateLimiter class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.rate_limit import FlowRateLimiter
+
+
+class TestFlowRateLimiter(TestCase):
+    """Test the FlowRateLimiter class."""
+
+    def setUp(self):
+        self.now = 0
+        self.limiter = FlowRateLimiter(10, 20, 15, 30,
+                                       clock=lambda: self.now)
+
+    def test_switch_limit(self):
+        """Test each switch has its own bucket."""
+        self.assertEqual(self.limiter.acquire('00:01', 15), 0)
+        self.assertEqual(self.limiter.acquire('00:01', 10), 0.5)
+        self.now = 0.5
+        self.assertEqual(self.limiter.acquire('00:01', 10), 0)
+
+    def test_global_limit(self):
+        """Test the global bucket is shared by all switches."""
+        self.assertEqual(self.limiter.acquire('00:01', 20), 0)
+        self.assertEqual(self.limiter.acquire('00:02', 20), 2 / 3)
+        self.assertEqual(self.limiter.throttled, 1)
+
+    def test_large_operation(self):
+        """Test operations over the burst wait for a full bucket."""
+        self.assertEqual(self.limiter.acquire('00:01', 50), 0)
+        self.assertEqual(self.limiter.acquire('00:01', 1), 3.1)
+        self.now = 10
+        self.assertEqual(self.limiter.acquire('00:01', 1), 0)
+
+    def test_disabled(self):
+        """Test a rate of 0 disables a limit."""
+        self.limiter = FlowRateLimiter(0, 0, 0, 0)
+        self.assertEqual(self.limiter.acquire('00:01', 10 ** 6), 0)
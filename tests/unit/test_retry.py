@@ -0,0 +1,41 @@
+"""Test the RetryQueue class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.retry import RetryQueue
+
+
+class TestRetryQueue(TestCase):
+    """Test the RetryQueue class."""
+
+    def setUp(self):
+        self.now = 0
+        self.queue = RetryQueue(1, 8, 4, 100, clock=lambda: self.now,
+                                rand=lambda: 1)
+
+    def test_backoff(self):
+        """Test retries are delayed exponentially."""
+        self.queue.failed('00:01')
+        self.assertFalse(self.queue.ready('00:01'))
+        self.assertTrue(self.queue.ready('00:02'))
+        self.now = 1
+        self.assertEqual(self.queue.due(), ['00:01'])
+        self.queue.failed('00:01')
+        self.assertEqual(self.queue.due(), [])
+        self.now = 3
+        self.assertEqual(self.queue.due(), ['00:01'])
+        self.queue.succeeded('00:01')
+        self.assertEqual(self.queue.stats, {'pending': 0, 'open': 0})
+
+    def test_circuit_breaker(self):
+        """Test a switch failing repeatedly is not retried for a while."""
+        for _ in range(4):
+            self.queue.failed('00:01')
+        self.assertTrue(self.queue.is_open('00:01'))
+        self.assertEqual(self.queue.stats, {'pending': 1, 'open': 1})
+        self.now = 99
+        self.assertEqual(self.queue.due(), [])
+        self.now = 100
+        self.assertEqual(self.queue.due(), ['00:01'])
+        self.assertFalse(self.queue.is_open('00:01'))
+        self.queue.failed('00:01')
+        self.assertTrue(self.queue.is_open('00:01'))
@@ -0,0 +1,48 @@
+"""Test the CoalescingScheduler class."""
+from unittest import TestCase
+
+from napps.amlight.coloring.scheduler import CoalescingScheduler
+
+
+class TestCoalescingScheduler(TestCase):
+    """Test the CoalescingScheduler class."""
+
+    def setUp(self):
+        self.now = 0
+        self.scheduler = CoalescingScheduler(10, 1, 30,
+                                             clock=lambda: self.now)
+
+    def test_coalesce_burst(self):
+        """Test a burst of updates results in a single recoloring."""
+        self.assertFalse(self.scheduler.due())
+        for links in range(5):
+            self.scheduler.notify(links)
+        self.assertFalse(self.scheduler.due())
+
+        self.now = 1
+        self.assertTrue(self.scheduler.due())
+        self.assertEqual(self.scheduler.take(), 4)
+        self.assertFalse(self.scheduler.due())
+        self.assertEqual(self.scheduler.stats,
+                         {'events_received': 5, 'events_coalesced': 4,
+                          'recolors': 1, 'pending': False})
+
+    def test_interval(self):
+        """Test recolorings are at least interval seconds apart."""
+        self.scheduler.notify('a')
+        self.now = 1
+        self.scheduler.take()
+        self.scheduler.notify('b')
+        self.now = 5
+        self.assertFalse(self.scheduler.due())
+        self.now = 11
+        self.assertTrue(self.scheduler.due())
+
+    def test_max_staleness(self):
+        """Test a continuous stream of updates is recolored anyway."""
+        while self.now < 30:
+            self.scheduler.notify(self.now)
+            self.assertFalse(self.scheduler.due())
+            self.now += 0.5
+        self.scheduler.notify(self.now)
+        self.assertTrue(self.scheduler.due())
@@ -0,0 +1,104 @@
+"""Test the sharding of the switches."""
+import tempfile
+from unittest import TestCase
+
+from napps.amlight.coloring.sharding import HashRing, ShardChannel, Sharding
+from napps.amlight.coloring.state import SwitchState
+
+DPIDS = ['00:00:00:00:00:00:%02x:%02x' % (number // 256, number % 256)
+         for number in range(1000)]
+
+
+class TestHashRing(TestCase):
+    """Test the HashRing class."""
+
+    def test_owner(self):
+        """Test keys are spread and only the keys of a leaving member move."""
+        ring = HashRing(['a', 'b', 'c'])
+        owners = {dpid: ring.owner(dpid) for dpid in DPIDS}
+        for member in 'abc':
+            self.assertGreater(list(owners.values()).count(member), 200)
+
+        ring = HashRing(['a', 'c'])
+        for dpid, owner in owners.items():
+            if owner != 'b':
+                self.assertEqual(ring.owner(dpid), owner)
+        self.assertIsNone(HashRing([]).owner(DPIDS[0]))
+
+
+class TestSharding(TestCase):
+    """Test the ShardChannel and Sharding classes."""
+
+    def setUp(self):
+        self.now = 0
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def shard(self, shard_id):
+        """Return a Sharding using the test folder and clock."""
+        channel = ShardChannel(self.folder.name, shard_id, 5,
+                               clock=lambda: self.now)
+        return Sharding(shard_id, channel, 15)
+
+    def test_sync(self):
+        """Test shards split the switches and exchange their colors."""
+        shard_a = self.shard('a')
+        shard_b = self.shard('b')
+        self.assertIsNone(shard_a.sync({}))
+        self.assertEqual(shard_b.sync({}).members, {'b'})
+        self.assertEqual(shard_a.sync({}).members, {'a'})
+        owned_a = [dpid for dpid in DPIDS if shard_a.owns(dpid)]
+        owned_b = [dpid for dpid in DPIDS if shard_b.owns(dpid)]
+        self.assertEqual(sorted(owned_a + owned_b), DPIDS)
+
+        shard_b.sync({dpid: 2 for dpid in owned_b + owned_a[:1]})
+        shard_a.sync({})
+        self.assertEqual(shard_a.remote_colors,
+                         {dpid: 2 for dpid in owned_b})
+
+    def test_leave(self):
+        """Test the switches of shards leaving or timing out move."""
+        shard_a = self.shard('a')
+        shard_b = self.shard('b')
+        shard_c = self.shard('c')
+        for shard in (shard_a, shard_b, shard_c, shard_a):
+            shard.sync({})
+        self.assertEqual(shard_a.ring.members, {'a', 'b', 'c'})
+
+        shard_b.leave()
+        self.assertIsNotNone(shard_a.sync({}))
+        self.assertEqual(shard_a.ring.members, {'a', 'c'})
+
+        self.now = 15
+        shard_a.sync({})
+        self.assertEqual(shard_a.ring.members, {'a'})
+        self.assertTrue(all(shard_a.owns(dpid) for dpid in DPIDS))
+
+    def test_update(self):
+        """Test the colors of remote switches are adopted and the switches
+        taken over and handed over are reported."""
+        shard_a = self.shard('a')
+        shard_b = self.shard('b')
+        switches_a = {}
+        switches_b = {}
+        for dpid in DPIDS[:20]:
+            switch_state = SwitchState(dpid, 1)
+            switches_a[switch_state.number] = switch_state
+            switches_b[switch_state.number] = SwitchState(dpid, 2)
+        self.assertTrue(shard_a.alone)
+        self.assertEqual(shard_a.update(switches_a), (set(), set(), set()))
+        self.assertTrue(all(shard_a.picks_color(dpid) for dpid in DPIDS))
+
+        shard_b.update(switches_b)
+        recolored, gained, lost = shard_a.update(switches_a)
+        self.assertFalse(shard_a.alone)
+        owned_b = {number for number, switch_state in switches_a.items()
+                   if shard_b.owns(switch_state.dpid)}
+        self.assertTrue(owned_b)
+        self.assertEqual(recolored, owned_b)
+        self.assertEqual(gained, set())
+        self.assertEqual(lost, owned_b)
+        for number, switch_state in switches_a.items():
+            self.assertEqual(switch_state.color, 2 if number in owned_b else 1)
+            self.assertEqual(shard_a.picks_color(switch_state.dpid),
+                             number not in owned_b)
@@ -0,0 +1,70 @@
+"""Test the compact coloring state records."""
+from unittest import TestCase
+
+from napps.amlight.coloring.state import (COLOR_COOKIE, COLOR_COOKIE_MASK,
+                                          FlowTemplate, SwitchState,
+                                          dpid_to_int, dump_switches,
+                                          int_to_dpid, load_switches)
+
+
+class TestState(TestCase):
+    """Test the compact coloring state records."""
+
+    def test_dpid_conversion(self):
+        """Test DPIDs are converted to integers and back."""
+        self.assertEqual(dpid_to_int('00:00:00:00:00:00:01:2c'), 300)
+        self.assertEqual(int_to_dpid(300), '00:00:00:00:00:00:01:2c')
+
+    def test_flow_template(self):
+        """Test templates are shared and render flow_manager flows."""
+        template = FlowTemplate.get('0x04', 'dl_src')
+        self.assertIs(template, FlowTemplate.get('0x04', 'dl_src'))
+        self.assertIsNone(FlowTemplate.get('0x05', 'dl_src'))
+        self.assertEqual(template.render('ee:ee:ee:ee:ee:01'), {
+            'table_id': 0,
+            'cookie': COLOR_COOKIE,
+            'match': {'dl_src': 'ee:ee:ee:ee:ee:01'},
+            'priority': 50000,
+            'actions': [{'action_type': 'output', 'port': 0xfffffffd}]})
+
+    def test_purge_flows(self):
+        """Test color flows are deleted by cookie when supported."""
+        template = FlowTemplate.get('0x04', 'dl_src', 3)
+        self.assertEqual(template.cookie, COLOR_COOKIE | 3)
+        self.assertEqual(template.purge_flows(['ee:ee:ee:ee:ee:01'],
+                                              any_version=True),
+                         [{'table_id': 0, 'cookie': COLOR_COOKIE | 3,
+                           'cookie_mask': COLOR_COOKIE_MASK}])
+        template = FlowTemplate.get('0x01', 'dl_src', 3)
+        self.assertEqual(template.purge_flows(['ee:ee:ee:ee:ee:01']),
+                         [template.render('ee:ee:ee:ee:ee:01')])
+
+    def test_switch_state(self):
+        """Test switch records have no instance dict."""
+        switch_state = SwitchState('00:00:00:00:00:00:00:02')
+        self.assertEqual(switch_state.number, 2)
+        self.assertFalse(hasattr(switch_state, '__dict__'))
+        switch_state.template = FlowTemplate.get('0x01', 'dl_src')
+        flows = switch_state.render_flows(['ee:ee:ee:ee:ee:01'])
+        self.assertEqual(flows[0]['actions'][0]['port'], 0xfffd)
+
+    def test_dump_switches(self):
+        """Test switches and adjacencies are dumped and loaded back."""
+        switches = {}
+        for number, color in ((1, 3), (2, None)):
+            switch_state = SwitchState(int_to_dpid(number), color)
+            switches[number] = switch_state
+        switches[1].flows = {'ee:ee:ee:ee:ee:02'}
+        switches[1].template = FlowTemplate.get('0x04', 'dl_src', 2)
+        dumped, adjacencies = dump_switches(switches, {(1, 2)})
+
+        loaded, loaded_adjacencies = load_switches(
+            dumped, adjacencies + [[int_to_dpid(2), int_to_dpid(3)]],
+            'dl_src', 2)
+        self.assertEqual(loaded_adjacencies, {(1, 2)})
+        self.assertEqual(loaded[1].color, 3)
+        self.assertEqual(loaded[1].flows, {'ee:ee:ee:ee:ee:02'})
+        self.assertIs(loaded[1].template, switches[1].template)
+        self.assertEqual(loaded[1].neighbors, {2})
+        self.assertIsNone(loaded[2].color)
+        self.assertIsNone(loaded[2].template)
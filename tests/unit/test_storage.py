@@ -0,0 +1,36 @@
+"""Test the StateStore class."""
+import os
+import tempfile
+from unittest import TestCase
+
+from napps.amlight.coloring.storage import StateStore
+
+
+class TestStateStore(TestCase):
+    """Test the StateStore class."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'state.json')
+        self.store = StateStore(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_load(self):
+        """Test a saved state is loaded back."""
+        state = {'switches': {'00:01': {'color': 1, 'flows': {}}},
+                 'adjacencies': [['00:01', '00:02']]}
+        self.store.save(state)
+        self.assertEqual(self.store.load(), state)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_load_missing(self):
+        """Test loading without a saved state."""
+        self.assertIsNone(self.store.load())
+
+    def test_load_corrupted(self):
+        """Test a corrupted state is ignored."""
+        with open(self.path, 'w') as state_file:
+            state_file.write('{"switches": ')
+        self.assertIsNone(self.store.load())
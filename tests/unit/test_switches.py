@@ -0,0 +1,28 @@
+"""Test the Switches class."""
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from napps.amlight.coloring.shared.singleton import Singleton
+from napps.amlight.coloring.shared.switches import Switches
+
+
+class TestSwitches(TestCase):
+    """Test the Switches class."""
+
+    def setUp(self):
+        patcher = patch.dict(Singleton._instances)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Singleton._instances.pop(Switches, None)
+        self.switch = Mock()
+        self.switches = Switches({'00:00:00:00:00:00:00:01': self.switch})
+
+    def test_get_switch(self):
+        """Test method get_switch finds switches by DPID."""
+        self.assertIs(self.switches.get_switch('00:00:00:00:00:00:00:01'),
+                      self.switch)
+        self.assertIs(Switches().get_switch('00:00:00:00:00:00:00:01'),
+                      self.switch)
+        self.assertIs(self.switches.get_switch('00:00:00:00:00:00:00:02'),
+                      False)
+        self.assertEqual(len(self.switches), 1)
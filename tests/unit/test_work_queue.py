@@ -0,0 +1,69 @@
+"""Test the WorkQueue class."""
+from unittest import TestCase
+from unittest.mock import Mock
+
+from napps.amlight.coloring.work_queue import (PRIORITY_NEW, PRIORITY_REPAIR,
+                                               WorkQueue)
+
+
+class TestWorkQueue(TestCase):
+    """Test the WorkQueue class."""
+
+    def setUp(self):
+        self.now = 0
+        self.queue = WorkQueue(clock=lambda: self.now)
+
+    def test_drain(self):
+        """Test the whole queue is processed in chunks, once per item."""
+        self.queue.add([1, 2, 3])
+        self.queue.add([2, 4, 5])
+        process = Mock()
+
+        self.assertEqual(self.queue.drain(process, 2), 5)
+        self.assertEqual([call[0][0] for call in process.call_args_list],
+                         [[1, 2], [3, 4], [5]])
+        self.assertEqual(self.queue.stats['pending'], 0)
+        self.assertEqual(self.queue.stats['processed'], 5)
+
+    def test_drain_budget(self):
+        """Test draining stops once the time budget is spent."""
+        self.queue.add(range(10))
+        self.queue.discard(0)
+
+        def process(_):
+            self.now += 1
+
+        self.assertEqual(self.queue.drain(process, 2, budget=2), 4)
+        self.assertEqual(len(self.queue), 5)
+        self.assertEqual(self.queue.take(2), [5, 6])
+
+    def test_priorities(self):
+        """Test items are taken by priority, keeping their first arrival."""
+        observe = Mock()
+        self.queue = WorkQueue(clock=lambda: self.now, observe=observe)
+        self.queue.add([1, 2, 3])
+        self.now = 5
+        self.queue.add([4], PRIORITY_REPAIR)
+        self.queue.add([3, 5], PRIORITY_NEW)
+        self.now = 10
+        stats = self.queue.stats['priorities']
+        self.assertEqual(stats['new'], {'pending': 2, 'oldest_wait': 10})
+        self.assertEqual(stats['repair'], {'pending': 1, 'oldest_wait': 5})
+        self.assertEqual(stats['update'], {'pending': 2, 'oldest_wait': 10})
+
+        self.assertEqual(self.queue.take(4), [3, 5, 4, 1])
+        self.assertEqual(observe.call_args_list[0][0], ('new', 10))
+        self.assertEqual(observe.call_args_list[2][0], ('repair', 5))
+
+    def test_defer(self):
+        """Test deferred items keep their priority and are taken later."""
+        self.queue.add([1, 2], PRIORITY_NEW)
+        self.queue.add([3])
+        self.assertEqual(self.queue.take(1), [1])
+        self.queue.defer(1, 5)
+        self.assertIn(1, self.queue)
+        self.assertEqual(self.queue.take(5), [2, 3])
+        self.assertEqual(self.queue.stats['deferred'], 1)
+        self.now = 5
+        self.assertEqual(self.queue.take(5), [1])
+        self.assertEqual(len(self.queue), 0)
@@ -0,0 +1,143 @@
+"""Spread the reconciliation of switches over the ticks of execute()."""
+import time
+from threading import Lock
+
+#: Switches without any color flow, such as newly joined ones
+PRIORITY_NEW = 0
+#: Switches whose flows failed or drifted from the desired ones
+PRIORITY_REPAIR = 1
+#: Switches already forwarding their colors, whose flows are updated after
+#: a change of neighbors or of the aggregation
+PRIORITY_UPDATE = 2
+#: Name of each priority, used as a metric label
+PRIORITIES = ('new', 'repair', 'update')
+
+
+class WorkQueue:
+    """Switches whose flows must be reconciled, processed in chunks.
+
+    Each call to `drain` processes chunks of switches until the queue is
+    empty or its time budget is spent, leaving the remaining switches for
+    the next call. Switches are taken by priority, then by order of
+    arrival. A switch queued again before being processed is only processed
+    once, with the highest of its priorities. Switches can be deferred, for
+    instance when they are rate limited, keeping their priority and the
+    time they were first queued.
+    """
+
+    def __init__(self, clock=time.monotonic, observe=None):
+        """
+        :param observe: Optional callable receiving the priority and the
+        seconds waited by each item taken
+        """
+        self._clock = clock
+        self._observe = observe
+        self._lock = Lock()
+        self._pending = [{} for _ in PRIORITIES]
+        self._priorities = {}
+        self._deferred = {}
+        self._taken = {}
+        self.processed = 0
+
+    def __len__(self):
+        return len(self._priorities)
+
+    def __contains__(self, item):
+        return item in self._priorities
+
+    def add(self, items, priority=PRIORITY_UPDATE):
+        """Queue items to be processed, keeping the order of arrival."""
+        with self._lock:
+            now = self._clock()
+            for item in items:
+                self._add(item, priority, now)
+
+    def _add(self, item, priority, queued):
+        """Queue an item, keeping its highest priority and first arrival."""
+        current = self._priorities.get(item)
+        if current is not None:
+            if current <= priority:
+                return
+            queued = self._pending[current].pop(item)
+        self._priorities[item] = priority
+        self._pending[priority][item] = queued
+
+    def discard(self, item):
+        """Remove an item from the queue, if present."""
+        with self._lock:
+            priority = self._priorities.pop(item, None)
+            if priority is not None:
+                del self._pending[priority][item]
+                self._deferred.pop(item, None)
+
+    def defer(self, item, delay):
+        """Queue again an item just taken, not to be taken for `delay`
+        seconds.
+        """
+        with self._lock:
+            priority, queued = self._taken.pop(item, (PRIORITY_UPDATE,
+                                                      self._clock()))
+            self._add(item, priority, queued)
+            self._deferred[item] = self._clock() + delay
+
+    def take(self, count):
+        """Remove and return up to `count` items that are not deferred,
+        by priority and then oldest first.
+        """
+        with self._lock:
+            now = self._clock()
+            self._taken = {}
+            for item, until in list(self._deferred.items()):
+                if until <= now:
+                    del self._deferred[item]
+            chunk = []
+            for priority, pending in enumerate(self._pending):
+                for item, queued in pending.items():
+                    if len(chunk) >= count:
+                        break
+                    if item not in self._deferred:
+                        chunk.append(item)
+                        self._taken[item] = (priority, queued)
+            for item, (priority, queued) in self._taken.items():
+                del self._pending[priority][item]
+                del self._priorities[item]
+                if self._observe is not None:
+                    self._observe(PRIORITIES[priority], now - queued)
+            return chunk
+
+    def drain(self, process, chunk_size, budget=None):
+        """Process queued items in chunks.
+        :param process: Callable receiving a list of items
+        :param chunk_size: Maximum number of items per call to `process`
+        :param budget: Seconds after which no new chunk is started, or None
+        to process the whole queue
+        :return: The number of items processed
+        """
+        start = self._clock()
+        processed = 0
+        while True:
+            chunk = self.take(max(chunk_size, 1))
+            if not chunk:
+                break
+            process(chunk)
+            processed += len(chunk)
+            if budget is not None and self._clock() - start >= budget:
+                break
+        self.processed += processed
+        return processed
+
+    @property
+    def stats(self):
+        """Return the number of items pending, deferred and processed so
+        far, and the items pending and the longest wait of each priority.
+        """
+        with self._lock:
+            now = self._clock()
+            priorities = {
+                name: {'pending': len(pending),
+                       'oldest_wait': now - min(pending.values(), default=now)}
+                for name, pending in zip(PRIORITIES, self._pending)}
+            return {'pending': len(self._priorities),
+                    'deferred': len(self._deferred),
+                    'processed': self.processed,
+                    'priorities': priorities}